@@ -0,0 +1,212 @@
+"""
+Benchmarks for the pattern and planner hot paths.
+
+- patterns - time and peak memory to generate each pattern class, at several densities
+- planning - get_steps_for_move throughput for short, long and diagonal moves, in moves and time steps per second
+- playback - wall time per time step playing a pattern, and a compiled step program, on the
+  simulated motors with a virtual clock, so only the code's own cost is measured
+
+Run from the repository root:
+    python bench/benchmarks.py          compare with the stored baseline, exit 1 on a regression
+    python bench/benchmarks.py --save   store the results as the new baseline
+    python bench/benchmarks.py --quick  fewer repeats, for a quick check
+
+Timings are the best of several repeats. Baselines are only comparable on the machine they were
+saved on, save a new one after changing hardware.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from constants import *
+from motion_planner import MotionPlanner
+from plan_cache import PlanCache
+from simulator import Simulator
+import step_program
+import pattern_circle
+import pattern_radial_sweep
+import pattern_spiral
+import pattern_zigzag
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+REGRESSION_TOLERANCE = 0.25 # fraction worse than the baseline before it counts as a regression
+DENSITIES = (1, 4, 16) # pattern step sizes divided by this
+
+# pattern, and its module constants that set the distance between points
+PATTERNS = [
+    ("circle", lambda: pattern_circle.PatternCircle(1), pattern_circle, ("T_RAD_PER_STEP",)),
+    ("radial_sweep", lambda: pattern_radial_sweep.PatternRadialSweep(1), pattern_radial_sweep, ("R_STEP_SIZE",)),
+    ("spiral", lambda: pattern_spiral.PatternSpiral(), pattern_spiral, ("T_RAD_PER_STEP", "R_INCREMENT_RATE_STEP")),
+    ("zigzag", lambda: pattern_zigzag.PatternZigzag(ax=axis.RHO, start=25, size=50), pattern_zigzag, ()),
+]
+
+# (start, end) of each planned move
+MOVES = {
+    "short": ((0, 10), (AXIS_STEP_T * 2, 10 + AXIS_STEP_R * 3)),
+    "long": ((0, 0), (0, AXIS_MAX_R)),
+    "diagonal": ((0, 0), (1, 30)),
+}
+
+@contextlib.contextmanager
+def _density(module, names, factor):
+    # closer points, the zigzag has more zigzags instead
+    saved = {name: getattr(module, name) for name in names}
+    zigzags = getattr(module, "ZIGZAGS_IN_FULL_TRAVEL", None)
+    try:
+        for name in names:
+            setattr(module, name, saved[name] / factor)
+        if zigzags is not None:
+            module.ZIGZAGS_IN_FULL_TRAVEL = zigzags * factor
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+        if zigzags is not None:
+            module.ZIGZAGS_IN_FULL_TRAVEL = zigzags
+
+def _best_time(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _result(value, unit, higher_is_better=False, compared=True):
+    # compared False for results that describe the benchmark rather than measure it
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better, 'compared': compared}
+
+def bench_patterns(repeats):
+    results = {}
+    for name, factory, module, names in PATTERNS:
+        for density in DENSITIES:
+            with _density(module, names, density):
+                points = len(factory().get_pattern())
+                key = "pattern.{}.x{}".format(name, density)
+                results[key + ".time_s"] = _result(_best_time(lambda: factory().get_pattern(), repeats), "s")
+                tracemalloc.start()
+                factory().get_pattern()
+                results[key + ".peak_bytes"] = _result(tracemalloc.get_traced_memory()[1], "bytes")
+                tracemalloc.stop()
+                results[key + ".points"] = _result(points, "points", compared=False)
+    return results
+
+def bench_planning(repeats, accel=False):
+    results = {}
+    # no plan cache, every move planned from scratch
+    planner = MotionPlanner(None, accel=accel, plan_cache=PlanCache(max_bytes=0))
+    cached_planner = MotionPlanner(None, accel=accel)
+    suffix = ".accel" if accel else ""
+    for name, (start, end) in MOVES.items():
+        planner.current_position = start
+        time_steps = len(planner.get_steps_for_move(end)['axis_steps_list'])
+        count = max(10, 2000 // max(1, time_steps // 100))
+
+        def plan():
+            for _ in range(count):
+                planner.get_steps_for_move(end, start)
+
+        elapsed = _best_time(plan, repeats)
+        results["plan.{}{}.moves_per_s".format(name, suffix)] = _result(count / elapsed, "moves/s", higher_is_better=True)
+        results["plan.{}{}.time_steps_per_s".format(name, suffix)] = _result(count * time_steps / elapsed, "time steps/s", higher_is_better=True)
+
+        def plan_cached():
+            for _ in range(count):
+                cached_planner.get_steps_for_move(end, start)
+
+        elapsed = _best_time(plan_cached, repeats)
+        results["plan.{}{}.cached.moves_per_s".format(name, suffix)] = _result(count / elapsed, "moves/s", higher_is_better=True)
+    return results
+
+def bench_playback(repeats):
+    results = {}
+
+    def play_pattern():
+        sim = Simulator()
+        sim.play(pattern_spiral.PatternSpiral())
+        return sim
+
+    time_steps = play_pattern().scheduler.get_stats()['time_steps']
+    results["playback.pattern.s_per_time_step"] = _result(_best_time(play_pattern, repeats) / time_steps, "s")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        program = step_program.load_or_compile(pattern_spiral.PatternSpiral(), cache_dir)
+
+        def play_program():
+            sim = Simulator(start_position=program.start_position)
+            sim.play_program(program)
+
+        results["playback.program.s_per_time_step"] = _result(_best_time(play_program, repeats) / len(program), "s")
+        program.close()
+    return results
+
+def run(quick=False):
+    repeats = 1 if quick else 5
+    results = {}
+    results.update(bench_patterns(repeats))
+    results.update(bench_planning(repeats))
+    results.update(bench_planning(repeats, accel=True))
+    results.update(bench_playback(1 if quick else 3))
+    return results
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    '''
+    return - list of (name, baseline value, value) for each result worse than the baseline by more than tolerance
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or not result['compared']:
+            continue
+        old = baseline[name]['value']
+        new = result['value']
+        if result['higher_is_better']:
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance)
+        if worse:
+            regressions.append((name, old, new))
+    return regressions
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pattern and planner benchmarks")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    results = run(args.quick)
+    baseline = load_baseline(args.baseline)
+    for name in sorted(results):
+        result = results[name]
+        old = " (baseline {:.4g})".format(baseline[name]['value']) if baseline and name in baseline else ""
+        print("{:45} {:12.4g} {}{}".format(name, result['value'], result['unit'], old))
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print("Baseline saved to {}".format(args.baseline))
+    elif baseline is not None:
+        regressions = compare(results, baseline)
+        for name, old, new in regressions:
+            print("REGRESSION {}: {:.4g} -> {:.4g}".format(name, old, new))
+        sys.exit(1 if regressions else 0)
@@ -13,6 +13,7 @@ PI = 3.141592653589793
 
 TIME_STEP_S = 0.015 # seconds, 15 ms time step for the motion planner
 MIN_STEP_DELAY = 0.006 # Minimum delay between steps in sections, to allow the motor to step properly
+PLAN_QUEUE_DEPTH = 8 # moves planned ahead of the one playing
 
 # V2 hardware - NEMA 17 motors
 AXIS_MAX_R = 71.5 # mm, min always 0
@@ -36,7 +37,7 @@ AXIS_STEP_R = 0.15707963 # * AXIS_GEAR_RATIO_R # mm
 #AXIS_STEP_R = 0.01533981 # * AXIS_GEAR_RATIO_R # mm
 
 T_FULL_ROTATION = 2 * PI
-T_FULL_ROTATION_STEPS = int(T_FULL_ROTATION / AXIS_STEP_T) # number of steps for full rotation
+T_FULL_ROTATION_STEPS = int(round(T_FULL_ROTATION / AXIS_STEP_T)) # number of steps for full rotation
 
 # speed - untis per second
 AXIS_SPEED_T = position_helper.deg_to_rad(5)
@@ -47,5 +48,71 @@ AXIS_STEP_RATE_R = AXIS_SPEED_R / AXIS_STEP_R * TIME_STEP_S
 #AXIS_STEP_RATE_T = 1 # max speed
 #AXIS_STEP_RATE_R = 1
 
+# acceleration - units per second^2, used when ACCEL_ENABLED
+ACCEL_ENABLED = False # ramp step rate up and down for each move, instead of starting and stopping at full speed
+AXIS_ACCEL_T = position_helper.deg_to_rad(10)
+AXIS_ACCEL_R = 10
+# acceleration - motor steps per time step^2
+AXIS_STEP_ACCEL_T = AXIS_ACCEL_T / AXIS_STEP_T * TIME_STEP_S ** 2
+AXIS_STEP_ACCEL_R = AXIS_ACCEL_R / AXIS_STEP_R * TIME_STEP_S ** 2
+# with acceleration the cruise speed may exceed one step per time step, as many as can be played within one.
+# Each axis step is gear ratio motor steps, MIN_STEP_DELAY apart. The axes' pulses are interleaved, so each cap
+# only counts its own motor. At least one step, a theta step
+# takes longer than a time step with V2 gearing, the scheduler catches up after it.
+AXIS_MAX_STEPS_PER_TIME_STEP_T = max(1, int(TIME_STEP_S / (MIN_STEP_DELAY * AXIS_GEAR_RATIO_T)))
+AXIS_MAX_STEPS_PER_TIME_STEP_R = max(1, int(TIME_STEP_S / (MIN_STEP_DELAY * AXIS_GEAR_RATIO_R)))
+
+# reference sensor
+SENSOR_FOOTPRINT = 8 # mm, width of the area the reference sensor triggers over
+REF_STEPS_IN_STATE = 5 # number of steps in desired state to consider a sensor edge found
+REF_R_STEPS_TO_LIMIT = 65 * 4 # rho steps from the sensor's inner edge to the rho limit
+# sensor centre, in referenced coordinates
+REF_SENSOR_POSITION = (0, AXIS_MAX_R - REF_R_STEPS_TO_LIMIT * AXIS_STEP_R + SENSOR_FOOTPRINT / 2)
+# area searched around the sensor when starting from a last known position
+REF_SEARCH_WINDOW_T = position_helper.deg_to_rad(20)
+REF_SEARCH_WINDOW_R = 10 # mm
+
+# path simplification
+SIMPLIFY_TOLERANCE_STEPS = 0.5 # furthest a dropped point can be from the simplified path, in axis steps
+SIMPLIFY_MAX_RUN = 256 # most points merged into one move
+
+# playlist optimisation
+PLAYLIST_ROTATION_CHOICES = 8 # theta offsets tried for rotatable patterns, evenly spaced over a rotation
+PLAYLIST_EXHAUSTIVE_MAX = 7 # playlists up to this long are searched exhaustively
+
+# theta-rho track files
+THR_INDEX_STRIDE = 256 # points between byte offsets in a track's seek index
+
+# Cartesian drawings
+CARTESIAN_TOLERANCE_MM = 0.5 # furthest a polar move may stray from the drawn line
+CARTESIAN_MAX_SPLITS = 12 # times a line may be halved, lines through the centre can't meet the tolerance
+
+# planned moves
+PLAN_CACHE_MAX_BYTES = 4 * 1024 * 1024 # step schedules kept for reuse, least recently used dropped past this
+
+# position journal
+JOURNAL_FILE = "position.journal"
+JOURNAL_FLUSH_INTERVAL_S = 5 # progress written at most this often
+JOURNAL_MAX_BYTES = 64 * 1024 # compacted to its last record past this size
+
+# control daemon
+CONTROL_SOCKET = "sandtable.sock" # Unix socket the daemon listens on
+
+# A4988 driver GPIO pins, BCM numbering
+THETA_STEP_PIN = 17 # Theta step when True
+THETA_DIR_PIN = 22 # Theta direction - CW when True
+RHO_STEP_PIN = 10
+RHO_DIR_PIN = 11
+MOTORS_ENABLE_PIN = 5
+STEP_PULSE_WIDTH = 0.001 # seconds, pulse width for the step signal
+
+# pulse trains
+DIR_SETUP_US = 10 # microseconds between a direction change and the next step pulse
+PULSE_TRAIN_CHUNK_TIME_STEPS = 64 # time steps sent to a waveform backend at once
+
+# playback metrics
+METRICS_FILE = "sandtable.prom"
+METRICS_FLUSH_INTERVAL_S = 10 # metrics file written at most this often
+
 AXIS_T_INVERT_DIR = False
 AXIS_R_INVERT_DIR = True
\ No newline at end of file
@@ -0,0 +1,298 @@
+"""
+Long running table process, controlled over a local Unix socket.
+
+Patterns are queued as specs (see pattern_factory.py) and played one after another by a
+player thread. The table is referenced once at startup, loading a new playlist or
+skipping a pattern keeps the homed position, no restart needed.
+
+## Protocol
+One JSON object per line, each answered with one JSON line, {"ok": true, ...} or {"ok": false, "error": ...}
+- {"command": "status"} - state, current pattern and progress, queue and position
+- {"command": "enqueue", "pattern": spec} - add a pattern to the end of the queue
+- {"command": "load", "playlist": [spec, ...], "now": false} - replace the queue, now skips the current pattern too
+- {"command": "skip"} - stop the current pattern and play the next
+- {"command": "pause"} / {"command": "resume"} - stop at the end of the time step, carry on from there
+
+## Timing
+Requests are handled in their own threads and only touch the player's queue and flags, under a
+lock the player only takes between patterns. Patterns are compiled into step programs before
+they play, so playback does no planning. A skip or pause cancels the planner, which stops at the
+end of the time step playing.
+
+Run as a script to start the daemon, or with a command to send it one:
+    python control_daemon.py
+    python control_daemon.py enqueue '{"pattern": {"type": "spiral"}}'
+"""
+
+import collections
+import json
+import os
+import socket
+import socketserver
+import threading
+from constants import *
+import pattern_factory
+import step_program
+import logging
+
+class Player:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, planner, journal=None, cache_dir=step_program.CACHE_DIR):
+        self.planner = planner
+        self.journal = journal
+        self.cache_dir = cache_dir
+        self.queue = collections.deque()
+        self.current = None # spec playing, or paused part way through
+        self.time_step = 0 # where the current pattern continues from
+        self.paused = False
+        self.last_error = None
+        self.patterns_played = 0
+        self._skip = False
+        self._stopping = False
+        self._playing = False
+        self._changed = threading.Condition()
+
+    def enqueue(self, spec, time_step=0):
+        '''
+        time_step - continue the pattern from here, e.g. resuming after a restart
+        '''
+        # checked now, so a bad spec is refused rather than failing when it comes up
+        pattern_factory.make_pattern(spec)
+        with self._changed:
+            self.queue.append((spec, time_step))
+            self._changed.notify_all()
+
+    def load(self, specs, now=False):
+        '''
+        Replace the queue, now - skip the pattern playing too
+        '''
+        for spec in specs:
+            pattern_factory.make_pattern(spec)
+        with self._changed:
+            self.queue = collections.deque((spec, 0) for spec in specs)
+            self._changed.notify_all()
+        if now:
+            self.skip()
+
+    def skip(self):
+        with self._changed:
+            if self._playing:
+                self._skip = True
+                self.planner.cancel()
+            else:
+                # paused part way, drop it
+                self.current = None
+                self.time_step = 0
+            self._changed.notify_all()
+
+    def pause(self):
+        with self._changed:
+            self.paused = True
+            self.planner.cancel()
+
+    def resume(self):
+        with self._changed:
+            self.paused = False
+            self._changed.notify_all()
+
+    def stop(self):
+        with self._changed:
+            self._stopping = True
+            self.planner.cancel()
+            self._changed.notify_all()
+
+    def status(self):
+        with self._changed:
+            if self._playing:
+                state = 'paused' if self.paused else 'playing'
+            else:
+                state = 'paused' if self.paused and self.current is not None else 'idle'
+            return {
+                'state': state,
+                'pattern': self.current,
+                'time_step': self.planner.progress if self._playing else self.time_step,
+                'queue': [spec for spec, _ in self.queue],
+                'position': self.planner.actual_position,
+                'steps': self.planner.current_steps,
+                'patterns_played': self.patterns_played,
+                'last_error': self.last_error,
+            }
+
+    def _next(self):
+        # wait for something to play, None when stopping
+        with self._changed:
+            while not self._stopping and (self.paused or (self.current is None and not self.queue)):
+                self._changed.wait()
+            if self._stopping:
+                return None
+            if self.current is None:
+                self.current, self.time_step = self.queue.popleft()
+            self._skip = False
+            # cleared under the lock, a pause or skip from here on cancels this play
+            self.planner.clear_cancel()
+            self.planner.progress = self.time_step
+            self._playing = True
+            return self.current, self.time_step
+
+    def _finish(self, finished):
+        with self._changed:
+            self._playing = False
+            if finished or self._skip or self.last_error is not None:
+                if finished:
+                    self.patterns_played += 1
+                self.current = None
+                self.time_step = 0
+            else:
+                # paused or stopping, carry on from here
+                self.time_step = self.planner.progress
+
+    def run(self):
+        '''
+        Play queued patterns until stop()
+        '''
+        while True:
+            playing = self._next()
+            if playing is None:
+                return
+            spec, time_step = playing
+            name = pattern_factory.spec_name(spec)
+            self.last_error = None
+            finished = False
+            try:
+                # compiled between patterns, or loaded from the cache
+                program = step_program.load_or_compile(pattern_factory.make_pattern(spec), self.cache_dir)
+                if self.journal is not None and time_step == 0:
+                    self.journal.start_pattern(self.planner.current_steps, None, name)
+                self.logger.info("Playing {} from time step {}".format(name, time_step))
+                finished = self.planner.play_program(program, time_step)
+                program.close()
+            except Exception as e:
+                self.logger.exception("Pattern {} failed".format(name))
+                self.last_error = "{}: {}".format(name, e)
+            self._finish(finished)
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.handle_request_json(json.loads(line))
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, player, path=CONTROL_SOCKET):
+        self.player = player
+        self.path = path
+        # left behind if the last daemon didn't stop cleanly
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, _RequestHandler)
+
+    def handle_request_json(self, request):
+        command = request.get('command')
+        player = self.player
+        if command == 'status':
+            return dict(ok=True, **player.status())
+        elif command == 'enqueue':
+            player.enqueue(request['pattern'])
+        elif command == 'load':
+            player.load(request['playlist'], request.get('now', False))
+        elif command == 'skip':
+            player.skip()
+        elif command == 'pause':
+            player.pause()
+        elif command == 'resume':
+            player.resume()
+        else:
+            raise ValueError("Unknown command {!r}".format(command))
+        self.logger.info("Control command {}".format(command))
+        return {'ok': True}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def send_command(command, path=CONTROL_SOCKET, **args):
+    '''
+    Send a command to a running daemon.
+    return - the daemon's response dict
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall((json.dumps(dict(command=command, **args)) + "\n").encode())
+        with s.makefile() as f:
+            return json.loads(f.readline())
+
+def main():
+    import signal
+    from motor_control_io import MotorControlIO
+    from motion_planner import MotionPlanner
+    from position_journal import PositionJournal
+    from metrics import Metrics
+    from tick_scheduler import TickScheduler
+
+    logger = logging.getLogger(__name__)
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', filename='plotter.log')
+
+    journal_state = PositionJournal.recover()
+    journal = PositionJournal()
+    metrics = Metrics()
+    motors = MotorControlIO(metrics=metrics)
+    planner = MotionPlanner(motors, scheduler=TickScheduler(metrics=metrics), journal=journal)
+    player = Player(planner, journal)
+
+    stopped = threading.Event()
+    def request_stop(signum, frame):
+        logger.info("Stopping on signal {}".format(signum))
+        player.stop()
+        stopped.set()
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    if journal_state is not None and journal_state['clean']:
+        logger.info("Clean shutdown in journal, skipping reference")
+        planner.current_position = planner.steps_to_position(journal_state['steps'])
+    else:
+        logger.info("Referenceing...")
+        last_known = planner.steps_to_position(journal_state['steps']) if journal_state is not None else None
+        planner.fast_reference_routine(last_known)
+
+    # carry on with the pattern that was playing
+    if journal_state is not None and journal_state['name'] is not None:
+        try:
+            player.enqueue(json.loads(journal_state['name']), journal_state['progress'])
+        except (ValueError, TypeError):
+            logger.info("Journalled pattern {} isn't a pattern spec, not resuming".format(journal_state['name']))
+
+    server = ControlServer(player)
+    threading.Thread(target=server.serve_forever, name="control-server", daemon=True).start()
+    logger.info("Listening on {}".format(server.path))
+    player_thread = threading.Thread(target=player.run, name="player")
+    player_thread.start()
+    stopped.wait()
+    player_thread.join()
+    server.shutdown()
+    server.server_close()
+
+    metrics.flush()
+    journal.shutdown(planner.current_steps)
+    journal.close()
+    motors.motors_release()
+    logger.info("Stopped.")
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        args = json.loads(sys.argv[2]) if len(sys.argv) > 2 else {}
+        print(json.dumps(send_command(sys.argv[1], **args), indent=2))
+    else:
+        main()
@@ -21,21 +21,34 @@ from motion_planner import MotionPlanner
 from pattern_spiral import PatternSpiral
 from pattern_radial_sweep import PatternRadialSweep
 from pattern_zigzag import PatternZigzag
+from position_journal import PositionJournal
+from metrics import Metrics
+from tick_scheduler import TickScheduler
+from playlist import Playlist
+from path_simplify import PathSimplify
+import step_program
+import signal
 import logging
 logger = logging.getLogger(__name__)
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', filename='plotter.log')
 
-motors = MotorControlIO()
-planner = MotionPlanner(motors)
+# where the table was when it last stopped
+journal_state = PositionJournal.recover()
+journal = PositionJournal()
 
-logger.info("Referenceing...")
-# Zero the motors
-planner.reference_routine()
+# tick and step timing, written to a file for scraping
+metrics = Metrics()
+motors = MotorControlIO(metrics=metrics)
+planner = MotionPlanner(motors, scheduler=TickScheduler(metrics=metrics), journal=journal)
 
-logger.info("Move to the center...")
-move = planner.get_steps_for_move((0, 0))
-planner.play_move(move)
+# on shutdown stop between time steps, so the journal gets the exact position
+def request_stop(signum, frame):
+    logger.info("Stopping on signal {}".format(signum))
+    planner.cancel()
+
+signal.signal(signal.SIGTERM, request_stop)
+signal.signal(signal.SIGINT, request_stop)
 
 logger.info("Loading patterns...")
 # load a pattern
@@ -45,11 +58,59 @@ zigzag_r = PatternZigzag(ax=axis.RHO, start=25, size=50)
 radial = PatternRadialSweep(1)
 spiral = PatternSpiral()
 
+logger.info("Compiling step programs...")
+# straight runs merged into single moves, compiled once, later boots load them from the cache
+simplified = [PathSimplify(p) for p in (zigzag_t1, zigzag_t2, radial, zigzag_r, spiral)]
+programs = [step_program.load_or_compile(p) for p in simplified]
+# logs what simplifying saved, worked out again for programs from the cache
+for p in simplified:
+    p.get_stats()
+
+# order, direction and rotation to cut the moves between patterns, the theta zigzags keep their angle
+playlist = Playlist(programs, planner, rotatable=[False, False, True, True, True])
+playlist.optimise()
+names = [playlist.name(i) for i in range(len(playlist))]
+
+# carry on with the pattern that was playing, if it's still in the playlist
+pattern_index = 0
+time_step = 0
+if journal_state is not None and journal_state['pattern'] is not None:
+    index = journal_state['pattern']
+    if index < len(playlist) and names[index] == journal_state['name']:
+        pattern_index = index
+        time_step = journal_state['progress']
+        logger.info("Resuming pattern {} at time step {}".format(pattern_index, time_step))
+
+if journal_state is not None and journal_state['clean']:
+    # position is exact after a clean stop
+    logger.info("Clean shutdown in journal, skipping reference")
+    planner.current_position = planner.steps_to_position(journal_state['steps'])
+else:
+    logger.info("Referenceing...")
+    # Zero the motors, searching near the last journalled position first
+    last_known = planner.steps_to_position(journal_state['steps']) if journal_state is not None else None
+    planner.fast_reference_routine(last_known)
+
+    if time_step == 0:
+        logger.info("Move to the center...")
+        move = planner.get_steps_for_move((0, 0))
+        planner.play_move(move)
+
 logger.info("Pattern loaded. Executing...")
 # Ececute the pattern
-while True:
-    planner.play(zigzag_t1.get_pattern())
-    planner.play(zigzag_t2.get_pattern())
-    planner.play(radial.get_pattern())
-    planner.play(zigzag_r.get_pattern())
-    planner.play(spiral.get_pattern())
\ No newline at end of file
+# a stop signal while compiling or referencing stops here, before the first pattern
+running = not planner.cancelled
+while running:
+    if time_step == 0:
+        journal.start_pattern(planner.current_steps, pattern_index, names[pattern_index])
+    program = playlist.get_program(pattern_index, planner.current_steps, time_step)
+    running = planner.play_program(program, time_step)
+    if running:
+        pattern_index = (pattern_index + 1) % len(playlist)
+        time_step = 0
+
+metrics.flush()
+journal.shutdown(planner.current_steps)
+journal.close()
+motors.motors_release()
+logger.info("Stopped.")
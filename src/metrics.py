@@ -0,0 +1,131 @@
+"""
+Low overhead playback metrics, flushed to a text file in the Prometheus exposition format.
+
+Histograms have fixed buckets, so recording a value is a bisect and two additions and memory
+doesn't grow however long the table runs. Counters are single numbers.
+
+The file is written at most once per flush interval, renamed into place so a scraper never
+reads half a file, e.g. by the node exporter's textfile collector.
+"""
+
+import bisect
+import os
+import time
+from constants import *
+
+# seconds, bucket upper bounds
+TICK_BUCKETS = (0.005, 0.010, 0.014, 0.015, 0.016, 0.020, 0.030, 0.050, 0.100, 0.250)
+PULSE_BUCKETS = (0.001, 0.002, 0.005, 0.006, 0.007, 0.010, 0.015, 0.030, 0.100, 1.0)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.002, 0.003, 0.004, 0.005, 0.006)
+
+def _labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, v) for k, v in items) + "}"
+
+def _format_bound(bound):
+    return "{:g}".format(bound)
+
+class Histogram:
+
+    def __init__(self, name, buckets, labels=()):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # one count per bucket, the last for values above every bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append("{}_bucket{} {}".format(self.name, _labels(self.labels, ("le", _format_bound(bound))), cumulative))
+        lines.append("{}_bucket{} {}".format(self.name, _labels(self.labels, ("le", "+Inf")), self.count))
+        lines.append("{}_sum{} {}".format(self.name, _labels(self.labels), self.sum))
+        lines.append("{}_count{} {}".format(self.name, _labels(self.labels), self.count))
+        return lines
+
+class Counter:
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = tuple(labels)
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def lines(self):
+        return ["{}{} {}".format(self.name, _labels(self.labels), self.value)]
+
+class Metrics:
+
+    def __init__(self, path=METRICS_FILE, flush_interval_s=METRICS_FLUSH_INTERVAL_S, clock=time.monotonic):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self.clock = clock
+        self._last_flush = clock()
+        # name -> (type, help, {labels: metric})
+        self._families = {}
+
+    def _get(self, kind, name, help, labels, make):
+        family = self._families.setdefault(name, (kind, help, {}))
+        labels = tuple(sorted(labels.items())) if labels else ()
+        metric = family[2].get(labels)
+        if metric is None:
+            metric = family[2][labels] = make(labels)
+        return metric
+
+    def histogram(self, name, help, buckets, **labels):
+        return self._get("histogram", name, help, labels, lambda l: Histogram(name, buckets, l))
+
+    def counter(self, name, help, **labels):
+        return self._get("counter", name, help, labels, lambda l: Counter(name, l))
+
+    def text(self):
+        lines = []
+        for name, (kind, help, metrics) in sorted(self._families.items()):
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for labels in sorted(metrics):
+                lines.extend(metrics[labels].lines())
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.text())
+        os.replace(tmp_path, self.path)
+        self._last_flush = self.clock()
+
+    def maybe_flush(self):
+        '''
+        Cheap to call every time step, writes the file once per flush interval.
+        '''
+        if self.clock() - self._last_flush >= self.flush_interval_s:
+            self.flush()
+
+def step_metrics(metrics):
+    '''
+    Per axis pulse interval and minimum step delay wait histograms, for the motor drivers.
+    return - dict axis -> (pulse interval, wait), None without metrics
+    '''
+    if metrics is None:
+        return None
+    result = {}
+    for ax in (axis.THETA, axis.RHO):
+        name = ax.name.lower()
+        result[ax] = (
+            metrics.histogram("sandtable_pulse_interval_seconds", "Time between step pulses of a motor.", PULSE_BUCKETS, axis=name),
+            metrics.histogram("sandtable_step_delay_wait_seconds", "Time blocked waiting for the minimum step delay.", WAIT_BUCKETS, axis=name),
+        )
+    return result
@@ -30,26 +30,57 @@ Translate move pattern points into time-based intermediate/ step based moves
         - Delay time increment size
 """
 
+import asyncio
+import itertools
 import math
-import time
-from datetime import datetime, timedelta
+import threading
+import numpy as np
 from constants import *
+from tick_scheduler import TickScheduler
+from move_pipeline import MovePipeline
+from plan_cache import PlanCache
 import logging
 
+def interleave_pulses(theta_pulses, rho_pulses):
+    '''
+    Spread both motors' pulses evenly over one time step, so each only waits its own minimum step
+    interval. Motors pulsed in the same slot share the step edge.
+    return - list of (theta, rho) True/False per pulse
+    '''
+    slots = max(theta_pulses, rho_pulses)
+    # Bresenham style, both axes pulse in the first slot
+    return [(k * theta_pulses % slots < theta_pulses, k * rho_pulses % slots < rho_pulses) for k in range(slots)]
+
 class MotionPlanner:
 
     motors = None
-    current_position = (0, 0) # (theta, rho)
+    _current_position = (0, 0) # (theta, rho) commanded position
+    current_steps = (0, 0) # (theta, rho) actual position, in axis steps from zero
+    progress = 0 # move or time step the pattern playing would continue from
     logger = logging.getLogger(__name__)
 
-    def __init__(self, motors):
+    def __init__(self, motors, scheduler=None, accel=ACCEL_ENABLED, journal=None, plan_cache=None):
         self.motors = motors
+        # position_journal.PositionJournal, progress is recorded to it as patterns play
+        self.journal = journal
+        self._cancel_program = threading.Event()
+        # ramp each move's step rate up and down
+        self.accel = accel
+        # time steps are scheduled against absolute deadlines
+        self.scheduler = scheduler if scheduler is not None else TickScheduler()
+        # moves are planned ahead while the current one plays
+        self.pipeline = MovePipeline(self)
+        # step schedules reused for moves with the same step counts
+        self.plan_cache = plan_cache if plan_cache is not None else PlanCache()
         # check axis speed doesn't exceed time step
-        ex_string = "{} motor steps per time step should be <=1, but is {}. Consider reducing speed or time step."
-        if AXIS_STEP_RATE_T > 1:
-            raise Exception(ex_string.format('Theta', AXIS_STEP_RATE_T))
-        if AXIS_STEP_RATE_R > 1:
-            raise Exception(ex_string.format('Rho', AXIS_STEP_RATE_R))
+        # without acceleration moves start at full speed, so limit to one step per time step
+        max_rate_t = AXIS_MAX_STEPS_PER_TIME_STEP_T if self.accel else 1
+        max_rate_r = AXIS_MAX_STEPS_PER_TIME_STEP_R if self.accel else 1
+        ex_string = "{} motor steps per time step should be <={}, but is {}. Consider reducing speed or time step."
+        if AXIS_STEP_RATE_T > max_rate_t:
+            raise Exception(ex_string.format('Theta', max_rate_t, AXIS_STEP_RATE_T))
+        if AXIS_STEP_RATE_R > max_rate_r:
+            raise Exception(ex_string.format('Rho', max_rate_r, AXIS_STEP_RATE_R))
 
     def _do_simple_reference_move(self, ax, dir, desired_state, steps_in_state, step_limit):
         step_count = 0
@@ -66,21 +97,20 @@ class MotionPlanner:
             if in_state_count >= steps_in_state:
                 self.logger.debug("Found ref:{} - {} {}".format(desired_state, ax, dir))
                 return step_count
-            time.sleep(MIN_STEP_DELAY)
+            self.scheduler.sleep(MIN_STEP_DELAY)
         raise Exception("Error during reference routine. could not find reference={} before exceeding step limit, moving axis {}".format(desired_state, ax))
 
     def reference_routine(self):
         R_STEP_INC = 65 * 2 # ~2mm
-        STEPS_IN_STATE = 5 # number of steps in desired state to consider it found
-        R_STEPS_TO_LIMIT = 65 * 4
+        STEPS_IN_STATE = REF_STEPS_IN_STATE # number of steps in desired state to consider it found
 
-        start_time = datetime.now()
-        timeout = timedelta(minutes=45)  # timeout for seeking reference (it moves slowly)
+        start_time = self.scheduler.clock()
+        timeout = 45 * 60 # seconds, timeout for seeking reference (it moves slowly)
         in_state_count = 0
         found_reference = False
 
         # find the sensor leading edge - spiralling outwards
-        while datetime.now() - start_time < timeout and not found_reference:
+        while self.scheduler.clock() - start_time < timeout and not found_reference:
             # loop theta, full rotation    
             for i in range(T_FULL_ROTATION_STEPS):
                 self._play_both_axis_step((direction.FORWARD, direction.FORWARD), (True, False))
@@ -92,67 +122,214 @@ class MotionPlanner:
                     self.logger.debug("Found theta+")
                     found_reference = True
                     break
-                time.sleep(MIN_STEP_DELAY)
+                self.scheduler.sleep(MIN_STEP_DELAY)
 
             if not found_reference:
                 # increment rho
                 self.logger.debug("rho step out")
                 for i in range(R_STEP_INC):
                     self._play_both_axis_step((direction.FORWARD, direction.FORWARD), (False, True))
-                    time.sleep(MIN_STEP_DELAY)
+                    self.scheduler.sleep(MIN_STEP_DELAY)
 
         if found_reference:        
-            self.logger.debug("Ref found... refining position")
-            # find the sensor trailing edge in theta+
-            ref_step_count_fw = self._do_simple_reference_move(axis.THETA, direction.FORWARD, False, STEPS_IN_STATE, 500)
-            self.logger.debug("Theta step count forward: {}".format(ref_step_count_fw))
-
-            ref_step_count_bw_1 = self._do_simple_reference_move(axis.THETA, direction.BACKWARD, True, STEPS_IN_STATE, 50)
-            # find the sensor trailing edge in theta-
-            ref_step_count_bw_2 = self._do_simple_reference_move(axis.THETA, direction.BACKWARD, False, STEPS_IN_STATE, 500)
-            ref_step_count_bw = ref_step_count_bw_1 + ref_step_count_bw_2
-            self.logger.debug("Theta step count reverse: {} = {}+{}".format(ref_step_count_bw, ref_step_count_bw_1, ref_step_count_bw_2))
-
-            # move to the middle of the leading and trailing edges
-            count_mid = int(ref_step_count_bw / 2)
-            self.logger.debug("Moving to theta mid point. Steps to middle: {}".format(count_mid))
-            for i in range(count_mid):
-                self._play_both_axis_step((direction.FORWARD, direction.FORWARD), (True, False))
-                time.sleep(MIN_STEP_DELAY)
-
-            if not self.motors.is_reference_sensor_triggered():
-                raise Exception("Ref sensor not found after moving to Theta mid point.")
-
-            self.logger.debug("Finding rho trailing edge")
-            # find the sensor trailing edge in rho
-            self._do_simple_reference_move(axis.RHO, direction.BACKWARD, False, STEPS_IN_STATE, 500)
-
-            # move rho to the limit
-            self.logger.debug("Moving rho to limit")
-            for i in range(R_STEPS_TO_LIMIT):
-                self._play_both_axis_step((direction.FORWARD, direction.FORWARD), (False, True))
-                time.sleep(MIN_STEP_DELAY)
-            
-            self.current_position = (0, AXIS_MAX_R)
-            self.logger.info("Referencing complete.")
+            self._refine_reference()
         else:
             raise Exception("Reference sensor not found before timeout")
 
-    def _count_steps_to_position(self, position, position_next):
-        # subtract current position from target position
-        pos_change = (position_next[0]-position[0], position_next[1]-position[1])
+    def _refine_reference(self):
+        STEPS_IN_STATE = REF_STEPS_IN_STATE
+
+        self.logger.debug("Ref found... refining position")
+        # find the sensor trailing edge in theta+
+        ref_step_count_fw = self._do_simple_reference_move(axis.THETA, direction.FORWARD, False, STEPS_IN_STATE, 500)
+        self.logger.debug("Theta step count forward: {}".format(ref_step_count_fw))
+
+        ref_step_count_bw_1 = self._do_simple_reference_move(axis.THETA, direction.BACKWARD, True, STEPS_IN_STATE, 50)
+        # find the sensor trailing edge in theta-
+        ref_step_count_bw_2 = self._do_simple_reference_move(axis.THETA, direction.BACKWARD, False, STEPS_IN_STATE, 500)
+        ref_step_count_bw = ref_step_count_bw_1 + ref_step_count_bw_2
+        self.logger.debug("Theta step count reverse: {} = {}+{}".format(ref_step_count_bw, ref_step_count_bw_1, ref_step_count_bw_2))
+
+        # move to the middle of the leading and trailing edges
+        count_mid = int(ref_step_count_bw / 2)
+        self.logger.debug("Moving to theta mid point. Steps to middle: {}".format(count_mid))
+        for i in range(count_mid):
+            self._play_both_axis_step((direction.FORWARD, direction.FORWARD), (True, False))
+            self.scheduler.sleep(MIN_STEP_DELAY)
+
+        if not self.motors.is_reference_sensor_triggered():
+            raise Exception("Ref sensor not found after moving to Theta mid point.")
+
+        self.logger.debug("Finding rho trailing edge")
+        # find the sensor trailing edge in rho
+        self._do_simple_reference_move(axis.RHO, direction.BACKWARD, False, STEPS_IN_STATE, 500)
+
+        # move rho to the limit
+        self.logger.debug("Moving rho to limit")
+        for i in range(REF_R_STEPS_TO_LIMIT):
+            self._play_both_axis_step((direction.FORWARD, direction.FORWARD), (False, True))
+            self.scheduler.sleep(MIN_STEP_DELAY)
         
+        self.current_position = (0, AXIS_MAX_R)
+        self.logger.info("Referencing complete.")
+
+    def _coarse_sweep(self, dir, step, count, detect=True):
+        '''
+        Step at the drivers' minimum step interval.
+        detect - stop when the sensor triggers
+        return - True if the sensor triggered
+        '''
+        for i in range(count):
+            self._play_both_axis_step(dir, step)
+            if detect and self.motors.is_reference_sensor_triggered():
+                return True
+        return False
+
+    def _coarse_ring_sweep(self, ring_r_steps, ring_count, t_steps, rho_dir):
+        '''
+        Sweep theta over t_steps on each of ring_count rings, ring_r_steps apart, alternating theta direction.
+        return - theta direction the sensor triggered in, None if not found
+        '''
+        t_dir = direction.FORWARD
+        for ring in range(ring_count):
+            if self._coarse_sweep((t_dir, t_dir), (True, False), t_steps):
+                return t_dir
+            self._coarse_sweep((rho_dir, rho_dir), (False, True), ring_r_steps, detect=False)
+            # sweep back the other way on the next ring, rather than rewinding
+            t_dir = direction.BACKWARD if t_dir == direction.FORWARD else direction.FORWARD
+        return None
+
+    def _local_reference_search(self, last_known_position):
+        '''
+        Search a window around where the sensor should be, given the last known position.
+        return - theta direction the sensor triggered in, None if not found
+        '''
+        # nearest sensor theta, a whole number of rotations from the reference
+        rotations = round((last_known_position[0] - REF_SENSOR_POSITION[0]) / T_FULL_ROTATION)
+        sensor_t = REF_SENSOR_POSITION[0] + rotations * T_FULL_ROTATION
+        ring_r_steps = max(1, int(SENSOR_FOOTPRINT / AXIS_STEP_R))
+        window_t_steps = int(REF_SEARCH_WINDOW_T / AXIS_STEP_T)
+        window_rings = int(REF_SEARCH_WINDOW_R / SENSOR_FOOTPRINT)
+
+        # to the corner of the window
+        self.logger.debug("Searching for reference near {:.2f}, {:.2f}".format(sensor_t, REF_SENSOR_POSITION[1]))
+        start = (sensor_t - REF_SEARCH_WINDOW_T, REF_SENSOR_POSITION[1] - window_rings * SENSOR_FOOTPRINT)
+        steps = self._count_steps_to_position(last_known_position, start)
+        for count, step in ((steps[0], (True, False)), (steps[1], (False, True))):
+            dir = direction.FORWARD if count > 0 else direction.BACKWARD
+            self._coarse_sweep((dir, dir), step, abs(count), detect=False)
+        return self._coarse_ring_sweep(ring_r_steps, 2 * window_rings + 1, 2 * window_t_steps, direction.FORWARD)
+
+    def _coarse_reference_search(self):
+        '''
+        Sensor search from an unknown position. Spiral outwards, rings a sensor width apart so it can't be
+        passed over, then inwards in case the start was outside the sensor.
+        return - theta direction the sensor triggered in, None if not found
+        '''
+        ring_r_steps = max(1, int(SENSOR_FOOTPRINT / AXIS_STEP_R))
+        ring_count = math.ceil(AXIS_MAX_R / SENSOR_FOOTPRINT)
+        for rho_dir in (direction.FORWARD, direction.BACKWARD):
+            self.logger.debug("Coarse reference search, rho {}".format(rho_dir))
+            t_dir = self._coarse_ring_sweep(ring_r_steps, ring_count, T_FULL_ROTATION_STEPS, rho_dir)
+            if t_dir is not None:
+                return t_dir
+        return None
+
+    def _centre_on_sensor(self, t_dir):
+        '''
+        A coarse hit can be anywhere on the sensor, maybe only clipping its edge. Move to the middle of
+        the theta chord it was found on, then to the middle of the sensor in rho, so refinement starts
+        from the sensor centre.
+        '''
+        t_reverse = direction.BACKWARD if t_dir == direction.FORWARD else direction.FORWARD
+        chord = self._do_simple_reference_move(axis.THETA, t_dir, False, 1, 500)
+        self._coarse_sweep((t_reverse, t_reverse), (True, False), math.ceil(chord / 2), detect=False)
+
+        self._do_simple_reference_move(axis.RHO, direction.BACKWARD, False, 1, 500)
+        chord = self._do_simple_reference_move(axis.RHO, direction.FORWARD, False, 1, 500)
+        self._coarse_sweep((direction.BACKWARD, direction.BACKWARD), (False, True), math.ceil(chord / 2), detect=False)
+
+    def fast_reference_routine(self, last_known_position=None):
+        '''
+        Coarse to fine reference. A fast sweep finds the sensor, then the slow refinement of
+        reference_routine runs from its centre.
+        last_known_position - (theta, rho) where the table was when it stopped, searched around first
+        '''
+        start_time = self.scheduler.clock()
+        t_dir = None
+        if last_known_position is not None:
+            t_dir = self._local_reference_search(last_known_position)
+            if t_dir is None:
+                self.logger.info("Reference not found near last known position, searching whole table")
+        if t_dir is None:
+            t_dir = self._coarse_reference_search()
+        if t_dir is None:
+            raise Exception("Reference sensor not found in coarse search")
+
+        self._centre_on_sensor(t_dir)
+        self._refine_reference()
+        self.logger.info("Reference took {:.1f} s".format(self.scheduler.clock() - start_time))
+
+    @property
+    def current_position(self):
+        '''
+        Commanded position, the end of the last move played.
+        '''
+        return self._current_position
+
+    @current_position.setter
+    def current_position(self, position):
+        # setting the position directly, e.g. after referencing, also sets the step position
+        self._current_position = position
+        self.current_steps = self._position_to_steps(position)
+
+    @property
+    def actual_position(self):
+        '''
+        Position the motors were actually stepped to, the commanded position to within one axis step.
+        '''
+        return self.steps_to_position(self.current_steps)
+
+    def steps_to_position(self, steps):
+        return (steps[0] * AXIS_STEP_T, steps[1] * AXIS_STEP_R)
+
+    def record_progress(self, progress):
+        '''
+        progress - move or time step index the current pattern would continue from
+        '''
+        self.progress = progress
+        if self.journal is not None:
+            self.journal.record_progress(self.current_steps, progress)
+
+    def _position_to_steps(self, position):
+        # absolute position in axis steps. Rounded before truncating so whole steps aren't lost to float error
+        return (int(round(position[0] / AXIS_STEP_T, 6)), int(round(position[1] / AXIS_STEP_R, 6)))
+
+    def _count_steps_to_position(self, position, position_next, start_steps=None):
+        '''
+        Steps between absolute step positions, so the part step left over from one move is carried to the next
+        rather than truncated away.
+        start_steps - step position of position, if already known
+        '''
+        if start_steps is None:
+            start_steps = self._position_to_steps(position)
+        next_steps = self._position_to_steps(position_next)
+
         # calulcate number of motor steps to complete the move
-        steps_t = int(pos_change[0] / AXIS_STEP_T)
-        steps_r = int(pos_change[1] / AXIS_STEP_R)
+        steps_t = next_steps[0] - start_steps[0]
+        steps_r = next_steps[1] - start_steps[1]
         steps = (steps_t, steps_r)
         
-        self.logger.debug("pos start, end: {} -> {}".format(self.current_position, position_next))
+        self.logger.debug("pos start, end: {} -> {}".format(position, position_next))
         self.logger.debug("steps: {}".format(steps))
         
         return steps
     
     def _get_axis_steps_list(self, max_time_steps, steps):
+        '''
+        Reference implementation of the step accumulator, one time step at a time.
+        Planning uses _get_axis_steps_array, this is kept to check it against.
+        '''
         result = []
         cumulative_ratio = 0.0
 
@@ -173,69 +350,187 @@ class MotionPlanner:
                     result.append(False)
         return result
 
-    def get_steps_for_move(self, position_next):
+    def _get_axis_steps_array(self, max_time_steps, steps):
+        '''
+        Vectorised integer DDA. A step is set in each time step where
+        floor(i * steps / max_time_steps) increments, the same positions as the
+        accumulator in _get_axis_steps_list, without float rounding.
+        return numpy bool array, one entry per time step
+        '''
+        max_time_steps = int(max_time_steps)
+        if max_time_steps <= 0:
+            return np.zeros(0, dtype=bool)
+        cumulative = np.arange(1, max_time_steps + 1, dtype=np.int64) * int(steps) // max_time_steps
+        return np.diff(cumulative, prepend=0) > 0
+
+    def _get_profile(self, step_counts_abs):
+        '''
+        Trapezoidal velocity profile shared by both axes, so the move stays a straight line in (theta, rho).
+        Peak speed and acceleration are limited by whichever axis reaches its limit first.
+        return (speed, accel, accel time, total time) as fractions of the move and time steps, None if no move
+        '''
+        speed = None
+        accel = None
+        for steps, step_rate, step_accel in zip(step_counts_abs, (AXIS_STEP_RATE_T, AXIS_STEP_RATE_R), (AXIS_STEP_ACCEL_T, AXIS_STEP_ACCEL_R)):
+            if steps > 0:
+                # limits as fractions of the move per time step
+                speed = min(speed, step_rate / steps) if speed is not None else step_rate / steps
+                accel = min(accel, step_accel / steps) if accel is not None else step_accel / steps
+        if speed is None:
+            return None
+
+        if speed * speed / accel >= 1:
+            # triangle, never reaches cruise speed
+            t_accel = math.sqrt(1 / accel)
+            speed = accel * t_accel
+            t_total = 2 * t_accel
+        else:
+            t_accel = speed / accel
+            t_total = 2 * t_accel + (1 - speed * t_accel) / speed
+        return speed, accel, t_accel, t_total
+
+    def _get_profile_fractions(self, step_counts_abs):
+        '''
+        return numpy float array, fraction of the move completed at the end of each time step
+        '''
+        profile = self._get_profile(step_counts_abs)
+        if profile is None:
+            return np.zeros(0)
+        speed, accel, t_accel, t_total = profile
+        d_accel = 0.5 * accel * t_accel ** 2
+
+        # stretch to a whole number of time steps, only ever slower than the limits
+        time_steps = math.ceil(t_total)
+        t = np.arange(1, time_steps + 1) * (t_total / time_steps)
+        fractions = np.where(
+            t < t_accel,
+            0.5 * accel * t ** 2,
+            np.where(t <= t_total - t_accel,
+                     d_accel + speed * (t - t_accel),
+                     1 - 0.5 * accel * (t_total - t) ** 2))
+        fractions[-1] = 1.0
+        return fractions
+
+    def _get_axis_steps_profile(self, fractions, steps):
+        '''
+        return numpy int array, number of steps in each time step following the profile
+        '''
+        cumulative = np.floor(fractions * steps + 1e-9).astype(np.int64)
+        cumulative[-1:] = steps
+        return np.diff(cumulative, prepend=0)
+
+    def get_move_time_steps(self, step_counts):
+        '''
+        Number of time steps a move of step_counts (theta, rho) takes, without planning it.
+        '''
+        step_counts_abs = tuple(map(abs, step_counts))
+        if self.accel:
+            profile = self._get_profile(step_counts_abs)
+            return 0 if profile is None else math.ceil(profile[3])
+
+        time_steps_t = math.ceil(step_counts_abs[0] / AXIS_STEP_RATE_T)
+        time_steps_r = math.ceil(step_counts_abs[1] / AXIS_STEP_RATE_R)
+        # the slowest axis sets the move time
+        return max(time_steps_t, time_steps_r)
+
+    def get_steps_for_move(self, position_next, position_start=None):
         '''
         params
-            position - tuple int (theta, rho) current position
             position_next - tuple int (theta, rho) next position
+            position_start - tuple int (theta, rho) start position, current position if None
         return dict
             directions - tuple F/R for each axis
-            axis_steps_list - list of tuples (theta, rho) for each time step
+            axis_steps_list - numpy array, shape (time steps, 2), (theta, rho) for each time step
+                bool steps, or int step counts with acceleration
         '''
+        start_steps = None
+        if position_start is None:
+            position_start = self.current_position
+            start_steps = self.current_steps
+
         # get the number of steps between current and new position
-        step_counts = self._count_steps_to_position(self.current_position, position_next)
+        step_counts = self._count_steps_to_position(position_start, position_next, start_steps)
         
-        # get directions - negative is reverse
-        directions = tuple((direction.FORWARD if x > 0 else direction.BACKWARD for x in step_counts))
-        step_counts_abs = tuple(map(abs, step_counts))
-
-        # calculate the number of time steps required to move the distance
-        time_steps_t = math.ceil(step_counts_abs[0] / AXIS_STEP_RATE_T)
-        time_steps_r = math.ceil(step_counts_abs[1] / AXIS_STEP_RATE_R)
-        time_steps = (time_steps_t, time_steps_r)
-        # get the maximum
-        max_time_steps = max(time_steps)
-
-        # create the axis step lists
-        theta_list = self._get_axis_steps_list(max_time_steps, step_counts_abs[0])
-        rho_list = self._get_axis_steps_list(max_time_steps, step_counts_abs[1])
-        steps_list = list(zip(theta_list, rho_list))
-
-        # create the result dictionary
-        result_dict = {
-            'start_position': self.current_position,
+        directions, steps_list = self._get_steps_schedule(step_counts)
+        return {
+            'start_position': position_start,
             'end_position': position_next,
             'directions': directions,
             'axis_steps_list': steps_list
         }
-        return result_dict
 
-    def _play_one_axis_step(self, axis, dir, gear_ratio):
+    def _get_steps_schedule(self, step_counts):
+        '''
+        Time step schedule for the step counts, from the plan cache if planned before.
+        step_counts - tuple int (theta, rho) steps to move, negative is reverse
+        return - (directions, read only axis steps array)
+        '''
+        step_counts = (int(step_counts[0]), int(step_counts[1]))
+        key = (self.accel, step_counts)
+        schedule = self.plan_cache.get(key)
+        if schedule is not None:
+            return schedule
+
+        # get directions - negative is reverse
+        directions = tuple((direction.FORWARD if x > 0 else direction.BACKWARD for x in step_counts))
+        step_counts_abs = tuple(map(abs, step_counts))
+
+        if self.accel:
+            fractions = self._get_profile_fractions(step_counts_abs)
+            theta_steps = self._get_axis_steps_profile(fractions, step_counts_abs[0])
+            rho_steps = self._get_axis_steps_profile(fractions, step_counts_abs[1])
+        else:
+            # calculate the number of time steps required to move the distance
+            max_time_steps = self.get_move_time_steps(step_counts_abs)
+
+            # create the axis step lists
+            theta_steps = self._get_axis_steps_array(max_time_steps, step_counts_abs[0])
+            rho_steps = self._get_axis_steps_array(max_time_steps, step_counts_abs[1])
+        steps_list = np.column_stack((theta_steps, rho_steps))
+        # shared by every move with these step counts
+        steps_list.flags.writeable = False
+
+        self.plan_cache.put(key, (directions, steps_list), steps_list.nbytes)
+        return directions, steps_list
+
+    def _play_one_axis_step(self, ax, dir, gear_ratio):
         is_reverse = dir != direction.FORWARD
-        for i in range(int(gear_ratio)):
-            self.motors.step(axis, is_reverse)
-            time.sleep(MIN_STEP_DELAY)  # small delay to allow motor to step
+        pulse = (True, False) if ax == axis.THETA else (False, True)
+        self.motors.step_batch((is_reverse, is_reverse), [pulse] * int(gear_ratio))
 
-    def _play_both_axis_step(self, dir, step):
+    def get_pulses(self, dir, step):
+        '''
+        Motor pulses for one time step.
+        step - (theta, rho) True/False, or number of steps for each axis
+        return - ((theta, rho) reverse, list of (theta, rho) True/False per pulse), None if nothing to step
+        '''
         rho_count = 0
-        
-        if step[0]:
-            self._play_one_axis_step(axis.THETA, dir[0], AXIS_GEAR_RATIO_T)
-            # axis coupled, so rho must also step.
-            # rho -1 for each theta +1 and vice versa
-            if dir[0] == direction.FORWARD:
-                rho_count += 1
-            else:
-                rho_count -= 1
-        
-        if step[1]:
-            rho_count += 1 if dir[1] == direction.FORWARD else -1
+        theta_count = int(step[0])
 
-        rho_direction = direction.FORWARD if rho_count >= 0 else direction.BACKWARD
-        rho_count = abs(rho_count)
-        for i in range(rho_count):
-            self._play_one_axis_step(axis.RHO, rho_direction, AXIS_GEAR_RATIO_R)
+        # axis coupled, so rho must also step.
+        # rho -1 for each theta +1 and vice versa
+        if dir[0] == direction.FORWARD:
+            rho_count += theta_count
+        else:
+            rho_count -= theta_count
+
+        rho_count += int(step[1]) if dir[1] == direction.FORWARD else -int(step[1])
 
+        theta_pulses = theta_count * int(AXIS_GEAR_RATIO_T)
+        rho_pulses = abs(rho_count) * int(AXIS_GEAR_RATIO_R)
+        if not (theta_pulses or rho_pulses):
+            return None
+        return (dir[0] != direction.FORWARD, rho_count < 0), interleave_pulses(theta_pulses, rho_pulses)
+
+    def _play_both_axis_step(self, dir, step):
+        '''
+        Motor steps for one time step, played by the drivers as one batch. The drivers keep each
+        motor's minimum step interval.
+        step - (theta, rho) True/False, or number of steps for each axis
+        '''
+        batch = self.get_pulses(dir, step)
+        if batch is not None:
+            self.motors.step_batch(*batch)
 
     def play_move(self, move):
         '''
@@ -243,27 +538,256 @@ class MotionPlanner:
         move - dict:
             start_position - tuple (theta, rho) current position
             end_position - tuple (theta, rho) next position
-            axis_steps_list - list of tuples (theta, rho) contraining step True/False for each time step
+            axis_steps_list - list of tuples or numpy array (theta, rho) contraining step True/False, or step count, for each time step
             directions - tuple F/R for each axis
         '''
         axis_steps_list = move['axis_steps_list']
         directions = move['directions']
 
+        # a move played on its own gets its own schedule, within a pattern it continues the pattern's
+        own_schedule = not self.scheduler.running
+        if own_schedule:
+            self.scheduler.start()
+
         # iterate through the axis steps list
         for step in axis_steps_list:
             # execute the axis steps
             self._play_both_axis_step(directions, step)
-            # wait for time step
-            time.sleep(TIME_STEP_S)
-        
-        self.current_position = move["end_position"]
+            # wait for the end of the time step
+            self.scheduler.wait()
+
+        if own_schedule:
+            self.scheduler.stop()
+
+        self._add_steps(directions, np.asarray(axis_steps_list, dtype=np.int64).reshape(-1, 2).sum(axis=0))
+        self._current_position = move["end_position"]
+
+    def play_time_step(self, directions, step):
+        '''
+        Step the motors for one time step and track the position, without waiting for the time step to end.
+        step - (theta, rho) True/False, or number of steps for each axis
+        '''
+        self._play_both_axis_step(directions, step)
+        self._add_steps(directions, step)
+
+    def move_time_steps(self, move):
+        '''
+        Play a move one time step at a time, for callers that schedule time steps themselves,
+        e.g. multi_table.TableController. Yields after stepping each time step.
+        move - as play_move
+        '''
+        directions = move['directions']
+        for step in move['axis_steps_list']:
+            self.play_time_step(directions, step)
+            yield
+        self._current_position = move["end_position"]
+
+    def program_time_steps(self, program, start_time_step=0):
+        '''
+        Play a compiled program one time step at a time, as move_time_steps. The planner must
+        already be at the program's position for start_time_step. Stops early if cancelled.
+        '''
+        time_step = start_time_step
+        for directions, step in program.iter_from(start_time_step):
+            if self._cancel_program.is_set():
+                self._current_position = self.actual_position
+                return
+            self.play_time_step(directions, step)
+            time_step += 1
+            self.record_progress(time_step)
+            yield
+        self._current_position = program.end_position
+
+    def _add_steps(self, directions, step_counts):
+        # track the actual position from the steps played
+        signs = tuple(1 if d == direction.FORWARD else -1 for d in directions)
+        self.current_steps = (self.current_steps[0] + signs[0] * int(step_counts[0]),
+                              self.current_steps[1] + signs[1] * int(step_counts[1]))
+
+    def _start_schedule(self):
+        self.scheduler.reset_stats()
+        self.scheduler.start()
+
+    def _stop_schedule(self):
+        self.scheduler.stop()
+        stats = self.scheduler.get_stats()
+        self.logger.info("Played {} time steps, {} overruns, max {:.1f} ms late, {} resyncs".format(
+            stats['time_steps'], stats['overruns'], stats['max_overrun_s'] * 1000, stats['resyncs']))
     
-    def play(self, pattern):
-        # loop through position changes
-        for position in pattern:
-            move = self.get_steps_for_move(position)
-            # execute motor steps to complete the move
-            self.play_move(move)
+    def play(self, pattern, start_index=0):
+        '''
+        Play every position in the pattern, planning moves ahead of the one playing.
+        start_index - position in the pattern to continue from, e.g. when resuming
+        return - True if the whole pattern played, False if cancelled
+        '''
+        if start_index:
+            # patterns that can seek, e.g. track files, skip straight to the start
+            if hasattr(pattern, 'iter_from'):
+                pattern = pattern.iter_from(start_index)
+            else:
+                pattern = itertools.islice(pattern, start_index, None)
+        if not self.pipeline.cancelled:
+            # journal the position before moving, so it isn't left looking like a clean stop
+            self.record_progress(start_index)
+        self._start_schedule()
+        try:
+            return self.pipeline.play(pattern, start_index)
+        finally:
+            self._stop_schedule()
+            self.plan_cache.log_stats()
+
+    def cancel(self):
+        # stop the pattern being played after the current move or time step, and any played after it
+        self.pipeline.cancel()
+        self._cancel_program.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_program.is_set()
+
+    def clear_cancel(self):
+        # allow patterns to play again after cancel()
+        self.pipeline.clear_cancel()
+        self._cancel_program.clear()
+
+    def play_program(self, program, start_time_step=0):
+        '''
+        params
+        program - compiled step_program.StepProgram, iterates (directions, step) per time step
+        start_time_step - time step to continue from, e.g. when resuming
+        return - True if the whole program played, False if cancelled
+        '''
+        if self._cancel_program.is_set():
+            self.logger.info("Program cancelled before starting")
+            return False
+        # journal the position before moving, so it isn't left looking like a clean stop
+        self.record_progress(start_time_step)
+        self._start_schedule()
+        try:
+            # programs are compiled from the pattern's first point, move to where it starts
+            start_steps = program.steps_at(start_time_step)
+            self.play_move(self.get_steps_for_move(self.steps_to_position(start_steps)))
+
+            time_step = start_time_step
+            for directions, step in program.iter_from(start_time_step):
+                if self._cancel_program.is_set():
+                    self.logger.info("Program cancelled at time step {}".format(time_step))
+                    self._current_position = self.actual_position
+                    return False
+                self.play_time_step(directions, step)
+                time_step += 1
+                self.record_progress(time_step)
+                self.scheduler.wait()
+        finally:
+            self._stop_schedule()
+
+        self._current_position = program.end_position
+        return True
+
+    # asyncio playback, the same moves as the methods above with the waits awaited, so other tasks
+    # can run while the motors move. Planning is done between moves in the event loop, it's quick
+    # with the plan cache. cancel() or cancelling the task stops mid-move, at the end of a time step.
+
+    async def _play_both_axis_step_async(self, dir, step):
+        batch = self.get_pulses(dir, step)
+        if batch is not None:
+            step_batch_async = getattr(self.motors, 'step_batch_async', None)
+            if step_batch_async is not None:
+                await step_batch_async(*batch)
+            else:
+                # drivers without an async step don't wait, e.g. simulated
+                self.motors.step_batch(*batch)
+
+    async def _play_time_steps_async(self, directions, steps):
+        # False if cancelled part way, the position is where the motors got to
+        try:
+            for step in steps:
+                if self._cancel_program.is_set():
+                    self._current_position = self.actual_position
+                    return False
+                # a cancelled task still finishes the time step's pulses, so the position stays exact
+                stepping = asyncio.ensure_future(self._play_both_axis_step_async(directions, step))
+                try:
+                    await asyncio.shield(stepping)
+                finally:
+                    if not stepping.done():
+                        await stepping
+                    if stepping.exception() is None:
+                        self._add_steps(directions, step)
+                await self.scheduler.wait_async()
+        except asyncio.CancelledError:
+            self._current_position = self.actual_position
+            raise
+        return True
+
+    async def play_move_async(self, move):
+        '''
+        As play_move, awaiting each time step.
+        return - True if the whole move played, False if cancelled
+        '''
+        own_schedule = not self.scheduler.running
+        if own_schedule:
+            self.scheduler.start()
+        try:
+            if not await self._play_time_steps_async(move['directions'], move['axis_steps_list']):
+                return False
+        finally:
+            if own_schedule:
+                self.scheduler.stop()
+        self._current_position = move["end_position"]
+        return True
+
+    async def play_async(self, pattern, start_index=0):
+        '''
+        As play, awaiting each time step.
+        return - True if the whole pattern played, False if cancelled
+        '''
+        if start_index:
+            if hasattr(pattern, 'iter_from'):
+                pattern = pattern.iter_from(start_index)
+            else:
+                pattern = itertools.islice(pattern, start_index, None)
+        if self._cancel_program.is_set():
+            self.logger.info("Pattern cancelled before starting")
+            return False
+        self.record_progress(start_index)
+        self._start_schedule()
+        try:
+            for index, position in enumerate(pattern, start_index):
+                if not await self.play_move_async(self.get_steps_for_move(position)):
+                    self.logger.info("Pattern cancelled")
+                    return False
+                self.record_progress(index + 1)
+            return True
+        finally:
+            self._stop_schedule()
+
+    async def play_program_async(self, program, start_time_step=0):
+        '''
+        As play_program, awaiting each time step.
+        return - True if the whole program played, False if cancelled
+        '''
+        if self._cancel_program.is_set():
+            self.logger.info("Program cancelled before starting")
+            return False
+        self.record_progress(start_time_step)
+        self._start_schedule()
+        try:
+            start_steps = program.steps_at(start_time_step)
+            if not await self.play_move_async(self.get_steps_for_move(self.steps_to_position(start_steps))):
+                return False
+            time_step = start_time_step
+            for directions, step in program.iter_from(start_time_step):
+                if not await self._play_time_steps_async(directions, (step,)):
+                    self.logger.info("Program cancelled at time step {}".format(time_step))
+                    return False
+                time_step += 1
+                self.record_progress(time_step)
+        finally:
+            self._stop_schedule()
+
+        self._current_position = program.end_position
+        return True
 
 if __name__ == "__main__":
     print("## CONSTANTS")
@@ -274,7 +798,15 @@ if __name__ == "__main__":
 
     p = MotionPlanner(None)
     p.current_position = (0, 0)
-    print(p._count_steps_to_position((2, 10)))
+    print(p._count_steps_to_position(p.current_position, (2, 10)))
 
     p.current_position = (0, 0)
     print(p.get_steps_for_move((2, 10)))
+
+    print("## STEP LIST THROUGHPUT")
+    import timeit
+    max_time_steps, steps = 20000, 7919
+    n = 20
+    t_list = timeit.timeit(lambda: p._get_axis_steps_list(max_time_steps, steps), number=n) / n
+    t_array = timeit.timeit(lambda: p._get_axis_steps_array(max_time_steps, steps), number=n) / n
+    print("Accumulator: {:.3f} ms, vectorised: {:.3f} ms, x{:.1f}".format(t_list * 1000, t_array * 1000, t_list / t_array))
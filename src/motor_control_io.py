@@ -4,32 +4,36 @@ Control of stepper motors using direct GPIO to an A4988 Stepper Motor Driver or
 2 motors:
 stepper 1 - theta control
 stepper 2 - rho control
+
+Clock and sleep are injectable, the minimum step delay and pulse width are timed with them.
+step_batch_async() awaits them instead, for playing from an asyncio event loop.
+
+step_batch() plays a time step's steps for both motors at once. Motors stepping on the same pulse
+share its rising and falling edges, and the DIR and ENABLE pins are only written when they change.
 """
 
 import RPi.GPIO as GPIO
 from constants import *
+import asyncio
 import time
-from datetime import datetime, timedelta
+from metrics import step_metrics
 
 REFERENCE_SENSOR_PIN = 4 # GPIO pin for the reference sensor
 
-# Motor control pins
-THETA_STEP_PIN = 17 # Theta step when True
-THETA_DIR_PIN = 22 # Theta direction - CW when True
-RHO_STEP_PIN = 10
-RHO_DIR_PIN = 11
-
-MOTORS_ENABLE_PIN = 5
-
-STEP_PULSE_WIDTH = 0.001 # seconds, pulse width for the step signal
-
 class MotorControlIO:
     
-    theta_timestamp = datetime.now()
-    rho_timestamp = datetime.now()
+    theta_timestamp = None
+    rho_timestamp = None
     enabled = True
     
-    def __init__(self):
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, metrics=None, async_sleep=asyncio.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        # pulse interval and minimum step delay wait histograms per axis, if given metrics.Metrics
+        self._step_metrics = step_metrics(metrics)
+        # last level written to each direction pin
+        self._dir_levels = {}
         GPIO.setmode(GPIO.BCM) # Broadcom pin-numbering scheme
         GPIO.setup(REFERENCE_SENSOR_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP) # Sensor pin set as input w/ pull-up
         GPIO.setup(THETA_STEP_PIN, GPIO.OUT)
@@ -47,8 +51,37 @@ class MotorControlIO:
     def motors_release(self):
         self._motors_set_enable(False)  # Disable motors
 
+    def _ensure_enabled(self):
+        if not self.enabled:
+            self._motors_set_enable(True)
+
+    def _set_direction(self, pin, reverse, invert):
+        level = reverse == invert # CW when True
+        if self._dir_levels.get(pin) != level:
+            GPIO.output(pin, level)
+            self._dir_levels[pin] = level
+
+    def _min_step_wait(self, ax, timestamp):
+        # seconds until the minimum step delay since the axis last stepped is up
+        if timestamp is None:
+            return 0
+        now = self.clock()
+        remaining = max(timestamp + MIN_STEP_DELAY - now, 0)
+        if self._step_metrics is not None:
+            interval, wait = self._step_metrics[ax]
+            # the pulse follows the wait
+            interval.observe(max(now - timestamp, MIN_STEP_DELAY))
+            wait.observe(remaining)
+        return remaining
+
+    def _wait_min_step_delay(self, ax, timestamp):
+        # Wait for the minimum step delay since the axis last stepped
+        remaining = self._min_step_wait(ax, timestamp)
+        if remaining > 0:
+            self.sleep(remaining)
+
     def step(self, ax, reverse=False):
-        self._motors_set_enable(True)  # Ensure motors are enabled
+        self._ensure_enabled()
 
         if ax == axis.THETA:
             self.theta_step(reverse)
@@ -61,36 +94,71 @@ class MotorControlIO:
         if not self.enabled:
             raise RuntimeError("{} motor was asked to step when drivers were not enabled.".format("Theta"))
         
-        # Wait for the minimum step delay before stepping again
-        while (datetime.now() - self.theta_timestamp) < timedelta(seconds=MIN_STEP_DELAY):
-            time.sleep(0.001)
-        
-        if AXIS_T_INVERT_DIR:
-            reverse = reverse == False
+        self._wait_min_step_delay(axis.THETA, self.theta_timestamp)
         
-        GPIO.output(THETA_DIR_PIN, not reverse)  # Set direction
+        self._set_direction(THETA_DIR_PIN, reverse, AXIS_T_INVERT_DIR)
         GPIO.output(THETA_STEP_PIN, True)  # Step the motor
-        time.sleep(STEP_PULSE_WIDTH)  # Pulse width for the step signal
+        self.sleep(STEP_PULSE_WIDTH)  # Pulse width for the step signal
         GPIO.output(THETA_STEP_PIN, False)  # Reset step signal
-        self.theta_timestamp = datetime.now()
+        self.theta_timestamp = self.clock()
 
     def rho_step(self, reverse=False):
         if not self.enabled:
             raise RuntimeError("{} motor was asked to step when drivers were not enabled.".format("Rho"))
         
-        # Wait for the minimum step delay before stepping again
-        while (datetime.now() - self.rho_timestamp) < timedelta(seconds=MIN_STEP_DELAY):
-            time.sleep(0.001)
+        self._wait_min_step_delay(axis.RHO, self.rho_timestamp)
         
-        if AXIS_R_INVERT_DIR:
-            reverse = reverse == False
-        
-        GPIO.output(RHO_DIR_PIN, not reverse)  # Set direction
+        self._set_direction(RHO_DIR_PIN, reverse, AXIS_R_INVERT_DIR)
         GPIO.output(RHO_STEP_PIN, True)  # Step the motor
-        time.sleep(STEP_PULSE_WIDTH)  # Pulse width for the step signal
+        self.sleep(STEP_PULSE_WIDTH)  # Pulse width for the step signal
         GPIO.output(RHO_STEP_PIN, False)  # Reset step signal
-        self.rho_timestamp = datetime.now()
+        self.rho_timestamp = self.clock()
     
+    def _step_batch(self, reverse, pulses):
+        # generator of step_batch's waits in seconds, the caller sleeps or awaits each
+        self._ensure_enabled()
+        self._set_direction(THETA_DIR_PIN, reverse[0], AXIS_T_INVERT_DIR)
+        self._set_direction(RHO_DIR_PIN, reverse[1], AXIS_R_INVERT_DIR)
+
+        for theta, rho in pulses:
+            pins = []
+            remaining = 0
+            if theta:
+                remaining = self._min_step_wait(axis.THETA, self.theta_timestamp)
+                pins.append(THETA_STEP_PIN)
+            if rho:
+                remaining = max(remaining, self._min_step_wait(axis.RHO, self.rho_timestamp))
+                pins.append(RHO_STEP_PIN)
+            if not pins:
+                continue
+            if remaining > 0:
+                yield remaining
+            # shared edges for both step pins
+            GPIO.output(pins, True)
+            yield STEP_PULSE_WIDTH
+            GPIO.output(pins, False)
+            now = self.clock()
+            if theta:
+                self.theta_timestamp = now
+            if rho:
+                self.rho_timestamp = now
+
+    def step_batch(self, reverse, pulses):
+        '''
+        Step both motors for one time step.
+        reverse - (theta, rho) direction for every pulse in the batch
+        pulses - sequence of (theta, rho) True/False, the motors stepped on each pulse
+        '''
+        for seconds in self._step_batch(reverse, pulses):
+            self.sleep(seconds)
+
+    async def step_batch_async(self, reverse, pulses):
+        '''
+        As step_batch, awaiting the step delays and pulse widths so other tasks can run.
+        '''
+        for seconds in self._step_batch(reverse, pulses):
+            await self.async_sleep(seconds)
+
     def is_reference_sensor_triggered(self):
         # Sensor LOW when triggered. Low to return True.
         return GPIO.input(REFERENCE_SENSOR_PIN) == False
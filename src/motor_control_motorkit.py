@@ -4,6 +4,11 @@ Control of stepper motors on adafruit motorkit board
 2 motors:
 stepper 1 - theta control
 stepper 2 - rho control
+
+Clock and sleep are injectable, the minimum step delay is timed with them.
+
+step_batch() plays a time step's steps for both motors at once. The board is stepped over I2C,
+so motors on the same pulse step one after the other rather than on a shared edge.
 """
 
 from adafruit_motor import stepper
@@ -12,17 +17,21 @@ import RPi.GPIO as GPIO
 import board
 from constants import *
 import time
-from datetime import datetime, timedelta
+from metrics import step_metrics
 
 REFERENCE_SENSOR_PIN = 4 # GPIO pin for the reference sensor
 
 class MotorControlMotorKit:
     
     kit = None
-    theta_timestamp = datetime.now()
-    rho_timestamp = datetime.now()
+    theta_timestamp = None
+    rho_timestamp = None
     
-    def __init__(self):
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, metrics=None):
+        self.clock = clock
+        self.sleep = sleep
+        # pulse interval and minimum step delay wait histograms per axis, if given metrics.Metrics
+        self._step_metrics = step_metrics(metrics)
         self.kit = MotorKit(i2c=board.I2C())
 
         GPIO.setmode(GPIO.BCM) # Broadcom pin-numbering scheme
@@ -36,6 +45,19 @@ class MotorControlMotorKit:
         direction = stepper.BACKWARD if reverse else stepper.FORWARD
         motor.onestep(direction=direction, style=stepper.SINGLE)
 
+    def _wait_min_step_delay(self, ax, timestamp):
+        # Wait for the minimum step delay since the axis last stepped
+        if timestamp is not None:
+            now = self.clock()
+            remaining = timestamp + MIN_STEP_DELAY - now
+            if remaining > 0:
+                self.sleep(remaining)
+            if self._step_metrics is not None:
+                interval, wait = self._step_metrics[ax]
+                # the pulse follows the wait
+                interval.observe(max(now - timestamp, MIN_STEP_DELAY))
+                wait.observe(max(remaining, 0))
+
     def step(self, ax, reverse=False):
         if ax == axis.THETA:
             self.theta_step(reverse)
@@ -45,29 +67,37 @@ class MotorControlMotorKit:
             raise ValueError("Invalid axis. Use 'axis.THETA' or 'axis.RHO'.")
 
     def theta_step(self, reverse=False):
-        # Wait for the minimum step delay before stepping again
-        while (datetime.now() - self.theta_timestamp) < timedelta(seconds=MIN_STEP_DELAY):
-            time.sleep(0.001)
+        self._wait_min_step_delay(axis.THETA, self.theta_timestamp)
         
         if AXIS_T_INVERT_DIR:
             reverse = reverse == False
         
         m = self.kit.stepper1
         self._stepper_step(m, reverse)
-        self.theta_timestamp = datetime.now()
+        self.theta_timestamp = self.clock()
 
     def rho_step(self, reverse=False):
-        # Wait for the minimum step delay before stepping again
-        while (datetime.now() - self.rho_timestamp) < timedelta(seconds=MIN_STEP_DELAY):
-            time.sleep(0.001)
+        self._wait_min_step_delay(axis.RHO, self.rho_timestamp)
         
         if AXIS_R_INVERT_DIR:
             reverse = reverse == False
         
         m = self.kit.stepper2
         self._stepper_step(m, reverse)
-        self.rho_timestamp = datetime.now()
+        self.rho_timestamp = self.clock()
     
+    def step_batch(self, reverse, pulses):
+        '''
+        Step both motors for one time step.
+        reverse - (theta, rho) direction for every pulse in the batch
+        pulses - sequence of (theta, rho) True/False, the motors stepped on each pulse
+        '''
+        for theta, rho in pulses:
+            if theta:
+                self.theta_step(reverse[0])
+            if rho:
+                self.rho_step(reverse[1])
+
     def is_reference_sensor_triggered(self):
         # Sensor LOW when triggered. Low to return True.
         return GPIO.input(REFERENCE_SENSOR_PIN) == False
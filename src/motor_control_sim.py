@@ -0,0 +1,116 @@
+"""
+Simulated motors and reference sensor, to run the planner off-hardware.
+
+The ball position is worked out from the motor step counts, including the theta/rho coupling
+(rho moves -1 for each theta +1 unless the rho motor compensates). Rho steps past either
+end of travel are lost, like a stalled motor.
+
+The reference sensor triggers when the ball is within half the sensor footprint of its centre.
+Positions are in table coordinates, which only match the planner's once referenced.
+
+Time comes from an injected clock. The drivers' minimum step delay is modelled as a wait on it,
+as MotorControlIO does with its timestamps.
+"""
+
+import math
+import time
+from constants import *
+from metrics import step_metrics
+
+RHO_TRAVEL_MARGIN = 2 # mm, physical travel past 0 and AXIS_MAX_R before the rho motor stalls
+
+class MotorControlSim:
+
+    theta_motor_steps = 0
+    rho_motor_steps = 0
+    step_count = 0
+    theta_step_count = 0
+    rho_step_count = 0
+    lost_steps = 0
+    batch_count = 0
+
+    def __init__(self, start_position=(0, 0), sensor_position=REF_SENSOR_POSITION, sensor_footprint=SENSOR_FOOTPRINT,
+                 clock=time.monotonic, sleep=time.sleep, metrics=None):
+        self.sensor_position = sensor_position
+        self._step_metrics = step_metrics(metrics)
+        self.sensor_footprint = sensor_footprint
+        self.clock = clock
+        self.sleep = sleep
+        self.theta_timestamp = None
+        self.rho_timestamp = None
+
+        # whole steps as the planner counts them, so a referenced planner agrees with the simulated motors
+        theta_steps = int(round(start_position[0] / AXIS_STEP_T, 6))
+        rho_steps = int(round(start_position[1] / AXIS_STEP_R, 6))
+        self.theta_motor_steps = theta_steps * AXIS_GEAR_RATIO_T
+        self.rho_motor_steps = (rho_steps + theta_steps) * AXIS_GEAR_RATIO_R
+
+    @property
+    def position(self):
+        '''
+        (theta, rho) ball position in table coordinates
+        '''
+        theta_steps = self.theta_motor_steps / AXIS_GEAR_RATIO_T
+        rho_steps = self.rho_motor_steps / AXIS_GEAR_RATIO_R - theta_steps
+        return (theta_steps * AXIS_STEP_T, rho_steps * AXIS_STEP_R)
+
+    def motors_release(self):
+        pass
+
+    def _wait_min_step_delay(self, ax, timestamp):
+        if timestamp is not None:
+            now = self.clock()
+            remaining = timestamp + MIN_STEP_DELAY - now
+            if remaining > 0:
+                self.sleep(remaining)
+            if self._step_metrics is not None:
+                interval, wait = self._step_metrics[ax]
+                # the pulse follows the wait
+                interval.observe(max(now - timestamp, MIN_STEP_DELAY))
+                wait.observe(max(remaining, 0))
+        return self.clock()
+
+    def step(self, ax, reverse=False):
+        if ax == axis.THETA:
+            self.theta_step(reverse)
+        elif ax == axis.RHO:
+            self.rho_step(reverse)
+        else:
+            raise ValueError("Invalid axis. Use 'axis.THETA' or 'axis.RHO'.")
+
+    def theta_step(self, reverse=False):
+        self.theta_timestamp = self._wait_min_step_delay(axis.THETA, self.theta_timestamp)
+        self.theta_motor_steps += -1 if reverse else 1
+        self.step_count += 1
+        self.theta_step_count += 1
+
+    def rho_step(self, reverse=False):
+        self.rho_timestamp = self._wait_min_step_delay(axis.RHO, self.rho_timestamp)
+        self.step_count += 1
+        self.rho_step_count += 1
+        rho_motor_steps = self.rho_motor_steps + (-1 if reverse else 1)
+        rho = (rho_motor_steps / AXIS_GEAR_RATIO_R - self.theta_motor_steps / AXIS_GEAR_RATIO_T) * AXIS_STEP_R
+        # past the end of travel the motor stalls and the step is lost
+        if -RHO_TRAVEL_MARGIN <= rho <= AXIS_MAX_R + RHO_TRAVEL_MARGIN:
+            self.rho_motor_steps = rho_motor_steps
+        else:
+            self.lost_steps += 1
+
+    def step_batch(self, reverse, pulses):
+        '''
+        reverse - (theta, rho) direction for every pulse in the batch
+        pulses - sequence of (theta, rho) True/False, the motors stepped on each pulse
+        '''
+        self.batch_count += 1
+        for theta, rho in pulses:
+            if theta:
+                self.theta_step(reverse[0])
+            if rho:
+                self.rho_step(reverse[1])
+
+    def is_reference_sensor_triggered(self):
+        theta, rho = self.position
+        sensor_t, sensor_r = self.sensor_position
+        dx = rho * math.cos(theta) - sensor_r * math.cos(sensor_t)
+        dy = rho * math.sin(theta) - sensor_r * math.sin(sensor_t)
+        return dx * dx + dy * dy <= (self.sensor_footprint / 2) ** 2
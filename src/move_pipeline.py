@@ -0,0 +1,131 @@
+"""
+Look-ahead move planning.
+
+A producer thread plans upcoming moves into a bounded queue while the caller's thread plays
+them, so planning time is spent while the motors are busy rather than between moves.
+
+The producer plans each move from the previous planned position, not the planner's
+current position, which only changes as moves are played.
+
+## Cancellation
+cancel() stops the pipeline after the move being played, the producer thread is stopped
+and joined before play() returns. It stays cancelled, later plays return straight away,
+until clear_cancel() is called, so a cancel between plays isn't lost.
+"""
+
+import queue
+import threading
+from constants import *
+import logging
+
+_DONE = object() # end of pattern marker
+
+class MovePipeline:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, planner, depth=PLAN_QUEUE_DEPTH):
+        if depth < 1:
+            raise ValueError("Plan queue depth must be >= 1, but is {}.".format(depth))
+        self.planner = planner
+        self.depth = depth
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def clear_cancel(self):
+        self._cancel.clear()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _put(self, moves, item, stop):
+        # block while the queue is full, unless cancelled or stopped
+        while not (self._cancel.is_set() or stop.is_set()):
+            try:
+                moves.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self, pattern, moves, start_index, stop):
+        try:
+            # first move from the planner's step position, then from each planned point
+            position = None
+            for index, position_next in enumerate(pattern, start_index):
+                if self._cancel.is_set() or stop.is_set():
+                    return
+                move = self.planner.get_steps_for_move(position_next, position)
+                if not self._put(moves, (index, move), stop):
+                    return
+                position = position_next
+            self._put(moves, _DONE, stop)
+        except Exception as e:
+            # raised again in the playing thread
+            self._put(moves, e, stop)
+
+    def _start(self, pattern, start_index):
+        moves = queue.Queue(maxsize=self.depth)
+        # stops the producer when playing ends, without cancelling later plays
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(pattern, moves, start_index, stop), name="move-planner", daemon=True)
+        producer.start()
+        return moves, stop, producer
+
+    def planned(self, pattern, start_index=0):
+        '''
+        Generator of the pattern's planned moves, for a caller playing them itself without blocking.
+        Yields (index, move) for each move, or None when the next isn't planned yet.
+        Ends early if cancelled, closing it stops the producer.
+        '''
+        if self._cancel.is_set():
+            return
+        moves, stop, producer = self._start(pattern, start_index)
+        try:
+            while not self._cancel.is_set():
+                try:
+                    move = moves.get_nowait()
+                except queue.Empty:
+                    yield None
+                    continue
+                if move is _DONE:
+                    return
+                if isinstance(move, Exception):
+                    raise move
+                yield move
+        finally:
+            stop.set()
+            producer.join()
+
+    def play(self, pattern, start_index=0):
+        '''
+        Plan and play every position in the pattern.
+        start_index - index of the pattern's first position, for progress reporting
+        return - True if the whole pattern played, False if cancelled
+        '''
+        if self._cancel.is_set():
+            self.logger.info("Pattern cancelled before starting")
+            return False
+        moves, stop, producer = self._start(pattern, start_index)
+        try:
+            while not self._cancel.is_set():
+                try:
+                    move = moves.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if move is _DONE:
+                    return True
+                if isinstance(move, Exception):
+                    raise move
+                index, move = move
+                self.planner.play_move(move)
+                self.planner.record_progress(index + 1)
+            self.logger.info("Pattern cancelled")
+            return False
+        finally:
+            # stop the producer if it's still planning, e.g. play_move raised
+            stop.set()
+            producer.join()
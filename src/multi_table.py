@@ -0,0 +1,155 @@
+"""
+Drive several tables from one process.
+
+Each table has its own planner, motors, playlist, position and time step schedule. One
+controller thread plays them cooperatively: whichever table's time step is due next has
+it stepped, then the controller waits for the next deadline of any table. Nothing waits on
+a table's own schedule, so tables don't hold each other up.
+
+Moves are planned ahead in each planner's move pipeline thread. When a table's next move
+isn't planned yet it idles that time step, counted as a plan stall, rather than holding up
+the other tables while planning catches up. Compiled step programs need no planning.
+
+A table's step time still delays the others if its drivers block, as MotorControlIO does
+while waiting out MIN_STEP_DELAY. Drivers that hand pulses off to be timed elsewhere, e.g.
+pulse trains (pulse_train.py), keep every table on time.
+
+Clock and sleep are injectable, as for tick_scheduler.TickScheduler.
+"""
+
+import heapq
+import time
+from constants import *
+from tick_scheduler import MAX_LAG_TIME_STEPS
+import logging
+
+class Table:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, name, planner, playlist, repeat=True):
+        '''
+        planner - motion_planner.MotionPlanner, bound to the table's motors
+        playlist - list of patterns, or compiled step_program.StepProgram / StepProgramVariant
+        repeat - play the playlist again from the start when it ends
+        '''
+        self.name = name
+        self.planner = planner
+        self.playlist = playlist
+        self.repeat = repeat
+        self.pattern_index = 0
+        self.done = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.time_steps = 0
+        self.overruns = 0
+        self.max_overrun = 0.0
+        self.resyncs = 0
+        self.plan_stalls = 0
+
+    def _play_planned(self, pattern, start_index=0):
+        for planned in self.planner.pipeline.planned(pattern, start_index):
+            if planned is None:
+                # idle this time step while planning catches up
+                self.plan_stalls += 1
+                yield
+                continue
+            index, move = planned
+            yield from self.planner.move_time_steps(move)
+            self.planner.record_progress(index + 1)
+
+    def _play_program(self, program):
+        # programs are compiled from the pattern's first point, move to where it starts
+        yield from self._play_planned([self.planner.steps_to_position(program.steps_at(0))])
+        yield from self.planner.program_time_steps(program)
+
+    def play(self):
+        '''
+        Generator playing the playlist, yields after stepping each time step.
+        '''
+        while True:
+            for index, item in enumerate(self.playlist):
+                self.pattern_index = index
+                self.logger.info("Table {} playing pattern {}".format(self.name, index))
+                if hasattr(item, 'steps_at'):
+                    yield from self._play_program(item)
+                else:
+                    yield from self._play_planned(item)
+                if self.planner.cancelled:
+                    self.logger.info("Table {} cancelled".format(self.name))
+                    return
+            if not self.repeat:
+                return
+
+    def cancel(self):
+        self.planner.cancel()
+
+    def get_stats(self):
+        return {
+            'time_steps': self.time_steps,
+            'overruns': self.overruns,
+            'max_overrun_s': self.max_overrun,
+            'resyncs': self.resyncs,
+            'plan_stalls': self.plan_stalls,
+        }
+
+class TableController:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, period=TIME_STEP_S, clock=time.monotonic, sleep=time.sleep, max_lag_time_steps=MAX_LAG_TIME_STEPS):
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.max_lag = max_lag_time_steps * period
+        self.tables = []
+
+    def add_table(self, name, planner, playlist, repeat=True):
+        table = Table(name, planner, playlist, repeat)
+        self.tables.append(table)
+        return table
+
+    def cancel(self):
+        # every table stops after its current move or time step
+        for table in self.tables:
+            table.cancel()
+
+    def run(self):
+        '''
+        Play every table until all have finished their playlists or been cancelled.
+        '''
+        start = self.clock()
+        # (time step start, table number, table, time step generator), earliest first
+        due = [(start, number, table, table.play()) for number, table in enumerate(self.tables)]
+        heapq.heapify(due)
+        while due:
+            deadline, number, table, time_steps = due[0]
+            wait = deadline - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+            heapq.heappop(due)
+            try:
+                next(time_steps)
+            except StopIteration:
+                table.done = True
+                self._log_stats(table)
+                continue
+
+            table.time_steps += 1
+            next_deadline = deadline + self.period
+            now = self.clock()
+            late = now - next_deadline
+            if late > 0:
+                table.overruns += 1
+                table.max_overrun = max(table.max_overrun, late)
+                if late > self.max_lag:
+                    self.logger.warning("Table {} time step {:.1f} ms late, re-anchoring schedule".format(table.name, late * 1000))
+                    table.resyncs += 1
+                    next_deadline = now
+            heapq.heappush(due, (next_deadline, number, table, time_steps))
+
+    def _log_stats(self, table):
+        stats = table.get_stats()
+        self.logger.info("Table {} played {} time steps, {} overruns, max {:.1f} ms late, {} resyncs, {} plan stalls".format(
+            table.name, stats['time_steps'], stats['overruns'], stats['max_overrun_s'] * 1000, stats['resyncs'], stats['plan_stalls']))
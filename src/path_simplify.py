@@ -0,0 +1,175 @@
+"""
+Simplify a pattern's path before it is planned.
+
+The planner moves both axes linearly in (theta, rho) between points, so points on a straight line
+in axis step space can be dropped without changing the path drawn. Radial sweeps are straight rho
+lines, and a constant rate spiral is one straight line in (theta, rho), yet both emit a point every
+few mm, each planned and played as its own move.
+
+Points are dropped while every point since the last one kept stays within tolerance_steps of the
+line to the next point, measured in axis steps, and the path doesn't turn back on itself.
+Wraps a pattern and is used like one, it can be played, or compiled into a step program.
+
+## Stats
+Each pass plans every move of the source path and of the simplified path, timing both, so the
+planning time saved is measured rather than estimated. Playback time uses the planner's move time model.
+"""
+
+import math
+import operator
+import time
+from constants import *
+import logging
+
+class PathSimplify:
+
+    logger = logging.getLogger(__name__)
+
+    pattern = None
+
+    def __init__(self, source, tolerance_steps=SIMPLIFY_TOLERANCE_STEPS, max_run=SIMPLIFY_MAX_RUN, planner=None):
+        '''
+        source - pattern to simplify
+        tolerance_steps - furthest a dropped point can be from the simplified path, in axis steps
+        max_run - most points merged into one move, bounds the work per point
+        planner - motion planner, for its move time model in the stats, a plain planner if None
+        '''
+        self.source = source
+        self.tolerance_steps = tolerance_steps
+        self.max_run = max_run
+        self.planner = planner
+        self.reset_stats()
+
+    def __iter__(self):
+        points = iter(self.source) if hasattr(self.source, "__iter__") else iter(self.source.get_pattern())
+        return self._generate(points)
+
+    def __length_hint__(self):
+        # at most as many points as the source
+        return operator.length_hint(self.source)
+
+    def get_pattern(self):
+        # list of all positions, generated on first use
+        if self.pattern is None:
+            self.pattern = list(self)
+        return self.pattern
+
+    def get_params(self):
+        return {
+            'source': type(self.source).__name__,
+            'params': self.source.get_params(),
+            'tolerance_steps': self.tolerance_steps,
+            'max_run': self.max_run,
+        }
+
+    def reset_stats(self):
+        self.points_in = 0
+        self.points_out = 0
+        self.time_steps_in = 0
+        self.time_steps_out = 0
+        self.plan_s_in = 0
+        self.plan_s_out = 0
+
+    def get_stats(self):
+        '''
+        return - dict of points kept and removed, and the planning and playback time of the path before and after.
+            Each removed point is one get_steps_for_move and play_move cycle fewer.
+            Worked out with a pass over the path if it hasn't been iterated yet, e.g. its program came from the cache.
+        '''
+        if self.points_in == 0:
+            for _ in self:
+                pass
+        return {
+            'points_in': self.points_in,
+            'points_out': self.points_out,
+            'points_removed': self.points_in - self.points_out,
+            'time_s_in': self.time_steps_in * TIME_STEP_S,
+            'time_s_out': self.time_steps_out * TIME_STEP_S,
+            'time_s_saved': (self.time_steps_in - self.time_steps_out) * TIME_STEP_S,
+            'plan_s_in': self.plan_s_in,
+            'plan_s_out': self.plan_s_out,
+            'plan_s_saved': self.plan_s_in - self.plan_s_out,
+        }
+
+    def _to_steps(self, position):
+        return (position[0] / AXIS_STEP_T, position[1] / AXIS_STEP_R)
+
+    def _move_time_steps(self, start, end):
+        steps = (round(end[0]) - round(start[0]), round(end[1]) - round(start[1]))
+        return self.planner.get_move_time_steps(steps)
+
+    def _plan_time_s(self, start, end):
+        # time to plan the move, as the planner would when playing the path
+        plan_start = time.perf_counter()
+        self.planner.get_steps_for_move(end, start)
+        return time.perf_counter() - plan_start
+
+    def _within_tolerance(self, anchor, run, end):
+        # every point of the run close to the line anchor -> end, and moving along it without turning back
+        dx = end[0] - anchor[0]
+        dy = end[1] - anchor[1]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            return False
+        last = 0
+        for point in run:
+            px = point[0] - anchor[0]
+            py = point[1] - anchor[1]
+            if abs(px * dy - py * dx) / length > self.tolerance_steps:
+                return False
+            along = (px * dx + py * dy) / length
+            if along < last or along > length:
+                return False
+            last = along
+        return True
+
+    def _keep(self, anchor, point):
+        # anchor and point are (position, step position)
+        self.points_out += 1
+        self.time_steps_out += self._move_time_steps(anchor[1], point[1])
+        self.plan_s_out += self._plan_time_s(anchor[0], point[0])
+        return point[0]
+
+    def _generate(self, points):
+        if self.planner is None:
+            from motion_planner import MotionPlanner
+            self.planner = MotionPlanner(None)
+        self.reset_stats()
+
+        first = next(points, None)
+        if first is None:
+            return
+        self.points_in = 1
+        self.points_out = 1
+        yield first
+
+        # (position, step position) of the last point kept, the previous point, and the points since the last kept
+        anchor = (first, self._to_steps(first))
+        previous = anchor
+        run = []
+        for position in points:
+            steps = self._to_steps(position)
+            self.points_in += 1
+            self.time_steps_in += self._move_time_steps(previous[1], steps)
+            self.plan_s_in += self._plan_time_s(previous[0], position)
+            previous = (position, steps)
+            if run and (len(run) >= self.max_run or not self._within_tolerance(anchor[1], [s for _, s in run], steps)):
+                # keep the last point of the run, it starts the next line
+                yield self._keep(anchor, run[-1])
+                anchor = run[-1]
+                run = []
+            run.append((position, steps))
+        if run:
+            yield self._keep(anchor, run[-1])
+
+        stats = self.get_stats()
+        self.logger.info("Simplified {} - {} of {} points removed, planning {:.3f} s of {:.3f} s saved, playback {:.1f} s of {:.1f} s saved".format(
+            type(self.source).__name__, stats['points_removed'], stats['points_in'], stats['plan_s_saved'], stats['plan_s_in'],
+            stats['time_s_saved'], stats['time_s_in']))
+
+if __name__ == "__main__":
+    from pattern_radial_sweep import PatternRadialSweep
+    from pattern_spiral import PatternSpiral
+
+    for source in (PatternRadialSweep(1), PatternSpiral()):
+        print(type(source).__name__, PathSimplify(source).get_stats())
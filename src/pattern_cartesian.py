@@ -0,0 +1,187 @@
+"""
+Draw Cartesian polylines, e.g. from simple SVG paths or lists of x,y points.
+
+The motion planner moves in a straight line in (theta, rho), which is a curve on the table.
+Rather than sampling the drawing densely, each line is split in half only where the polar move
+strays from the true line by more than the tolerance. Long lines far from the centre barely
+need splitting, lines passing near it are split many times.
+
+## Coordinates
+- x, y in mm, (0, 0) at the centre of the table
+- fit - scale and centre the drawing to fill the table instead
+- SVG y points down, it is flipped so drawings aren't mirrored
+- SVG paths may use move and line commands, M L H V Z, absolute or relative
+
+Theta is kept continuous along the drawing, turned forward by whole rotations so it never goes below zero.
+Positions are generated lazily when iterated.
+"""
+
+import hashlib
+import json
+import math
+import re
+import xml.etree.ElementTree as ElementTree
+from constants import *
+import position_helper
+
+# relative positions along a move checked against the true line
+DEVIATION_SAMPLES = (0.25, 0.5, 0.75)
+
+_SVG_TOKEN = re.compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+def _distance_to_segment(p, a, b):
+    ax, ay = a
+    dx = b[0] - ax
+    dy = b[1] - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return math.hypot(p[0] - ax, p[1] - ay)
+    t = max(0, min(1, ((p[0] - ax) * dx + (p[1] - ay) * dy) / length_sq))
+    return math.hypot(p[0] - (ax + t * dx), p[1] - (ay + t * dy))
+
+def parse_svg_path(d):
+    '''
+    Points of an SVG path's move and line commands.
+    return - list of (x, y), subpaths joined in order
+    '''
+    tokens = _SVG_TOKEN.findall(d)
+    points = []
+    command = None
+    x = y = 0
+    start = (0, 0)
+    i = 0
+
+    def number():
+        nonlocal i
+        if i >= len(tokens) or tokens[i].isalpha():
+            raise ValueError("SVG path: expected a number after '{}'".format(command))
+        i += 1
+        return float(tokens[i - 1])
+
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        elif command is None:
+            raise ValueError("SVG path: must start with a command")
+        relative = command.islower()
+        c = command.upper()
+        if c == "M" or c == "L":
+            nx, ny = number(), number()
+            x, y = (x + nx, y + ny) if relative else (nx, ny)
+            if c == "M":
+                start = (x, y)
+                # following pairs are lines
+                command = "l" if relative else "L"
+        elif c == "H":
+            x = x + number() if relative else number()
+        elif c == "V":
+            y = y + number() if relative else number()
+        elif c == "Z":
+            x, y = start
+        else:
+            raise ValueError("SVG path: '{}' not supported, only M L H V Z".format(command))
+        points.append((x, y))
+        if c == "Z" and i < len(tokens) and not tokens[i].isalpha():
+            raise ValueError("SVG path: unexpected number after 'Z'")
+    return points
+
+class PatternCartesian:
+
+    pattern = None
+
+    def __init__(self, points, tolerance=CARTESIAN_TOLERANCE_MM, fit=False):
+        '''
+        points - list of (x, y), drawn in order
+        tolerance - mm the drawing may stray from the true lines
+        fit - scale and centre the drawing to fill the table
+        '''
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.tolerance = tolerance
+        self.fit = fit
+        if fit:
+            self.points = self._fit(self.points)
+        self._theta_offset = None
+
+    @classmethod
+    def from_svg_path(cls, d, tolerance=CARTESIAN_TOLERANCE_MM, fit=True):
+        return cls([(x, -y) for x, y in parse_svg_path(d)], tolerance, fit)
+
+    @classmethod
+    def from_svg(cls, path, tolerance=CARTESIAN_TOLERANCE_MM, fit=True):
+        # every <path> in the file, in document order
+        points = []
+        for element in ElementTree.parse(path).iter():
+            if element.tag.rsplit("}", 1)[-1] == "path" and element.get("d"):
+                points += parse_svg_path(element.get("d"))
+        return cls([(x, -y) for x, y in points], tolerance, fit)
+
+    @staticmethod
+    def _fit(points):
+        if not points:
+            return points
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        cx = (min(xs) + max(xs)) / 2
+        cy = (min(ys) + max(ys)) / 2
+        radius = max(math.hypot(x - cx, y - cy) for x, y in points)
+        scale = AXIS_MAX_R / radius if radius else 1
+        return [((x - cx) * scale, (y - cy) * scale) for x, y in points]
+
+    def __iter__(self):
+        if self._theta_offset is None:
+            theta_min = min((theta for theta, _ in self._generate()), default=0)
+            self._theta_offset = math.ceil(-theta_min / T_FULL_ROTATION) * T_FULL_ROTATION if theta_min < 0 else 0
+        return (position_helper.limit_axis((theta + self._theta_offset, rho)) for theta, rho in self._generate())
+
+    def __length_hint__(self):
+        # at least one move per point, more where lines are split
+        return len(self.points)
+
+    def _deviation(self, a, b, pa, pb):
+        # furthest the polar move from pa to pb strays from the line a to b
+        return max(_distance_to_segment(position_helper.polar_to_cartesian(
+            (pa[0] + s * (pb[0] - pa[0]), pa[1] + s * (pb[1] - pa[1]))), a, b) for s in DEVIATION_SAMPLES)
+
+    def _subdivide(self, a, pa, b, pb, depth):
+        # positions after pa, up to and including pb
+        if depth < CARTESIAN_MAX_SPLITS and self._deviation(a, b, pa, pb) > self.tolerance:
+            m = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+            pm = position_helper.cartesian_to_polar(m, pa[0])
+            yield from self._subdivide(a, pa, m, pm, depth + 1)
+            yield from self._subdivide(m, pm, b, pb, depth + 1)
+        else:
+            yield pb
+
+    def _generate(self):
+        # unlimited positions, theta may be below zero
+        if not self.points:
+            return
+        a = self.points[0]
+        pa = position_helper.cartesian_to_polar(a)
+        if pa[0] < 0:
+            pa = (pa[0] + T_FULL_ROTATION, pa[1])
+        yield pa
+        for b in self.points[1:]:
+            # a straight line turns less than half a rotation, so the nearest theta is the right way round
+            pb = position_helper.cartesian_to_polar(b, pa[0])
+            yield from self._subdivide(a, pa, b, pb, 0)
+            a, pa = b, pb
+
+    def get_pattern(self):
+        # list of all positions, generated on first use
+        if self.pattern is None:
+            self.pattern = list(self)
+        return self.pattern
+
+    def get_params(self):
+        points_sha1 = hashlib.sha1(json.dumps(self.points).encode()).hexdigest()
+        return {'points_sha1': points_sha1, 'tolerance': self.tolerance, 'fit': self.fit, 'max_r': AXIS_MAX_R}
+
+if __name__ == "__main__":
+    # a square filling the table
+    p = PatternCartesian.from_svg_path("M 0 0 H 10 V 10 H 0 Z")
+    for move in p.get_pattern():
+        print(move)
+
+    print("{} points, {} moves generated.".format(len(p.points), len(p.get_pattern())))
@@ -3,8 +3,10 @@
 Generate circle
 Increment theta clockwise until rotations count reached.
 Rho position is always static.
+Positions are generated lazily when iterated.
 """
 
+import math
 from constants import *
 
 T_RAD_PER_STEP = T_FULL_ROTATION / 100
@@ -13,22 +15,33 @@ R_POS = 35 # Fixed rho position for circle
 
 class PatternCircle:
     
-    pattern = []
+    pattern = None
     
     def __init__(self, n_rotations):
-        self.pattern = []
-        self._generate(n_rotations)
+        self.n_rotations = n_rotations
     
+    def __iter__(self):
+        return self._generate(self.n_rotations)
+
+    def __length_hint__(self):
+        return math.ceil(self.n_rotations * T_FULL_ROTATION / T_RAD_PER_STEP)
+
     def _generate(self, n_rotations):
         pos_t = 0
         pos_t_target = n_rotations * T_FULL_ROTATION
         while pos_t < pos_t_target:
             pos_t += T_RAD_PER_STEP
-            self.pattern.append((pos_t, R_POS))
+            yield (pos_t, R_POS)
 
     def get_pattern(self):
+        # list of all positions, generated on first use
+        if self.pattern is None:
+            self.pattern = list(self)
         return self.pattern
 
+    def get_params(self):
+        return {'n_rotations': self.n_rotations, 't_rad_per_step': T_RAD_PER_STEP, 'r_pos': R_POS}
+
 
 if __name__ == "__main__":
     p = PatternCircle(10)
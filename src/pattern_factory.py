@@ -0,0 +1,55 @@
+"""
+Make patterns from plain data, e.g. sent to the control daemon or read from a file.
+
+A pattern spec is a dict with the pattern type and its constructor parameters:
+    {"type": "zigzag", "ax": "theta", "start": 0.5, "size": 1}
+    {"type": "spiral", "r_reverse": true}
+    {"type": "theta_rho", "path": "tracks/star.thr"}
+    {"type": "svg", "path": "drawings/cat.svg"}
+
+Axis parameters are given by name. Specs name patterns for the journal and the daemon's status.
+"""
+
+import json
+from constants import *
+from pattern_circle import PatternCircle
+from pattern_radial_sweep import PatternRadialSweep
+from pattern_spiral import PatternSpiral
+from pattern_zigzag import PatternZigzag
+from pattern_theta_rho import PatternThetaRho
+from pattern_cartesian import PatternCartesian
+
+PATTERN_TYPES = {
+    'circle': PatternCircle,
+    'radial_sweep': PatternRadialSweep,
+    'spiral': PatternSpiral,
+    'zigzag': PatternZigzag,
+    'theta_rho': PatternThetaRho,
+    'cartesian': PatternCartesian,
+    'svg': PatternCartesian.from_svg,
+    'svg_path': PatternCartesian.from_svg_path,
+}
+
+def make_pattern(spec):
+    '''
+    spec - dict, type and constructor parameters
+    return - pattern
+    '''
+    params = dict(spec)
+    try:
+        factory = PATTERN_TYPES[params.pop('type')]
+    except KeyError as e:
+        raise ValueError("Pattern spec {} needs a type, one of {}".format(spec, ", ".join(PATTERN_TYPES))) from e
+    if 'ax' in params:
+        try:
+            params['ax'] = axis[str(params['ax']).upper()]
+        except KeyError as e:
+            raise ValueError("Pattern spec {}: ax must be theta or rho".format(spec)) from e
+    try:
+        return factory(**params)
+    except TypeError as e:
+        raise ValueError("Pattern spec {}: {}".format(spec, e)) from e
+
+def spec_name(spec):
+    # stable name, the same spec gets the same name
+    return json.dumps(spec, sort_keys=True)
@@ -2,8 +2,10 @@
 """
 Generate radial pattern
 Start at 0, go to rho outer limit, inscrement theta then return to 0, repeat for n rotations
+Positions are generated lazily when iterated.
 """
 
+import math
 from constants import *
 import position_helper
 
@@ -12,12 +14,19 @@ R_STEP_SIZE = 2 # mm
 
 class PatternRadialSweep:
     
-    pattern = []
+    pattern = None
     
     def __init__(self, n_rotations=1):
-        self.pattern = []
-        self._generate(n_rotations)
+        self.n_rotations = n_rotations
     
+    def __iter__(self):
+        return self._generate(self.n_rotations)
+
+    def __length_hint__(self):
+        # out and back per pair of theta increments, each leg ends with a theta increment
+        sweeps = math.ceil(self.n_rotations * T_FULL_ROTATION / (2 * T_STEP_SIZE))
+        return sweeps * 2 * (math.ceil(AXIS_MAX_R / R_STEP_SIZE) + 1)
+
     def _generate(self, n_rotations):
         pos_t = 0
         pos_r = 0
@@ -25,25 +34,29 @@ class PatternRadialSweep:
         while pos_t < pos_t_target:
             while pos_r < AXIS_MAX_R:
                 pos_r += R_STEP_SIZE
-                pos = position_helper.limit_axis((pos_t, pos_r))
-                self.pattern.append(pos)
+                yield position_helper.limit_axis((pos_t, pos_r))
             
             # inscrement theta
             pos_t += T_STEP_SIZE
-            self.pattern.append((pos_t, pos_r))
+            yield (pos_t, pos_r)
 
             while pos_r > 0:
                 pos_r -= R_STEP_SIZE
-                pos = position_helper.limit_axis((pos_t, pos_r))
-                self.pattern.append(pos) 
+                yield position_helper.limit_axis((pos_t, pos_r))
 
             # inscrement theta
             pos_t += T_STEP_SIZE
-            self.pattern.append((pos_t, pos_r))
+            yield (pos_t, pos_r)
 
     def get_pattern(self):
+        # list of all positions, generated on first use
+        if self.pattern is None:
+            self.pattern = list(self)
         return self.pattern
 
+    def get_params(self):
+        return {'n_rotations': self.n_rotations, 't_step_size': T_STEP_SIZE, 'r_step_size': R_STEP_SIZE}
+
 if __name__ == "__main__":
     p = PatternRadialSweep(10)
     for move in p.get_pattern():
@@ -7,8 +7,11 @@ Given
 Axis max - rho
 Rho increment rate, mm per full rotation
 Theta step size - probaby multiples of axis step size.
+
+Positions are generated lazily when iterated.
 """
 
+import math
 from constants import *
 import position_helper
 
@@ -24,12 +27,17 @@ OUTER_POS = (0, AXIS_MAX_R)
 
 class PatternSpiral:
     
-    pattern = []
+    pattern = None
     
     def __init__(self, r_reverse=False):
-        self.pattern = []
-        self._generate(r_reverse)
+        self.r_reverse = r_reverse
     
+    def __iter__(self):
+        return self._generate(self.r_reverse)
+
+    def __length_hint__(self):
+        return math.ceil((OUTER_POS[1] - INNER_POS[1]) / R_INCREMENT_RATE_STEP)
+
     def _generate(self, r_reverse):
         if not r_reverse:
             pos_t = INNER_POS[0]
@@ -38,8 +46,7 @@ class PatternSpiral:
             while pos_r < OUTER_POS[1]:
                 pos_t += T_RAD_PER_STEP
                 pos_r += R_INCREMENT_RATE_STEP
-                pos = position_helper.limit_axis((pos_t, pos_r))
-                self.pattern.append(pos)
+                yield position_helper.limit_axis((pos_t, pos_r))
         else:
             # spiral from outer to inner
             pos_t = OUTER_POS[0]
@@ -47,12 +54,17 @@ class PatternSpiral:
             while pos_r > INNER_POS[1]:
                 pos_t += T_RAD_PER_STEP
                 pos_r -= R_INCREMENT_RATE_STEP # move inward
-                pos = position_helper.limit_axis((pos_t, pos_r))
-                self.pattern.append(pos)
+                yield position_helper.limit_axis((pos_t, pos_r))
 
     def get_pattern(self):
+        # list of all positions, generated on first use
+        if self.pattern is None:
+            self.pattern = list(self)
         return self.pattern
 
+    def get_params(self):
+        return {'r_reverse': self.r_reverse, 't_rad_per_step': T_RAD_PER_STEP, 'r_increment_rate_step': R_INCREMENT_RATE_STEP}
+
 if __name__ == "__main__":
     p = PatternSpiral()
     for move in p.get_pattern():
@@ -0,0 +1,175 @@
+"""
+Play a theta-rho (.thr) track file, as shared for other sand tables.
+
+Each line is one position, "theta rho" - theta in radians, rho from 0 (centre) to 1 (edge).
+Blank lines and lines starting # or // are ignored.
+
+Rho is scaled to AXIS_MAX_R. Theta often winds below zero, so the whole track is turned
+forward by whole rotations until it never does, the drawing keeps its angle.
+
+Positions are streamed from the file when iterated, memory use doesn't grow with the file.
+
+## Seek index
+The first read writes a side index next to the track, <track>.idx:
+- Header - magic, version, track size and modified time, point count, stride, lowest theta, sha1 of the track
+- Byte offset of every stride'th point
+Playback can start at any point by reading one offset and skipping at most stride - 1 points.
+The index is built again if the track changes.
+"""
+
+import hashlib
+import math
+import os
+import struct
+from constants import *
+import position_helper
+import logging
+
+INDEX_MAGIC = b"THRI"
+INDEX_VERSION = 1
+INDEX_HEADER_FORMAT = "<4sHqqqId20s" # magic, version, track size, mtime ns, point count, stride, lowest theta, sha1
+INDEX_HEADER_SIZE = struct.calcsize(INDEX_HEADER_FORMAT)
+_OFFSET = struct.Struct("<Q")
+
+def _parse_line(line, line_number, path):
+    '''
+    return - (theta, rho) as in the file, None for blank and comment lines
+    '''
+    text = line.strip()
+    if not text or text.startswith(b"#") or text.startswith(b"//"):
+        return None
+    fields = text.replace(b",", b" ").split()
+    try:
+        if len(fields) != 2:
+            raise ValueError
+        return float(fields[0]), float(fields[1])
+    except ValueError:
+        raise ValueError("{} line {}: expected 'theta rho', got {!r}".format(path, line_number, text.decode(errors="replace")))
+
+class PatternThetaRho:
+
+    pattern = None
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, path, index_stride=THR_INDEX_STRIDE):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.index_stride = index_stride
+        self._index = None
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def __len__(self):
+        return self.get_index()['count']
+
+    def __length_hint__(self):
+        return len(self)
+
+    def _build_index(self, stat):
+        # one pass over the track, writing offsets straight to the index file
+        count = 0
+        theta_min = math.inf
+        digest = hashlib.sha1()
+        tmp_path = self.index_path + ".tmp"
+        with open(self.path, "rb") as f, open(tmp_path, "wb") as out:
+            out.write(bytes(INDEX_HEADER_SIZE))
+            offset = 0
+            for line_number, line in enumerate(f, 1):
+                digest.update(line)
+                point = _parse_line(line, line_number, self.path)
+                if point is not None:
+                    if count % self.index_stride == 0:
+                        out.write(_OFFSET.pack(offset))
+                    theta_min = min(theta_min, point[0])
+                    count += 1
+                offset += len(line)
+            if count == 0:
+                theta_min = 0
+            out.seek(0)
+            out.write(struct.pack(INDEX_HEADER_FORMAT, INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, count,
+                                  self.index_stride, theta_min, digest.digest()))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.index_path)
+        self.logger.info("Indexed {}, {} points".format(self.path, count))
+
+    def _read_index_header(self, stat):
+        # None if there's no index, or it's for another version of the track
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(INDEX_HEADER_SIZE)
+        except FileNotFoundError:
+            return None
+        if len(header) < INDEX_HEADER_SIZE:
+            return None
+        magic, version, size, mtime_ns, count, stride, theta_min, sha1 = struct.unpack(INDEX_HEADER_FORMAT, header)
+        if (magic, version, size, mtime_ns, stride) != (INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, self.index_stride):
+            return None
+        return {'count': count, 'theta_min': theta_min, 'sha1': sha1.hex()}
+
+    def get_index(self):
+        '''
+        Index header, building the index if the track hasn't been indexed.
+        return - dict: count - number of points, theta_min - lowest theta in the file, sha1 - of the track
+        '''
+        if self._index is None:
+            stat = os.stat(self.path)
+            index = self._read_index_header(stat)
+            if index is None:
+                self._build_index(stat)
+                index = self._read_index_header(stat)
+            self._index = index
+        return self._index
+
+    def _theta_offset(self):
+        # whole rotations, so theta never goes below zero
+        theta_min = self.get_index()['theta_min']
+        if theta_min >= 0:
+            return 0
+        return math.ceil(-theta_min / T_FULL_ROTATION) * T_FULL_ROTATION
+
+    def _seek_offset(self, index):
+        # byte offset of the indexed point at or before index
+        with open(self.index_path, "rb") as f:
+            f.seek(INDEX_HEADER_SIZE + _OFFSET.size * (index // self.index_stride))
+            offset, = _OFFSET.unpack(f.read(_OFFSET.size))
+        return offset
+
+    def iter_from(self, index):
+        '''
+        Positions from index on, without reading the track before it.
+        '''
+        if index >= len(self):
+            return
+        theta_offset = self._theta_offset()
+        skip = index % self.index_stride
+        with open(self.path, "rb") as f:
+            f.seek(self._seek_offset(index))
+            for line in f:
+                # line numbers aren't known after a seek, the index build has checked every line
+                point = _parse_line(line, "?", self.path)
+                if point is None:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                theta, rho = point
+                yield position_helper.limit_axis((theta + theta_offset, rho * AXIS_MAX_R))
+
+    def get_pattern(self):
+        # list of all positions, read on first use
+        if self.pattern is None:
+            self.pattern = list(self)
+        return self.pattern
+
+    def get_params(self):
+        return {'file': os.path.basename(self.path), 'sha1': self.get_index()['sha1'], 'max_r': AXIS_MAX_R}
+
+if __name__ == "__main__":
+    import sys
+    p = PatternThetaRho(sys.argv[1])
+    for move in p:
+        print(move)
+
+    print(str(len(p)) + " moves read.")
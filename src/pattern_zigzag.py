@@ -1,3 +1,4 @@
+import math
 from constants import *
 import position_helper
 
@@ -16,18 +17,20 @@ ZIGZAGS_IN_FULL_TRAVEL = 12  # Number of zigzags in full travel
 # Oscilate theta:
 # - Rho start: start pos - size / 2
 # - rho end: start pos + size / 2
+#
+# Positions are generated lazily when iterated.
 
 class PatternZigzag:
     ax = None
     start = None
     size = None
-    pattern = []
+    pattern = None
 
     def __init__(self, ax=axis.THETA, start=0.5, size=1):
         self.ax = ax
-        self.pattern = []
 
         self.start = start
+        self.size = size
         self.oscillate_min = start - size / 2
         self.oscillate_max = start + size / 2
 
@@ -42,9 +45,13 @@ class PatternZigzag:
         
         self.travel_distance_per_oscillation = (self.travel_max - self.travel_min) / ZIGZAGS_IN_FULL_TRAVEL
 
-        self._generate()
+    def __iter__(self):
+        return self._generate()
+
+    def __length_hint__(self):
+        return math.ceil((self.travel_max - self.travel_min) / self.travel_distance_per_oscillation) + 1
     
-    def _add_position(self, pos_travel, pos_oscillate):
+    def _position(self, pos_travel, pos_oscillate):
         if self.ax == axis.THETA:
             # Oscillate theta
             pos = (pos_oscillate, pos_travel)
@@ -52,7 +59,7 @@ class PatternZigzag:
             # Oscillate rho
             pos = (pos_travel, pos_oscillate)
 
-        self.pattern.append(position_helper.limit_axis(pos))
+        return position_helper.limit_axis(pos)
 
     def _generate(self):
         pos_travel = self.travel_min
@@ -60,16 +67,22 @@ class PatternZigzag:
         direction = 1  # 1 for positive, -1 for negative
 
         # Add the initial position
-        self._add_position(pos_travel, pos_oscillate)
+        yield self._position(pos_travel, pos_oscillate)
 
         while pos_travel < self.travel_max:
             pos_travel += self.travel_distance_per_oscillation
             pos_oscillate = self.oscillate_max if direction == 1 else self.oscillate_min
             direction *= -1
-            self._add_position(pos_travel, pos_oscillate)
+            yield self._position(pos_travel, pos_oscillate)
 
     def get_pattern(self):
+        # list of all positions, generated on first use
+        if self.pattern is None:
+            self.pattern = list(self)
         return self.pattern
+
+    def get_params(self):
+        return {'ax': self.ax.name, 'start': self.start, 'size': self.size, 'zigzags_in_full_travel': ZIGZAGS_IN_FULL_TRAVEL}
     
 if __name__ == "__main__":
     print("Zigzag in THETA axis:")
@@ -0,0 +1,83 @@
+"""
+Planned step schedules, reused for moves with the same step counts.
+
+A move's time step schedule only depends on how many steps each axis moves, so moves with the
+same (theta, rho) step delta share one plan, wherever they start. Patterns repeat the same few
+deltas, and main.py plays the same patterns forever, so most moves are planned once.
+
+Plans are kept up to a memory budget, the least recently used dropped first.
+Cached step arrays are read only, they are shared by every move using them.
+"""
+
+from collections import OrderedDict
+import threading
+from constants import *
+import logging
+
+class PlanCache:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, max_bytes=PLAN_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._plans)
+
+    def get(self, key):
+        '''
+        return - cached plan, None if not cached
+        '''
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan[0]
+
+    def put(self, key, value, nbytes):
+        '''
+        value - plan to share, mustn't be changed once cached
+        nbytes - memory used by the plan, plans bigger than the budget aren't cached
+        '''
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._plans:
+                return
+            self._plans[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._plans.popitem(last=False)
+                self.nbytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self.nbytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'plans': len(self._plans),
+                'bytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0,
+            }
+
+    def log_stats(self):
+        stats = self.get_stats()
+        self.logger.info("Plan cache: {} plans, {:.0f} KiB, {} hits, {} misses ({:.0%} hit), {} evicted".format(
+            stats['plans'], stats['bytes'] / 1024, stats['hits'], stats['misses'], stats['hit_rate'], stats['evictions']))
@@ -0,0 +1,147 @@
+"""
+Playlist of compiled step programs, ordered and oriented to cut transit moves.
+
+Each program can be played forwards or backwards, and rotatable ones at a theta offset.
+Played backwards a spiral runs from the outside in, so it can start where the ball already is.
+Theta is also unwound to the nearest whole rotation before each pattern, rather than moving back
+through every rotation the previous pattern made.
+
+## Optimisation
+Transit time between patterns uses the planner's own move time model. The playlist loops, so
+the move from the last pattern back to the first counts too. Small playlists are searched
+exhaustively, larger ones are ordered greedily by nearest next pattern.
+"""
+
+import itertools
+import os
+from constants import *
+from step_program import StepProgramVariant
+import logging
+
+class Playlist:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, programs, planner, rotatable=None, rotation_choices=PLAYLIST_ROTATION_CHOICES):
+        '''
+        programs - step programs, in the order to play them before optimising
+        planner - motion planner, for its move time model
+        rotatable - True for each program that may be rotated in theta, none if not given
+        '''
+        self.programs = programs
+        self.planner = planner
+        self.rotatable = rotatable if rotatable is not None else [False] * len(programs)
+        self.rotation_choices = rotation_choices
+        # (program index, reverse, theta offset steps) in play order
+        self.entries = [(i, False, 0) for i in range(len(programs))]
+        self.transit_time_s = None
+        self.baseline_transit_time_s = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _variants(self, index):
+        program = self.programs[index]
+        start = program.steps_at(0)
+        end = program.steps_at(len(program))
+        rotations = [0]
+        if self.rotatable[index]:
+            rotations = [i * T_FULL_ROTATION_STEPS // self.rotation_choices for i in range(self.rotation_choices)]
+        variants = []
+        for reverse in (False, True):
+            for rotation in rotations:
+                a, b = (end, start) if reverse else (start, end)
+                variants.append(((index, reverse, rotation), (a[0] + rotation, a[1]), (b[0] + rotation, b[1])))
+        return variants
+
+    def _transit_time_steps(self, end, start, unwind=True):
+        # step position at the end of one pattern to the start of the next
+        theta = start[0] - end[0]
+        if unwind:
+            half = T_FULL_ROTATION_STEPS // 2
+            theta = (theta + half) % T_FULL_ROTATION_STEPS - half
+        return self.planner.get_move_time_steps((theta, start[1] - end[1]))
+
+    def _loop_time_steps(self, variants):
+        return sum(self._transit_time_steps(variants[i - 1][2], variants[i][1]) for i in range(len(variants)))
+
+    def _search_exhaustive(self, variants):
+        count = len(variants)
+        best_cost, best = None, None
+        # the playlist loops, so fix the first pattern
+        for order in itertools.permutations(range(1, count)):
+            order = (0,) + order
+            for first in variants[0]:
+                # cheapest way to reach each variant of the next pattern in the order
+                costs = {id(first): (0, [first])}
+                for index in order[1:]:
+                    next_costs = {}
+                    for variant in variants[index]:
+                        next_costs[id(variant)] = min(
+                            ((cost + self._transit_time_steps(path[-1][2], variant[1]), path + [variant]) for cost, path in costs.values()),
+                            key=lambda c: c[0])
+                    costs = next_costs
+                for cost, path in costs.values():
+                    # and back round to the first
+                    cost += self._transit_time_steps(path[-1][2], first[1])
+                    if best_cost is None or cost < best_cost:
+                        best_cost, best = cost, path
+        return best
+
+    def _search_greedy(self, variants):
+        path = [min(variants[0], key=lambda v: v[0][1:])]
+        remaining = set(range(1, len(variants)))
+        while remaining:
+            end = path[-1][2]
+            variant = min((v for i in remaining for v in variants[i]), key=lambda v: self._transit_time_steps(end, v[1]))
+            path.append(variant)
+            remaining.remove(variant[0][0])
+        return path
+
+    def optimise(self):
+        '''
+        Choose the order, direction and rotation of each program.
+        return - dict of transit time per loop in seconds: transit_s, baseline_transit_s, saved_s
+        '''
+        if len(self.programs) == 0:
+            return {'transit_s': 0, 'baseline_transit_s': 0, 'saved_s': 0}
+
+        variants = [self._variants(i) for i in range(len(self.programs))]
+        if len(self.programs) <= PLAYLIST_EXHAUSTIVE_MAX:
+            path = self._search_exhaustive(variants)
+        else:
+            path = self._search_greedy(variants)
+        self.entries = [variant[0] for variant in path]
+
+        # as played before, in the given order and moving to each program's absolute start
+        baseline = sum(self._transit_time_steps(self.programs[i - 1].steps_at(len(self.programs[i - 1])), self.programs[i].steps_at(0), unwind=False)
+                       for i in range(len(self.programs)))
+        self.baseline_transit_time_s = baseline * TIME_STEP_S
+        self.transit_time_s = self._loop_time_steps(path) * TIME_STEP_S
+        report = {
+            'transit_s': self.transit_time_s,
+            'baseline_transit_s': self.baseline_transit_time_s,
+            'saved_s': self.baseline_transit_time_s - self.transit_time_s,
+        }
+        self.logger.info("Playlist transit {:.0f} s per loop, was {:.0f} s, saving {:.0f} s".format(
+            report['transit_s'], report['baseline_transit_s'], report['saved_s']))
+        return report
+
+    def name(self, position):
+        '''
+        Identifies the program and variant at a position in the playlist, e.g. for the journal.
+        '''
+        index, reverse, rotation = self.entries[position]
+        return "{}{}+{}".format(os.path.basename(self.programs[index].path), "-r" if reverse else "", rotation)
+
+    def get_program(self, position, current_steps, time_step=0):
+        '''
+        Program to play at a position in the playlist, a whole number of rotations from the current
+        position so theta isn't wound back.
+        time_step - time step the program will be played from
+        '''
+        index, reverse, rotation = self.entries[position]
+        program = StepProgramVariant(self.programs[index], reverse, rotation)
+        start = program.steps_at(time_step)
+        rotations = round((current_steps[0] - start[0]) / T_FULL_ROTATION_STEPS)
+        return StepProgramVariant(self.programs[index], reverse, rotation + rotations * T_FULL_ROTATION_STEPS)
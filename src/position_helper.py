@@ -1,4 +1,6 @@
-from constants import *
+# constants imports this module, so read its values at call time
+import math
+import constants
 
 def limit_axis(position):
     """
@@ -9,8 +11,8 @@ def limit_axis(position):
     if position[1] < 0:
         position = (position[0], 0)
 
-    if position[1] > AXIS_MAX_R:
-        position = (position[0], AXIS_MAX_R)
+    if position[1] > constants.AXIS_MAX_R:
+        position = (position[0], constants.AXIS_MAX_R)
     
     return position
 
@@ -27,4 +29,25 @@ def rad_to_deg(rad):
     """
     Convert radians to degrees.
     """
-    return rad * (180.0 / 3.141592653589793)
\ No newline at end of file
+    return rad * (180.0 / 3.141592653589793)
+def cartesian_to_polar(point, theta_near=None):
+    """
+    Convert (x, y) to (theta, rho).
+    theta_near - theta is unwrapped to within half a rotation of this, instead of -pi to pi.
+    At the centre theta is undefined, theta_near is kept.
+    """
+    x, y = point
+    rho = math.hypot(x, y)
+    if rho == 0:
+        return (theta_near if theta_near is not None else 0, 0)
+    theta = math.atan2(y, x)
+    if theta_near is not None:
+        theta = theta_near + (theta - theta_near + math.pi) % (2 * math.pi) - math.pi
+    return (theta, rho)
+
+def polar_to_cartesian(position):
+    """
+    Convert (theta, rho) to (x, y).
+    """
+    theta, rho = position
+    return (rho * math.cos(theta), rho * math.sin(theta))
@@ -0,0 +1,135 @@
+"""
+Append-only journal of table position and playlist progress, to pick up again after a restart.
+
+Records are JSON lines:
+- pattern - a pattern (playlist index and name) has started
+- progress - step position and progress through the current pattern
+- shutdown - the table stopped cleanly at this step position
+
+Progress updates are kept in memory and appended at most once per flush interval, so the
+SD card isn't written on every step. Pattern starts and shutdowns are written straight away, as is
+the first progress update after a shutdown, so the journal stops claiming a clean stop before the table moves.
+Every write is flushed and synced, a power cut can only tear the last line, which recovery skips.
+
+On recovery the last complete record gives the state. If it is a shutdown the position is exact
+and referencing can be skipped; otherwise it is a last known position, up to one flush interval old.
+
+The journal is compacted to its last record once it grows past JOURNAL_MAX_BYTES.
+"""
+
+import json
+import os
+import time
+from constants import *
+import logging
+
+class PositionJournal:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, path=JOURNAL_FILE, flush_interval_s=JOURNAL_FLUSH_INTERVAL_S, max_bytes=JOURNAL_MAX_BYTES, clock=time.monotonic):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.state = self.recover(path)
+        self._pending = None
+        self._last_flush = clock()
+        self.records_written = 0
+        self._file = None
+        self._open()
+
+    @staticmethod
+    def recover(path=JOURNAL_FILE):
+        '''
+        return - dict of the last complete record: event, steps, pattern, name, progress. None if no journal
+        '''
+        state = None
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # torn write, keep the last good record
+                        continue
+                    if isinstance(record, dict) and 'event' in record:
+                        state = record
+        except OSError:
+            return None
+        if state is not None:
+            state['steps'] = tuple(state['steps'])
+            state['clean'] = state['event'] == 'shutdown'
+        return state
+
+    def _open(self):
+        self._file = open(self.path, "a")
+        if self._file.tell() > self.max_bytes:
+            self._compact()
+
+    def _compact(self):
+        # rewrite as just the last record, renamed over the old journal
+        self._file.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            if self.state is not None:
+                f.write(self._encode(self.state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a")
+
+    def _encode(self, record):
+        return json.dumps({k: record[k] for k in ('event', 'steps', 'pattern', 'name', 'progress')}) + "\n"
+
+    def _write(self, event, steps, pattern, name, progress):
+        self.state = {'event': event, 'steps': tuple(steps), 'pattern': pattern, 'name': name, 'progress': progress,
+                      'clean': event == 'shutdown'}
+        self._file.write(self._encode(self.state))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records_written += 1
+        self._pending = None
+        self._last_flush = self.clock()
+        if self._file.tell() > self.max_bytes:
+            self._compact()
+
+    def _current(self):
+        if self.state is None:
+            return (0, 0), None, None, 0
+        return self.state['steps'], self.state['pattern'], self.state['name'], self.state['progress']
+
+    def start_pattern(self, steps, pattern, name):
+        '''
+        pattern - index in the playlist
+        name - identifies the pattern, to check it is the same one when resuming
+        '''
+        self._write('pattern', steps, pattern, name, 0)
+
+    def record_progress(self, steps, progress):
+        '''
+        Cheap to call every time step, written out once per flush interval.
+        progress - move or time step index the pattern will continue from
+        '''
+        self._pending = (tuple(steps), progress)
+        clean = self.state is not None and self.state['clean']
+        if clean or self.clock() - self._last_flush >= self.flush_interval_s:
+            self.flush()
+
+    def flush(self):
+        if self._pending is not None:
+            _, pattern, name, _ = self._current()
+            self._write('progress', self._pending[0], pattern, name, self._pending[1])
+
+    def shutdown(self, steps, progress=None):
+        '''
+        Record a clean stop, the table can start again from here without referencing.
+        '''
+        _, pattern, name, last_progress = self._current()
+        if progress is None:
+            progress = self._pending[1] if self._pending is not None else last_progress
+        self._write('shutdown', steps, pattern, name, progress)
+
+    def close(self):
+        self.flush()
+        self._file.close()
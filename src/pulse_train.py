@@ -0,0 +1,235 @@
+"""
+Compile planned time steps into timed pulse trains, played by a waveform backend.
+
+Stepping with time.sleep leaves every pulse's timing to the Python interpreter. Instead, the
+steps for a run of time steps are compiled into an explicit pulse train, a list of segments:
+- on mask - GPIO pins set high at the start of the segment, one bit per pin (1 << pin)
+- off mask - GPIO pins set low
+- delay - microseconds until the next segment
+
+The same layout as pigpio's generic waveforms, so a hardware-timed backend can send trains
+straight to the DMA engine. Whole trains are handed to the backend at once.
+
+## Timing
+Pulses are placed as MotorControlIO.step_batch plays them: each motor keeps its minimum step
+interval, a direction change is set up before the next pulse, and each time step ends on its
+deadline. A time step that can't fit its pulses overruns, the next starts straight after it.
+
+## Backends
+- MemoryWaveformBackend - keeps the trains, with pin edge times for checking the timing
+- FileWaveformBackend - writes the trains to a binary file, one record per segment
+"""
+
+import struct
+from constants import *
+import logging
+
+_SEGMENT = struct.Struct("<III") # on mask, off mask, delay us
+_TRAIN_HEADER = struct.Struct("<I") # segment count
+
+def _us(seconds):
+    return int(round(seconds * 1e6))
+
+def _dir_level(reverse, invert):
+    # as MotorControlIO sets the direction pins, CW when high
+    return reverse == invert
+
+class PulseTrainCompiler:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, planner, period_s=TIME_STEP_S, min_step_delay_s=MIN_STEP_DELAY, pulse_width_s=STEP_PULSE_WIDTH,
+                 dir_setup_us=DIR_SETUP_US):
+        '''
+        planner - motion planner, turns each time step's axis steps into motor pulses
+        '''
+        self.planner = planner
+        self.period_us = _us(period_s)
+        self.min_step_us = _us(min_step_delay_s)
+        self.pulse_us = _us(pulse_width_s)
+        self.dir_setup_us = dir_setup_us
+        self.step_masks = (1 << THETA_STEP_PIN, 1 << RHO_STEP_PIN)
+        self.dir_pins = (THETA_DIR_PIN, RHO_DIR_PIN)
+        self.dir_invert = (AXIS_T_INVERT_DIR, AXIS_R_INVERT_DIR)
+
+        # microseconds from the start of the first time step
+        self.time_us = 0
+        self.deadline_us = self.period_us
+        self._last_pulse_us = [None, None]
+        self._dir_levels = [None, None]
+        # (time us, on mask, off mask) not yet taken as a train
+        self._events = []
+        self._taken_us = 0
+
+        self.time_steps = 0
+        self.overruns = 0
+
+    def _set_directions(self, reverse):
+        on = 0
+        off = 0
+        for i in range(2):
+            level = _dir_level(reverse[i], self.dir_invert[i])
+            if self._dir_levels[i] != level:
+                if level:
+                    on |= 1 << self.dir_pins[i]
+                else:
+                    off |= 1 << self.dir_pins[i]
+                self._dir_levels[i] = level
+        if on or off:
+            self._events.append((self.time_us, on, off))
+            self.time_us += self.dir_setup_us
+
+    def add_time_step(self, directions, step):
+        '''
+        directions - (theta, rho) direction
+        step - (theta, rho) True/False, or number of steps for each axis
+        '''
+        batch = self.planner.get_pulses(directions, step)
+        if batch is not None:
+            reverse, pulses = batch
+            self._set_directions(reverse)
+            for pulse in pulses:
+                start = self.time_us
+                mask = 0
+                for i in range(2):
+                    if pulse[i]:
+                        last = self._last_pulse_us[i]
+                        if last is not None:
+                            start = max(start, last + self.min_step_us)
+                        mask |= self.step_masks[i]
+                if not mask:
+                    continue
+                self._events.append((start, mask, 0))
+                self._events.append((start + self.pulse_us, 0, mask))
+                for i in range(2):
+                    if pulse[i]:
+                        self._last_pulse_us[i] = start
+                self.time_us = start + self.pulse_us
+
+        # wait for the end of the time step, or overrun it
+        if self.time_us <= self.deadline_us:
+            self.time_us = self.deadline_us
+        else:
+            self.overruns += 1
+        self.deadline_us += self.period_us
+        self.time_steps += 1
+
+    def take(self):
+        '''
+        return - pulse train of the time steps added since the last take, list of (on mask, off mask, delay us)
+        '''
+        # pins changing at the same time share a segment
+        points = []
+        for event_us, on, off in self._events:
+            if points and points[-1][0] == event_us:
+                points[-1][1] |= on
+                points[-1][2] |= off
+            else:
+                points.append([event_us, on, off])
+
+        train = []
+        first_us = points[0][0] if points else self.time_us
+        if first_us > self._taken_us:
+            # nothing changes until the first event
+            train.append((0, 0, first_us - self._taken_us))
+        for i, (event_us, on, off) in enumerate(points):
+            end_us = points[i + 1][0] if i + 1 < len(points) else self.time_us
+            train.append((on, off, end_us - event_us))
+        self._events = []
+        self._taken_us = self.time_us
+        return train
+
+def train_duration_us(train):
+    return sum(delay for _, _, delay in train)
+
+def play_pulse_trains(ticks, backend, planner, chunk_time_steps=PULSE_TRAIN_CHUNK_TIME_STEPS):
+    '''
+    Compile time steps into pulse trains and send them to the backend, chunk_time_steps at a time.
+    ticks - iterable of (directions, step) per time step, e.g. a step_program.StepProgram
+    return - the compiler, for its time step and overrun counts
+    '''
+    compiler = PulseTrainCompiler(planner)
+    for directions, step in ticks:
+        compiler.add_time_step(directions, step)
+        if compiler.time_steps % chunk_time_steps == 0:
+            backend.send(compiler.take())
+    if compiler.time_us > compiler._taken_us:
+        backend.send(compiler.take())
+    backend.wait_done()
+    return compiler
+
+class WaveformBackend:
+    """
+    Plays pulse trains. Trains are sent whole, in order, each starting when the last ends.
+    """
+
+    def send(self, train):
+        raise NotImplementedError
+
+    def wait_done(self):
+        # block until every train sent has played
+        pass
+
+    def close(self):
+        pass
+
+class MemoryWaveformBackend(WaveformBackend):
+
+    def __init__(self):
+        self.trains = []
+
+    def send(self, train):
+        self.trains.append(list(train))
+
+    def duration_us(self):
+        return sum(train_duration_us(train) for train in self.trains)
+
+    def edges(self, pin):
+        '''
+        return - list of (time us, level) for each change of the pin, from the start of the first train
+        '''
+        mask = 1 << pin
+        edges = []
+        time_us = 0
+        for train in self.trains:
+            for on, off, delay in train:
+                if on & mask:
+                    edges.append((time_us, True))
+                if off & mask:
+                    edges.append((time_us, False))
+                time_us += delay
+        return edges
+
+class FileWaveformBackend(WaveformBackend):
+    """
+    Writes each train as a segment count, then one (on mask, off mask, delay us) record per segment.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+
+    def send(self, train):
+        self._file.write(_TRAIN_HEADER.pack(len(train)))
+        for segment in train:
+            self._file.write(_SEGMENT.pack(*segment))
+
+    def wait_done(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read(path):
+        '''
+        return - generator of pulse trains from a file written by the backend
+        '''
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_TRAIN_HEADER.size)
+                if len(header) < _TRAIN_HEADER.size:
+                    return
+                count, = _TRAIN_HEADER.unpack(header)
+                data = f.read(_SEGMENT.size * count)
+                yield [segment for segment in _SEGMENT.iter_unpack(data)]
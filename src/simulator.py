@@ -0,0 +1,90 @@
+"""
+Run the motion planner off-hardware in virtual time.
+
+The planner drives MotorControlSim, with the scheduler and the simulated drivers sharing a
+VirtualClock, so a pattern that takes an hour to draw plays in seconds. Referencing works
+too, the simulated sensor is found the same way as the real one.
+
+The report gives the simulated duration, motor steps and where the ball ended up, both as
+the planner believes and as the simulated motors put it.
+"""
+
+import time
+from constants import *
+from virtual_clock import VirtualClock
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_sim import MotorControlSim
+import logging
+
+class Simulator:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, start_position=(0, 0), referenced=True, accel=ACCEL_ENABLED, sensor_position=REF_SENSOR_POSITION):
+        '''
+        start_position - (theta, rho) ball position in table coordinates
+        referenced - planner starts knowing the ball position, otherwise reference() before playing
+        '''
+        self.clock = VirtualClock()
+        self.motors = MotorControlSim(start_position, sensor_position=sensor_position, clock=self.clock, sleep=self.clock.sleep)
+        self.scheduler = TickScheduler(clock=self.clock, sleep=self.clock.sleep)
+        self.planner = MotionPlanner(self.motors, scheduler=self.scheduler, accel=accel)
+        if referenced:
+            self.planner.current_position = start_position
+        self._wall_time = 0.0
+
+    def _run(self, play, *args):
+        start = time.perf_counter()
+        try:
+            return play(*args)
+        finally:
+            self._wall_time += time.perf_counter() - start
+
+    def reference(self, last_known_position=None):
+        self._run(self.planner.fast_reference_routine, last_known_position)
+
+    def play(self, pattern):
+        return self._run(self.planner.play, pattern)
+
+    def play_program(self, program, start_time_step=0):
+        return self._run(self.planner.play_program, program, start_time_step)
+
+    def get_report(self):
+        '''
+        return dict
+            simulated_s, wall_s - time simulated and the real time it took
+            theta_motor_steps, rho_motor_steps - motor steps played, lost_steps - rho steps stalled at the end of travel
+            planner_position - where the planner believes the ball is, planner_steps its axis step position
+            ball_position - where the simulated motors put the ball
+        '''
+        return {
+            'simulated_s': self.clock(),
+            'wall_s': self._wall_time,
+            'theta_motor_steps': self.motors.theta_step_count,
+            'rho_motor_steps': self.motors.rho_step_count,
+            'lost_steps': self.motors.lost_steps,
+            'planner_position': self.planner.current_position,
+            'planner_steps': self.planner.current_steps,
+            'ball_position': self.motors.position,
+        }
+
+    def log_report(self):
+        report = self.get_report()
+        self.logger.info("Simulated {:.1f} s in {:.2f} s, {} theta and {} rho motor steps, ended at {}".format(
+            report['simulated_s'], report['wall_s'], report['theta_motor_steps'], report['rho_motor_steps'], report['ball_position']))
+        return report
+
+if __name__ == "__main__":
+    import sys
+    from pattern_spiral import PatternSpiral
+    from pattern_radial_sweep import PatternRadialSweep
+    from path_simplify import PathSimplify
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    # unreferenced, somewhere near the sensor
+    sim = Simulator(start_position=(1, 40), referenced=False)
+    sim.reference()
+    for pattern in (PatternSpiral(), PathSimplify(PatternRadialSweep(1))):
+        sim.play(pattern)
+        print(type(pattern).__name__, sim.get_report())
@@ -0,0 +1,276 @@
+"""
+Compile a pattern into a binary step program, cached on disk.
+
+The motion planner output for a whole pattern is packed into one byte per time step:
+- bits 0-2 - theta step count
+- bits 3-5 - rho step count
+- bit 6 - theta direction backward
+- bit 7 - rho direction backward
+
+## File layout
+- Header - magic, version, time step count, start position, end position, start position in axis steps
+- One byte per time step
+
+Programs are keyed by a hash of the pattern parameters and the hardware constants,
+so changing either compiles a new program instead of playing a stale one. Programs for the same
+pattern with an old key are removed, and a damaged program, e.g. from a power cut, is compiled again.
+Playback memory maps the file, no planning is done and memory use doesn't grow with the pattern length.
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import numpy as np
+import constants
+from constants import *
+from motion_planner import MotionPlanner
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "step_programs")
+
+MAGIC = b"STPG"
+VERSION = 3
+HEADER_FORMAT = "<4sHIddddii" # magic, version, time steps, start theta, start rho, end theta, end rho, start steps theta, rho
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+STEP_COUNT_BITS = 3
+STEP_COUNT_MAX = (1 << STEP_COUNT_BITS) - 1
+THETA_STEP_SHIFT = 0
+RHO_STEP_SHIFT = STEP_COUNT_BITS
+THETA_REVERSE_BIT = 0x40
+RHO_REVERSE_BIT = 0x80
+
+# constants that change the compiled steps, or how they should be played
+HASHED_CONSTANTS = [
+    "TIME_STEP_S",
+    "MIN_STEP_DELAY",
+    "AXIS_MAX_R",
+    "AXIS_GEAR_RATIO_T",
+    "AXIS_GEAR_RATIO_R",
+    "AXIS_STEP_T",
+    "AXIS_STEP_R",
+    "AXIS_SPEED_T",
+    "AXIS_SPEED_R",
+    "AXIS_STEP_RATE_T",
+    "AXIS_STEP_RATE_R",
+    "ACCEL_ENABLED",
+    "AXIS_STEP_ACCEL_T",
+    "AXIS_STEP_ACCEL_R",
+]
+
+def _decode(flags):
+    directions = (
+        direction.BACKWARD if flags & THETA_REVERSE_BIT else direction.FORWARD,
+        direction.BACKWARD if flags & RHO_REVERSE_BIT else direction.FORWARD,
+    )
+    step = ((flags >> THETA_STEP_SHIFT) & STEP_COUNT_MAX, (flags >> RHO_STEP_SHIFT) & STEP_COUNT_MAX)
+    return directions, step
+
+# every possible time step byte, decoded once
+DECODE_TABLE = [_decode(flags) for flags in range(256)]
+# played backwards, each time step's directions are flipped
+DECODE_TABLE_REVERSED = [_decode(flags ^ (THETA_REVERSE_BIT | RHO_REVERSE_BIT)) for flags in range(256)]
+
+def program_key(pattern):
+    """
+    Hash of the pattern type, its parameters and the hardware constants.
+    """
+    key = {
+        "version": VERSION,
+        "pattern": type(pattern).__name__,
+        "params": pattern.get_params(),
+        "constants": {name: getattr(constants, name) for name in HASHED_CONSTANTS},
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+def _pattern_id(pattern):
+    # identifies the pattern whatever the constants, so its old programs can be found
+    params = json.dumps(pattern.get_params(), sort_keys=True, default=str).encode()
+    return "{}-{}".format(type(pattern).__name__, hashlib.sha1(params).hexdigest()[:8])
+
+def program_path(pattern, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, "{}-{}.stp".format(_pattern_id(pattern), program_key(pattern)))
+
+def encode_move(move):
+    """
+    Pack a move from MotionPlanner.get_steps_for_move into bytes, one per time step.
+    """
+    steps = np.asarray(move["axis_steps_list"]).astype(np.uint8).reshape(-1, 2)
+    if steps.size and steps.max() > STEP_COUNT_MAX:
+        raise ValueError("Step programs hold at most {} steps per axis per time step.".format(STEP_COUNT_MAX))
+    flags = steps[:, 0] << THETA_STEP_SHIFT | steps[:, 1] << RHO_STEP_SHIFT
+    if move["directions"][0] == direction.BACKWARD:
+        flags |= THETA_REVERSE_BIT
+    if move["directions"][1] == direction.BACKWARD:
+        flags |= RHO_REVERSE_BIT
+    return flags.astype(np.uint8).tobytes()
+
+def compile_pattern(pattern, path):
+    """
+    Plan every move of the pattern, starting at its first point, and write the program to path.
+    Patterns are iterated if they can be, so they don't need to be held in memory.
+    """
+    points = iter(pattern) if hasattr(pattern, "__iter__") else iter(pattern.get_pattern())
+    first = next(points, None)
+    if first is None:
+        raise ValueError("Can't compile an empty pattern.")
+    last = first
+
+    planner = MotionPlanner(None)
+    planner.current_position = first
+    start_steps = planner.current_steps
+    time_steps = 0
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        # header written again once the time step count is known
+        f.write(bytes(HEADER_SIZE))
+        for position in points:
+            data = encode_move(planner.get_steps_for_move(position))
+            f.write(data)
+            time_steps += len(data)
+            planner.current_position = position
+            last = position
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, time_steps, *first, *last, *start_steps))
+        # on disk before the rename, or a power cut can leave an empty program in its place
+        f.flush()
+        os.fsync(f.fileno())
+    # rename last, an interrupted compile never leaves a partial program behind
+    os.replace(tmp_path, path)
+    logger.info("Compiled {} - {} time steps".format(path, time_steps))
+    return StepProgram(path)
+
+def prune(pattern, cache_dir=CACHE_DIR):
+    '''
+    Remove the pattern's programs compiled with other constants.
+    '''
+    keep = program_path(pattern, cache_dir)
+    for path in glob.glob(os.path.join(cache_dir, _pattern_id(pattern) + "-*.stp")):
+        if path != keep:
+            logger.info("Removing old step program {}".format(path))
+            os.remove(path)
+
+def load_or_compile(pattern, cache_dir=CACHE_DIR):
+    path = program_path(pattern, cache_dir)
+    prune(pattern, cache_dir)
+    if os.path.exists(path):
+        try:
+            program = StepProgram(path)
+            logger.debug("Step program cache hit {}".format(path))
+            return program
+        except ValueError as e:
+            logger.warning("Compiling again, {}".format(e))
+            os.remove(path)
+    return compile_pattern(pattern, path)
+
+class StepProgram:
+    """
+    Memory mapped step program. Iterate for (directions, step) per time step.
+    """
+
+    path = None
+    time_steps = 0
+    start_position = (0, 0)
+    end_position = (0, 0)
+    start_steps = (0, 0)
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+                raise ValueError("{} is too short to be a step program.".format(path))
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, time_steps, start_t, start_r, end_t, end_r, start_steps_t, start_steps_r = struct.unpack_from(HEADER_FORMAT, self._mm)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a version {} step program.".format(path, VERSION))
+        if len(self._mm) != HEADER_SIZE + time_steps:
+            self.close()
+            raise ValueError("{} is truncated, expected {} time steps.".format(path, time_steps))
+        self.time_steps = time_steps
+        self.start_position = (start_t, start_r)
+        self.end_position = (end_t, end_r)
+        self.start_steps = (start_steps_t, start_steps_r)
+
+    def __len__(self):
+        return self.time_steps
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, time_step, reverse=False):
+        '''
+        reverse - play the program backwards, from its last time step, time_step counts from the end
+        '''
+        mm = self._mm
+        if reverse:
+            for i in range(HEADER_SIZE + self.time_steps - 1 - time_step, HEADER_SIZE - 1, -1):
+                yield DECODE_TABLE_REVERSED[mm[i]]
+        else:
+            for i in range(HEADER_SIZE + time_step, HEADER_SIZE + self.time_steps):
+                yield DECODE_TABLE[mm[i]]
+
+    def steps_at(self, time_step):
+        '''
+        return - (theta, rho) position in axis steps before time_step is played
+        '''
+        if not 0 <= time_step <= self.time_steps:
+            raise ValueError("Time step {} outside program of {} time steps.".format(time_step, self.time_steps))
+        flags = np.frombuffer(self._mm, dtype=np.uint8, count=time_step, offset=HEADER_SIZE).astype(np.int64)
+        theta = (flags >> THETA_STEP_SHIFT) & STEP_COUNT_MAX
+        rho = (flags >> RHO_STEP_SHIFT) & STEP_COUNT_MAX
+        theta_sign = np.where(flags & THETA_REVERSE_BIT, -1, 1)
+        rho_sign = np.where(flags & RHO_REVERSE_BIT, -1, 1)
+        return (self.start_steps[0] + int((theta * theta_sign).sum()), self.start_steps[1] + int((rho * rho_sign).sum()))
+
+    def close(self):
+        self._mm.close()
+
+class StepProgramVariant:
+    """
+    A step program played backwards and/or rotated in theta, without compiling it again.
+    Plays the same as a StepProgram.
+    """
+
+    def __init__(self, program, reverse=False, theta_offset_steps=0):
+        self.program = program
+        self.reverse = reverse
+        self.theta_offset_steps = theta_offset_steps
+        self.path = program.path
+        self.time_steps = program.time_steps
+
+        offset = theta_offset_steps * AXIS_STEP_T
+        start, end = (program.end_position, program.start_position) if reverse else (program.start_position, program.end_position)
+        self.start_position = (start[0] + offset, start[1])
+        self.end_position = (end[0] + offset, end[1])
+
+    def __len__(self):
+        return self.time_steps
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, time_step):
+        return self.program.iter_from(time_step, self.reverse)
+
+    def steps_at(self, time_step):
+        steps = self.program.steps_at(self.time_steps - time_step if self.reverse else time_step)
+        return (steps[0] + self.theta_offset_steps, steps[1])
+
+if __name__ == "__main__":
+    from pattern_spiral import PatternSpiral
+    import time
+
+    p = PatternSpiral()
+    print("Key:", program_key(p))
+    start = time.perf_counter()
+    program = load_or_compile(p)
+    print("{} time steps, {:.3f} s".format(len(program), time.perf_counter() - start))
+    print("{} -> {}".format(program.start_position, program.end_position))
@@ -0,0 +1,125 @@
+"""
+Time step scheduling against absolute deadlines.
+
+Each time step ends at start + n * period on a monotonic clock. Time spent stepping the
+motors is absorbed into the wait, so it doesn't add to the time step length and a
+pattern takes as long as the constants say it should.
+
+A late time step is counted as an overrun and the following ones run without waiting
+until the schedule is caught up. If it falls too far behind, the schedule is re-anchored
+to now rather than bursting through the missed time steps.
+
+Clock and sleep are injectable so the scheduler can be tested with a fake clock.
+wait_async() awaits the deadline instead, for playing from an asyncio event loop.
+
+With metrics.Metrics given, each time step's work time and actual length are recorded
+in histograms, and late time steps counted, see metrics.py.
+"""
+
+import asyncio
+import time
+from constants import *
+from metrics import TICK_BUCKETS
+import logging
+
+MAX_LAG_TIME_STEPS = 10 # re-anchor the schedule when more than this many time steps behind
+
+class TickScheduler:
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, period=TIME_STEP_S, clock=time.monotonic, sleep=time.sleep, max_lag_time_steps=MAX_LAG_TIME_STEPS, metrics=None,
+                 async_sleep=asyncio.sleep):
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.max_lag = max_lag_time_steps * period
+        self.deadline = None
+        self.metrics = metrics
+        if metrics is not None:
+            self._work_time = metrics.histogram("sandtable_tick_work_seconds", "Time spent stepping in each time step, before waiting.", TICK_BUCKETS)
+            self._tick_time = metrics.histogram("sandtable_tick_seconds", "Actual length of each time step.", TICK_BUCKETS)
+            self._late = metrics.counter("sandtable_ticks_late_total", "Time steps that overran their deadline.")
+            self._tick_start = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.time_steps = 0
+        self.overruns = 0
+        self.max_overrun = 0.0
+        self.resyncs = 0
+
+    @property
+    def running(self):
+        return self.deadline is not None
+
+    def start(self):
+        # the first time step starts now
+        now = self.clock()
+        self.deadline = now + self.period
+        if self.metrics is not None:
+            self._tick_start = now
+
+    def stop(self):
+        self.deadline = None
+
+    def wait(self):
+        '''
+        Wait for the end of the current time step and move the deadline on one period.
+        return - seconds the time step overran its deadline, 0 if on time
+        '''
+        now, late = self._check_deadline()
+        if late <= 0:
+            self.sleep(-late)
+        return self._advance(now, late)
+
+    async def wait_async(self):
+        '''
+        As wait, awaiting the end of the time step so other tasks can run.
+        '''
+        now, late = self._check_deadline()
+        if late <= 0:
+            await self.async_sleep(-late)
+        return self._advance(now, late)
+
+    def _check_deadline(self):
+        # (now, seconds past the deadline), negative if it's still to come
+        if not self.running:
+            self.start()
+        now = self.clock()
+        return now, now - self.deadline
+
+    def _advance(self, now, late):
+        if late <= 0:
+            late = 0.0
+        else:
+            self.overruns += 1
+            self.max_overrun = max(self.max_overrun, late)
+            if late > self.max_lag:
+                self.logger.warning("Time step {:.1f} ms late, re-anchoring schedule".format(late * 1000))
+                self.resyncs += 1
+                self.deadline = now
+
+        self.deadline += self.period
+        self.time_steps += 1
+        if self.metrics is not None:
+            self._record(now, late)
+        return late
+
+    def _record(self, now, late):
+        end = self.clock()
+        self._work_time.observe(now - self._tick_start)
+        self._tick_time.observe(end - self._tick_start)
+        if late:
+            self._late.inc()
+        self._tick_start = end
+        self.metrics.maybe_flush()
+
+    def get_stats(self):
+        return {
+            'time_steps': self.time_steps,
+            'overruns': self.overruns,
+            'max_overrun_s': self.max_overrun,
+            'resyncs': self.resyncs,
+        }
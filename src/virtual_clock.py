@@ -0,0 +1,20 @@
+"""
+Clock for simulation, time only moves when it is slept on.
+
+Pass it as the clock and sleep of the tick scheduler and motor drivers, and a pattern plays
+as fast as the planner can run while every deadline and step delay is still kept in simulated time.
+"""
+
+class VirtualClock:
+
+    now = 0.0
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
@@ -0,0 +1,27 @@
+import asyncio
+
+class FakeClock:
+    """
+    Monotonic clock that only moves when slept on or advanced.
+    """
+
+    now = 0.0
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.slept += seconds
+            self.now += seconds
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+    def advance(self, seconds):
+        self.now += seconds
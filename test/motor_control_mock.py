@@ -1,10 +1,13 @@
+import asyncio
+
 class MotorControlMock:
     
     theta_count = 0
     rho_count = 0
+    batches = None
 
     def __init__(self):
-        pass
+        self.batches = []
 
     def motors_release(self):
         print("Motors released")
@@ -29,6 +32,20 @@ class MotorControlMock:
         else:
             self.rho_count -= 1
 
+    def step_batch(self, reverse, pulses):
+        pulses = list(pulses)
+        self.batches.append((reverse, pulses))
+        for theta, rho in pulses:
+            if theta:
+                self.theta_step(reverse[0])
+            if rho:
+                self.rho_step(reverse[1])
+
+    async def step_batch_async(self, reverse, pulses):
+        self.step_batch(reverse, pulses)
+        # let other tasks run, as a driver awaiting its step delays would
+        await asyncio.sleep(0)
+
     def is_reference_sensor_triggered(self):
         # Simulate the reference sensor being triggered
         return self.rho_count > 2
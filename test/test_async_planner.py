@@ -0,0 +1,106 @@
+import unittest
+import sys
+import asyncio
+import tempfile
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from pattern_zigzag import PatternZigzag
+import step_program
+from fake_clock import FakeClock
+
+class TestAsyncPlanner(unittest.TestCase):
+
+    def _planner(self):
+        clock = FakeClock()
+        motors = MotorControlMock()
+        scheduler = TickScheduler(clock=clock, sleep=clock.sleep, async_sleep=clock.async_sleep)
+        return MotionPlanner(motors, scheduler=scheduler), motors, clock
+
+    def _pattern(self):
+        return PatternZigzag(ax=axis.RHO, start=25, size=10)
+
+    def test_play_matches_sync(self):
+        planner, motors, clock = self._planner()
+        self.assertTrue(asyncio.run(planner.play_async(self._pattern())))
+
+        sync_planner, sync_motors, sync_clock = self._planner()
+        self.assertTrue(sync_planner.play(self._pattern()))
+        self.assertEqual(planner.current_position, sync_planner.current_position)
+        self.assertEqual(planner.current_steps, sync_planner.current_steps)
+        self.assertEqual((motors.theta_count, motors.rho_count), (sync_motors.theta_count, sync_motors.rho_count))
+        self.assertEqual(planner.scheduler.time_steps, sync_planner.scheduler.time_steps)
+        self.assertAlmostEqual(clock.now, sync_clock.now)
+
+    def test_other_tasks_run(self):
+        planner, motors, clock = self._planner()
+        ticks = []
+
+        async def monitor(done):
+            while not done.is_set():
+                ticks.append(clock.now)
+                await asyncio.sleep(0)
+
+        async def main():
+            done = asyncio.Event()
+            task = asyncio.create_task(monitor(done))
+            await planner.play_async(self._pattern())
+            done.set()
+            await task
+
+        asyncio.run(main())
+        # the monitor ran all through the pattern, not just before and after
+        self.assertGreater(len(ticks), planner.scheduler.time_steps)
+        self.assertGreater(len(set(ticks)), planner.scheduler.time_steps / 2)
+
+    def test_cancel_mid_move(self):
+        planner, motors, clock = self._planner()
+        move = planner.get_steps_for_move((0, 40))
+        time_steps = len(move['axis_steps_list'])
+
+        async def main():
+            play = asyncio.create_task(planner.play_move_async(move))
+            while planner.scheduler.time_steps < 10:
+                await asyncio.sleep(0)
+            planner.cancel()
+            return await play
+
+        self.assertFalse(asyncio.run(main()))
+        self.assertLess(planner.scheduler.time_steps, time_steps)
+        # stopped part way, where the motors actually are
+        self.assertEqual(planner.current_position, planner.actual_position)
+        self.assertEqual(motors.rho_count, planner.current_steps[1] * AXIS_GEAR_RATIO_R)
+        self.assertGreater(planner.current_steps[1], 0)
+        self.assertFalse(planner.scheduler.running)
+
+    def test_task_cancelled_mid_move(self):
+        planner, motors, clock = self._planner()
+        move = planner.get_steps_for_move((0, 40))
+
+        async def main():
+            play = asyncio.create_task(planner.play_move_async(move))
+            while planner.scheduler.time_steps < 10:
+                await asyncio.sleep(0)
+            play.cancel()
+            await play
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(main())
+        self.assertEqual(planner.current_position, planner.actual_position)
+        self.assertEqual(motors.rho_count, planner.current_steps[1] * AXIS_GEAR_RATIO_R)
+
+    def test_play_program_matches_sync(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            program = step_program.load_or_compile(self._pattern(), tmp_dir)
+            planner, motors, _ = self._planner()
+            self.assertTrue(asyncio.run(planner.play_program_async(program)))
+            sync_planner, sync_motors, _ = self._planner()
+            self.assertTrue(sync_planner.play_program(program))
+            program.close()
+        self.assertEqual(planner.current_steps, sync_planner.current_steps)
+        self.assertEqual((motors.theta_count, motors.rho_count), (sync_motors.theta_count, sync_motors.rho_count))
+
+if __name__ == '__main__':
+    unittest.main()
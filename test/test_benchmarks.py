@@ -0,0 +1,43 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "src/")
+sys.path.insert(0, "bench/")
+import benchmarks
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_compare(self):
+        baseline = {
+            'plan.moves_per_s': benchmarks._result(1000, "moves/s", higher_is_better=True),
+            'pattern.time_s': benchmarks._result(1.0, "s"),
+            'pattern.points': benchmarks._result(100, "points", compared=False),
+        }
+        results = {
+            'plan.moves_per_s': benchmarks._result(700, "moves/s", higher_is_better=True),
+            'pattern.time_s': benchmarks._result(1.1, "s"),
+            'pattern.points': benchmarks._result(400, "points", compared=False),
+            'new.time_s': benchmarks._result(5.0, "s"),
+        }
+        self.assertEqual(benchmarks.compare(results, baseline), [('plan.moves_per_s', 1000, 700)])
+        results['pattern.time_s'] = benchmarks._result(2.0, "s")
+        self.assertEqual(len(benchmarks.compare(results, baseline)), 2)
+
+    def test_planning_results_saved(self):
+        results = benchmarks.bench_planning(repeats=1)
+        for name in benchmarks.MOVES:
+            self.assertGreater(results["plan.{}.moves_per_s".format(name)]['value'], 0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "baseline.json")
+            benchmarks.save_baseline(results, path)
+            self.assertEqual(benchmarks.load_baseline(path), results)
+            self.assertEqual(benchmarks.compare(results, benchmarks.load_baseline(path)), [])
+
+    def test_baseline_stored(self):
+        baseline = benchmarks.load_baseline()
+        self.assertIsNotNone(baseline)
+        self.assertIn("playback.program.s_per_time_step", baseline)
+
+if __name__ == '__main__':
+    unittest.main()
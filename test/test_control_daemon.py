@@ -0,0 +1,134 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from control_daemon import Player, ControlServer, send_command
+import pattern_factory
+import step_program
+from fake_clock import FakeClock
+
+CIRCLE = {'type': 'circle', 'n_rotations': 1}
+ZIGZAG = {'type': 'zigzag', 'ax': 'rho', 'start': 25, 'size': 10}
+
+class GatedMotors(MotorControlMock):
+    # steps freely until a batch count is reached, then waits to be let go
+    def __init__(self):
+        super().__init__()
+        self.hold_at = None
+        self.held = threading.Event()
+        self.release = threading.Event()
+
+    def step_batch(self, reverse, pulses):
+        if self.hold_at is not None and len(self.batches) == self.hold_at:
+            self.held.set()
+            self.release.wait()
+        super().step_batch(reverse, pulses)
+
+def wait_for(predicate, timeout=10):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            raise AssertionError("timed out")
+        time.sleep(0.001)
+
+class TestControlDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        clock = FakeClock()
+        self.motors = GatedMotors()
+        self.planner = MotionPlanner(self.motors, scheduler=TickScheduler(clock=clock, sleep=clock.sleep))
+        self.player = Player(self.planner, cache_dir=self.tmp_dir.name)
+        self.thread = threading.Thread(target=self.player.run)
+        self.thread.start()
+
+    def tearDown(self):
+        self.motors.release.set()
+        self.player.stop()
+        self.thread.join()
+        self.tmp_dir.cleanup()
+
+    def _end_steps(self, specs):
+        # step position after playing the patterns uninterrupted
+        planner = MotionPlanner(MotorControlMock())
+        for spec in specs:
+            program = step_program.load_or_compile(pattern_factory.make_pattern(spec), self.tmp_dir.name)
+            planner.play_program(program)
+            program.close()
+        return planner.current_steps
+
+    def test_plays_queue(self):
+        self.player.enqueue(CIRCLE)
+        self.player.enqueue(ZIGZAG)
+        wait_for(lambda: self.player.patterns_played == 2)
+        status = self.player.status()
+        self.assertEqual(status['state'], 'idle')
+        self.assertEqual(status['queue'], [])
+        self.assertEqual(status['steps'], self._end_steps([CIRCLE, ZIGZAG]))
+
+    def test_pause_resume(self):
+        self.motors.hold_at = 300
+        self.player.enqueue(CIRCLE)
+        self.motors.held.wait()
+        self.player.pause()
+        self.motors.release.set()
+        wait_for(lambda: self.player.status()['state'] == 'paused' and not self.player._playing)
+        status = self.player.status()
+        self.assertEqual(status['pattern'], CIRCLE)
+        self.assertGreater(status['time_step'], 0)
+        self.assertEqual(self.player.patterns_played, 0)
+
+        self.player.resume()
+        wait_for(lambda: self.player.patterns_played == 1)
+        # carried on from where it paused, the table ends up where an uninterrupted play does
+        self.assertEqual(self.planner.current_steps, self._end_steps([CIRCLE]))
+
+    def test_skip_and_load(self):
+        self.motors.hold_at = 10
+        self.player.enqueue(CIRCLE)
+        self.motors.held.wait()
+        # new playlist while a pattern plays, switched to straight away
+        self.player.load([ZIGZAG], now=True)
+        self.motors.release.set()
+        wait_for(lambda: self.player.patterns_played == 1)
+        self.assertIsNone(self.player.status()['pattern'])
+        steps = self.planner.current_steps
+        # the zigzag starts from wherever the circle was stopped, and ends where it always does
+        self.assertEqual(steps, self._end_steps([ZIGZAG]))
+
+    def test_bad_spec_refused(self):
+        with self.assertRaises(ValueError):
+            self.player.enqueue({'type': 'hexagon'})
+        with self.assertRaises(ValueError):
+            self.player.enqueue({'type': 'zigzag', 'ax': 'up'})
+        self.assertEqual(self.player.status()['queue'], [])
+
+    def test_socket(self):
+        path = os.path.join(self.tmp_dir.name, "control.sock")
+        server = ControlServer(self.player, path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            self.assertEqual(send_command('enqueue', path, pattern=ZIGZAG), {'ok': True})
+            wait_for(lambda: send_command('status', path)['patterns_played'] == 1)
+            status = send_command('status', path)
+            self.assertTrue(status['ok'])
+            self.assertEqual(tuple(status['steps']), self._end_steps([ZIGZAG]))
+
+            response = send_command('enqueue', path, pattern={'type': 'hexagon'})
+            self.assertFalse(response['ok'])
+            self.assertIn('hexagon', response['error'])
+            self.assertFalse(send_command('dance', path)['ok'])
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "src/")
+from constants import *
+from metrics import Metrics, Histogram
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_sim import MotorControlSim
+from fake_clock import FakeClock
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "metrics.prom")
+        self.clock = FakeClock()
+        self.metrics = Metrics(self.path, flush_interval_s=10, clock=self.clock)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_histogram_buckets(self):
+        h = Histogram("x", (1, 2, 5))
+        for value in (0.5, 1, 1.5, 3, 10):
+            h.observe(value)
+        self.assertEqual(h.counts, [2, 1, 1, 1])
+        lines = h.lines()
+        self.assertIn('x_bucket{le="1"} 2', lines)
+        self.assertIn('x_bucket{le="5"} 4', lines)
+        self.assertIn('x_bucket{le="+Inf"} 5', lines)
+        self.assertIn("x_count 5", lines)
+
+    def test_flush_interval(self):
+        self.metrics.counter("c_total", "A counter.").inc()
+        self.metrics.maybe_flush()
+        self.assertFalse(os.path.exists(self.path))
+        self.clock.advance(10)
+        self.metrics.maybe_flush()
+        with open(self.path) as f:
+            text = f.read()
+        self.assertIn("# TYPE c_total counter", text)
+        self.assertIn("c_total 1", text)
+
+    def test_playback_instrumented(self):
+        motors = MotorControlSim(clock=self.clock, sleep=self.clock.sleep, metrics=self.metrics)
+        scheduler = TickScheduler(clock=self.clock, sleep=self.clock.sleep, metrics=self.metrics)
+        planner = MotionPlanner(motors, scheduler=scheduler)
+        # theta steps take longer than a time step, rho steps don't
+        planner.play_move(planner.get_steps_for_move((AXIS_STEP_T * 2, 10)))
+
+        ticks = self.metrics.histogram("sandtable_tick_seconds", "", ())
+        self.assertEqual(ticks.count, scheduler.time_steps)
+        late = self.metrics.counter("sandtable_ticks_late_total", "")
+        self.assertEqual(late.value, scheduler.overruns)
+        self.assertGreater(late.value, 0)
+
+        interval, wait = motors._step_metrics[axis.THETA]
+        # gear ratio motor steps per theta step, the driver waits the minimum step delay between them
+        self.assertEqual(interval.count, 2 * AXIS_GEAR_RATIO_T - 1)
+        self.assertEqual(sum(interval.counts[:interval.buckets.index(MIN_STEP_DELAY)]), 0)
+        self.assertAlmostEqual(wait.sum, (2 * AXIS_GEAR_RATIO_T - 2) * MIN_STEP_DELAY, delta=MIN_STEP_DELAY)
+
+        self.metrics.flush()
+        with open(self.path) as f:
+            text = f.read()
+        self.assertIn('sandtable_pulse_interval_seconds_count{axis="rho"}', text)
+        self.assertIn("sandtable_tick_work_seconds_bucket", text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,14 @@
 import unittest
 import sys
+import timeit
+import math
 sys.path.insert(0, "src/")
 from constants import *
+import motion_planner
 from motion_planner import MotionPlanner
 from motor_control_mock import MotorControlMock
+from tick_scheduler import TickScheduler
+from fake_clock import FakeClock
 
 class TestMotionPlanner(unittest.TestCase):
     motors = None
@@ -127,6 +132,29 @@ class TestMotionPlanner(unittest.TestCase):
         self.assertEqual(self.motors.theta_count, r_list_t[8])
         self.assertEqual(self.motors.rho_count, r_list_r[8])
 
+    def test_play_both_axis_step_batched(self):
+        # one batch per time step, rho compensates the coupled theta step
+        self.planner._play_both_axis_step((direction.BACKWARD, direction.FORWARD), (1, 3))
+        self.assertEqual(len(self.motors.batches), 1)
+        reverse, pulses = self.motors.batches[0]
+        self.assertEqual(reverse, (True, False))
+        self.assertEqual(sum(theta for theta, _ in pulses), AXIS_GEAR_RATIO_T)
+        self.assertEqual(sum(rho for _, rho in pulses), 2 * AXIS_GEAR_RATIO_R)
+        # rho steps interleaved with the theta substeps, not after them
+        self.assertEqual(len(pulses), max(AXIS_GEAR_RATIO_T, 2 * AXIS_GEAR_RATIO_R))
+
+        # nothing to step, nothing sent
+        self.planner._play_both_axis_step((direction.FORWARD, direction.FORWARD), (False, False))
+        self.assertEqual(len(self.motors.batches), 1)
+
+    def test_interleave_pulses(self):
+        pulses = motion_planner.interleave_pulses(8, 2)
+        self.assertEqual(len(pulses), 8)
+        self.assertTrue(all(theta for theta, _ in pulses))
+        # rho evenly spread, both start on the first pulse
+        self.assertEqual([k for k, (_, rho) in enumerate(pulses) if rho], [0, 4])
+        self.assertEqual(motion_planner.interleave_pulses(0, 2), [(False, True), (False, True)])
+
     def test_play_move(self):
         instructions = {
             'start_position': (0, 0),
@@ -232,5 +260,123 @@ class TestMotionPlanner(unittest.TestCase):
         self.assertEqual(self.motors.theta_count, results[0])
         self.assertEqual(self.motors.rho_count, results[1])
 
+    def test_axis_steps_array_matches_list(self):
+        for max_time_steps in range(0, 200):
+            for steps in range(0, max_time_steps + 1):
+                steps_list = self.planner._get_axis_steps_list(max_time_steps, steps)
+                steps_array = self.planner._get_axis_steps_array(max_time_steps, steps)
+                self.assertEqual(len(steps_array), max_time_steps)
+                self.assertEqual(int(steps_array.sum()), steps)
+                # the accumulator can drop its last step to float rounding,
+                # otherwise the step positions must be identical
+                if sum(steps_list) == steps:
+                    self.assertEqual(steps_array.tolist(), steps_list)
+
+    def test_axis_steps_array_throughput(self):
+        max_time_steps, steps = 20000, 7919
+        t_list = timeit.timeit(lambda: self.planner._get_axis_steps_list(max_time_steps, steps), number=5)
+        t_array = timeit.timeit(lambda: self.planner._get_axis_steps_array(max_time_steps, steps), number=5)
+        self.assertLess(t_array, t_list)
+
+    def test_get_steps_for_move(self):
+        self.planner.current_position = (0, 0)
+        move = self.planner.get_steps_for_move((1, 10))
+        steps = self.planner._count_steps_to_position((0, 0), (1, 10))
+        self.assertEqual(move['axis_steps_list'].shape[1], 2)
+        self.assertEqual(int(move['axis_steps_list'][:, 0].sum()), steps[0])
+        self.assertEqual(int(move['axis_steps_list'][:, 1].sum()), steps[1])
+        self.assertEqual(move['directions'], (direction.FORWARD, direction.FORWARD))
+
+        self.planner.current_position = (0, 0)
+        move = self.planner.get_steps_for_move((0, 0))
+        self.assertEqual(len(move['axis_steps_list']), 0)
+
+    def test_get_steps_for_move_accel(self):
+        planner = MotionPlanner(self.motors, accel=True)
+        planner.current_position = (0, 0)
+        move = planner.get_steps_for_move((1, 30))
+        steps = planner._count_steps_to_position((0, 0), (1, 30))
+        steps_list = move['axis_steps_list']
+        self.assertEqual(int(steps_list[:, 0].sum()), steps[0])
+        self.assertEqual(int(steps_list[:, 1].sum()), steps[1])
+
+        # ramps up from rest and back down to rest
+        planner.current_position = (0, 0)
+        rho = planner.get_steps_for_move((0, 30))['axis_steps_list'][:, 1]
+        middle = len(rho) // 2
+        self.assertLess(rho[:20].sum(), rho[middle - 10:middle + 10].sum())
+        self.assertLess(rho[-20:].sum(), rho[middle - 10:middle + 10].sum())
+        # never faster than the axis step rate, allowing for whole steps
+        self.assertLessEqual(rho.max(), math.ceil(AXIS_STEP_RATE_R))
+
+        # accelerated move takes longer than the constant speed one, but not much
+        planner.accel = False
+        move_constant = planner.get_steps_for_move((1, 30))
+        self.assertGreater(len(steps_list), len(move_constant['axis_steps_list']))
+        self.assertLess(len(steps_list), 2 * len(move_constant['axis_steps_list']))
+
+    def test_accel_multiple_steps_per_time_step(self):
+        rate = motion_planner.AXIS_STEP_RATE_R
+        motion_planner.AXIS_STEP_RATE_R = AXIS_MAX_STEPS_PER_TIME_STEP_R
+        try:
+            with self.assertRaises(Exception):
+                MotionPlanner(self.motors, accel=False)
+            clock = FakeClock()
+            planner = MotionPlanner(self.motors, scheduler=TickScheduler(clock=clock, sleep=clock.sleep), accel=True)
+            planner.current_position = (0, 0)
+            move = planner.get_steps_for_move((0, 60))
+            rho = move['axis_steps_list'][:, 1]
+            self.assertEqual(int(rho.sum()), int(60 / AXIS_STEP_R))
+            self.assertEqual(rho.max(), AXIS_MAX_STEPS_PER_TIME_STEP_R)
+            self.assertLessEqual(rho[0], 1)
+
+            # every time step's motor steps and settle delays fit within the time step
+            planner.scheduler.reset_stats()
+            planner.play_move(move)
+            self.assertEqual(planner.scheduler.get_stats()['overruns'], 0)
+            self.assertEqual(planner.current_steps, (0, int(60 / AXIS_STEP_R)))
+
+            # faster than the step cost allows
+            motion_planner.AXIS_STEP_RATE_R = AXIS_MAX_STEPS_PER_TIME_STEP_R + 0.5
+            with self.assertRaises(Exception):
+                MotionPlanner(self.motors, accel=True)
+        finally:
+            motion_planner.AXIS_STEP_RATE_R = rate
+
+    def test_play_move_step_counts(self):
+        # multiple steps in a time step, as played at cruise with acceleration
+        instructions = {
+            'start_position': (0, 0),
+            'end_position': (AXIS_STEP_T * 3, AXIS_STEP_R * 4),
+            'directions': (direction.FORWARD, direction.FORWARD),
+            'axis_steps_list': [(1, 1), (2, 3)]
+        }
+        self.motors.theta_count = 0
+        self.motors.rho_count = 0
+        self.planner.play_move(instructions)
+        self.assertEqual(self.motors.theta_count, 3 * AXIS_GEAR_RATIO_T)
+        self.assertEqual(self.motors.rho_count, (3 + 4) * AXIS_GEAR_RATIO_R)
+
+    def test_no_truncation_drift(self):
+        clock = FakeClock()
+        planner = MotionPlanner(self.motors, scheduler=TickScheduler(clock=clock, sleep=clock.sleep))
+        # moves of less than one step each, previously truncated to nothing
+        for i in range(1, 51):
+            planner.play_move(planner.get_steps_for_move((0, i * AXIS_STEP_R * 0.4)))
+        self.assertEqual(planner.current_steps, (0, 20))
+        self.assertEqual(self.motors.rho_count, 20 * AXIS_GEAR_RATIO_R)
+        self.assertAlmostEqual(planner.current_position[1], 50 * AXIS_STEP_R * 0.4)
+        self.assertAlmostEqual(planner.actual_position[1], planner.current_position[1], delta=AXIS_STEP_R)
+
+        # and back, ending exactly at zero steps
+        for i in range(49, -1, -1):
+            planner.play_move(planner.get_steps_for_move((0, i * AXIS_STEP_R * 0.4)))
+        self.assertEqual(planner.current_steps, (0, 0))
+        self.assertEqual(self.motors.rho_count, 0)
+
+    def test_set_current_position(self):
+        self.planner.current_position = (AXIS_STEP_T * 10, AXIS_MAX_R)
+        self.assertEqual(self.planner.current_steps, (10, int(round(AXIS_MAX_R / AXIS_STEP_R, 6))))
+
 if __name__ == '__main__':
     unittest.main()
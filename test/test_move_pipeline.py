@@ -0,0 +1,73 @@
+import unittest
+import sys
+import threading
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from move_pipeline import MovePipeline
+from motor_control_mock import MotorControlMock
+from fake_clock import FakeClock
+
+PATTERN = [(0, AXIS_STEP_R * 2.5), (AXIS_STEP_T * 1.5, AXIS_STEP_R * 4.5), (AXIS_STEP_T * 0.5, 0), (0, AXIS_STEP_R)]
+
+class TestMovePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.motors = MotorControlMock()
+        self.planner = MotionPlanner(self.motors, scheduler=TickScheduler(clock=self.clock, sleep=self.clock.sleep))
+
+    def test_play_matches_sequential(self):
+        self.assertTrue(self.planner.play(PATTERN))
+
+        motors = MotorControlMock()
+        planner = MotionPlanner(motors, scheduler=TickScheduler(clock=self.clock, sleep=self.clock.sleep))
+        for position in PATTERN:
+            planner.play_move(planner.get_steps_for_move(position))
+
+        self.assertEqual((self.motors.theta_count, self.motors.rho_count), (motors.theta_count, motors.rho_count))
+        self.assertEqual(self.planner.current_position, PATTERN[-1])
+
+    def test_cancel(self):
+        pipeline = MovePipeline(self.planner, depth=2)
+        played = []
+        play_move = self.planner.play_move
+
+        def play_move_then_cancel(move):
+            play_move(move)
+            played.append(move)
+            pipeline.cancel()
+
+        self.planner.play_move = play_move_then_cancel
+        self.assertFalse(pipeline.play(PATTERN))
+        self.assertEqual(len(played), 1)
+        self.assertEqual(self.planner.current_position, PATTERN[0])
+        self.assertEqual([t.name for t in threading.enumerate() if t.name == "move-planner"], [])
+
+    def test_cancel_before_play(self):
+        # e.g. a signal while referencing, the next play mustn't lose it
+        self.planner.cancel()
+        self.assertFalse(self.planner.play(PATTERN))
+        self.assertEqual((self.motors.theta_count, self.motors.rho_count), (0, 0))
+        self.assertTrue(self.planner.cancelled)
+
+        self.planner.clear_cancel()
+        self.assertTrue(self.planner.play(PATTERN))
+        self.assertEqual(self.planner.current_position, PATTERN[-1])
+
+    def test_planning_error_raised(self):
+        def pattern():
+            yield PATTERN[0]
+            raise ValueError("bad point")
+
+        with self.assertRaises(ValueError):
+            self.planner.play(pattern())
+        self.assertEqual(self.planner.current_position, PATTERN[0])
+
+    def test_invalid_depth(self):
+        with self.assertRaises(ValueError):
+            MovePipeline(self.planner, depth=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import sys
+import tempfile
+import threading
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from pattern_zigzag import PatternZigzag
+from pattern_circle import PatternCircle
+from multi_table import TableController
+import step_program
+from fake_clock import FakeClock
+
+class SlowPlanner(MotionPlanner):
+    # planning blocks until released
+    def __init__(self, motors, release):
+        super().__init__(motors)
+        self.release = release
+
+    def get_steps_for_move(self, position_next, position_start=None):
+        self.release.wait()
+        return super().get_steps_for_move(position_next, position_start)
+
+class TestMultiTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.controller = TableController(clock=self.clock, sleep=self.clock.sleep)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _play_alone(self, pattern):
+        # the same pattern on a table of its own
+        clock = FakeClock()
+        motors = MotorControlMock()
+        planner = MotionPlanner(motors, scheduler=TickScheduler(clock=clock, sleep=clock.sleep))
+        planner.play(pattern)
+        return motors, planner, clock.now
+
+    def test_tables_play_as_alone(self):
+        zigzag = PatternZigzag(ax=axis.RHO, start=25, size=10)
+        circle = PatternCircle(1)
+        program = step_program.load_or_compile(circle, self.tmp_dir.name)
+        tables = []
+        for pattern in (zigzag, program):
+            motors = MotorControlMock()
+            tables.append((motors, self.controller.add_table(len(tables), MotionPlanner(motors), [pattern], repeat=False)))
+        self.controller.run()
+
+        for (motors, table), pattern in zip(tables, (zigzag, circle)):
+            alone_motors, alone_planner, _ = self._play_alone(pattern)
+            self.assertTrue(table.done)
+            self.assertEqual(table.overruns, 0)
+            self.assertEqual(table.planner.current_steps, alone_planner.current_steps)
+            self.assertEqual(table.planner.current_position, alone_planner.current_position)
+            self.assertEqual((motors.theta_count, motors.rho_count), (alone_motors.theta_count, alone_motors.rho_count))
+
+        # tables play side by side, as long as the longest rather than one after the other
+        time_steps = [table.time_steps for _, table in tables]
+        self.assertAlmostEqual(self.clock.now, max(time_steps) * TIME_STEP_S)
+
+    def test_slow_planning_doesnt_delay_other_table(self):
+        release = threading.Event()
+        slow = self.controller.add_table("slow", SlowPlanner(MotorControlMock(), release), [PatternCircle(1)], repeat=False)
+        fast = self.controller.add_table("fast", MotionPlanner(MotorControlMock()), [PatternZigzag(ax=axis.RHO, start=25, size=10)], repeat=False)
+
+        # the slow table's planning is released once the other has finished
+        fast_play = fast.play
+        def play_then_release():
+            yield from fast_play()
+            release.set()
+        fast.play = play_then_release
+
+        self.controller.run()
+        self.assertTrue(slow.done)
+        self.assertEqual(fast.overruns, 0)
+        # every time step of the pattern played while the other table was stuck planning
+        _, alone_planner, _ = self._play_alone(PatternZigzag(ax=axis.RHO, start=25, size=10))
+        self.assertEqual(fast.time_steps - fast.plan_stalls, alone_planner.scheduler.get_stats()['time_steps'])
+        self.assertGreaterEqual(slow.plan_stalls, fast.time_steps)
+
+    def test_cancel(self):
+        table = self.controller.add_table("a", MotionPlanner(MotorControlMock()), [PatternCircle(2)])
+        planner_play = table.play
+        def play_then_cancel():
+            for i, _ in enumerate(planner_play()):
+                if i == 20:
+                    self.controller.cancel()
+                yield
+        table.play = play_then_cancel
+        self.controller.run()
+        self.assertTrue(table.done)
+        self.assertTrue(table.planner.cancelled)
+        self.assertLess(table.time_steps, 40)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+sys.path.insert(0, "src/")
+from constants import *
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from pattern_radial_sweep import PatternRadialSweep
+from path_simplify import PathSimplify
+from tick_scheduler import TickScheduler
+from fake_clock import FakeClock
+
+class PatternPoints:
+    def __init__(self, points):
+        self.points = points
+
+    def get_pattern(self):
+        return self.points
+
+    def get_params(self):
+        return {}
+
+class TestPathSimplify(unittest.TestCase):
+
+    def test_straight_line_merged(self):
+        points = [(0, r) for r in range(0, 42, 2)]
+        simplified = PathSimplify(PatternPoints(points))
+        self.assertEqual(list(simplified), [(0, 0), (0, 40)])
+        stats = simplified.get_stats()
+        self.assertEqual(stats['points_in'], len(points))
+        self.assertEqual(stats['points_removed'], len(points) - 2)
+
+    def test_turn_back_kept(self):
+        # collinear, but the path goes out and back
+        points = [(0, 0), (0, 10), (0, 20), (0, 10), (0, 0)]
+        self.assertEqual(list(PathSimplify(PatternPoints(points))), [(0, 0), (0, 20), (0, 0)])
+
+    def test_corner_kept(self):
+        points = [(0, 0), (0, 10), (0, 20), (AXIS_STEP_T * 10, 20)]
+        self.assertEqual(list(PathSimplify(PatternPoints(points))), points[:1] + points[2:])
+
+    def test_tolerance(self):
+        # a point one axis step off the line
+        points = [(0, 0), (AXIS_STEP_T, 10), (0, 20)]
+        self.assertEqual(list(PathSimplify(PatternPoints(points), tolerance_steps=0.5)), points)
+        self.assertEqual(list(PathSimplify(PatternPoints(points), tolerance_steps=1.5)), [(0, 0), (0, 20)])
+
+    def _play(self, pattern):
+        motors = MotorControlMock()
+        clock = FakeClock()
+        planner = MotionPlanner(motors, scheduler=TickScheduler(clock=clock, sleep=clock.sleep))
+        planner.current_position = (0, 0)
+        planner.play(pattern)
+        return planner, motors
+
+    def test_radial_sweep_plays_the_same_steps(self):
+        source = PatternRadialSweep(0.1)
+        simplified = PathSimplify(source)
+        points = list(simplified)
+        self.assertLess(len(points), len(source.get_pattern()))
+        self.assertEqual(points[-1], source.get_pattern()[-1])
+        stats = simplified.get_stats()
+        self.assertGreaterEqual(stats['time_s_saved'], 0)
+        self.assertGreater(stats['plan_s_in'], stats['plan_s_out'])
+
+        planner, motors = self._play(simplified)
+        planner_source, motors_source = self._play(source)
+        self.assertEqual(planner.current_steps, planner_source.current_steps)
+        self.assertEqual((motors.theta_count, motors.rho_count), (motors_source.theta_count, motors_source.rho_count))
+
+    def test_stats_without_iterating(self):
+        points = [(0, r) for r in range(0, 42, 2)]
+        stats = PathSimplify(PatternPoints(points)).get_stats()
+        self.assertEqual(stats['points_removed'], len(points) - 2)
+
+if __name__ == '__main__':
+    unittest.main()
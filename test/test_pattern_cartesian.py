@@ -0,0 +1,76 @@
+import unittest
+import sys
+import math
+sys.path.insert(0, "src/")
+from constants import *
+import position_helper
+from pattern_cartesian import PatternCartesian, parse_svg_path, _distance_to_segment
+
+class TestPatternCartesian(unittest.TestCase):
+
+    def _max_deviation(self, pattern, points):
+        # furthest any polar move strays from the drawing
+        segments = list(zip(points, points[1:]))
+        positions = pattern.get_pattern()
+        worst = 0
+        for pa, pb in zip(positions, positions[1:]):
+            for i in range(11):
+                s = i / 10
+                p = position_helper.polar_to_cartesian((pa[0] + s * (pb[0] - pa[0]), pa[1] + s * (pb[1] - pa[1])))
+                worst = max(worst, min(_distance_to_segment(p, a, b) for a, b in segments))
+        return worst
+
+    def test_radial_line_not_split(self):
+        p = PatternCartesian([(10, 0), (50, 0)])
+        self.assertEqual(p.get_pattern(), [(0, 10), (0, 50)])
+
+    def test_within_tolerance(self):
+        square = [(20, 20), (-20, 20), (-20, -20), (20, -20), (20, 20)]
+        for tolerance in (1, 0.2):
+            p = PatternCartesian(square, tolerance=tolerance)
+            self.assertLessEqual(self._max_deviation(p, square), tolerance * 1.05)
+        # tighter tolerance, more moves
+        self.assertGreater(len(PatternCartesian(square, tolerance=0.2).get_pattern()),
+                           len(PatternCartesian(square, tolerance=1).get_pattern()))
+
+    def test_splits_only_where_needed(self):
+        # same length, far from the centre bends less than near it
+        far = PatternCartesian([(60, -5), (60, 5)], tolerance=0.5)
+        near = PatternCartesian([(2, -5), (2, 5)], tolerance=0.5)
+        self.assertEqual(len(far.get_pattern()), 2)
+        self.assertGreater(len(near.get_pattern()), len(far.get_pattern()))
+
+    def test_theta_continuous(self):
+        # clockwise loops, theta keeps going down, turned forward so it stays above zero
+        square = [(20, 20), (20, -20), (-20, -20), (-20, 20)] * 3
+        positions = PatternCartesian(square).get_pattern()
+        thetas = [theta for theta, _ in positions]
+        self.assertGreaterEqual(min(thetas), 0)
+        self.assertTrue(all(b <= a + 1e-9 for a, b in zip(thetas, thetas[1:])))
+        self.assertGreater(thetas[0] - thetas[-1], 2 * T_FULL_ROTATION)
+
+    def test_svg_path(self):
+        self.assertEqual(parse_svg_path("M 1 2 L 3 4 5 6"), [(1, 2), (3, 4), (5, 6)])
+        self.assertEqual(parse_svg_path("m1,2 l2,2 h-3 v1 z"), [(1, 2), (3, 4), (0, 4), (0, 5), (1, 2)])
+        self.assertEqual(parse_svg_path("M0 0 10 0 H20"), [(0, 0), (10, 0), (20, 0)])
+        with self.assertRaises(ValueError):
+            parse_svg_path("M 0 0 C 1 1 2 2 3 3")
+        with self.assertRaises(ValueError):
+            parse_svg_path("M 0")
+
+    def test_svg_fit(self):
+        p = PatternCartesian.from_svg_path("M 100 100 h 50 v 50 h -50 z")
+        rhos = [rho for _, rho in p.get_pattern()]
+        self.assertAlmostEqual(max(rhos), AXIS_MAX_R)
+        # y flipped, the first corner is top left of the square
+        theta, _ = p.get_pattern()[0]
+        self.assertAlmostEqual(theta % T_FULL_ROTATION, 3 * math.pi / 4)
+
+    def test_params(self):
+        a = PatternCartesian([(0, 10), (10, 10)])
+        b = PatternCartesian([(0, 10), (10, 11)])
+        self.assertNotEqual(a.get_params(), b.get_params())
+        self.assertEqual(a.get_params(), PatternCartesian([(0, 10), (10, 10)]).get_params())
+
+if __name__ == '__main__':
+    unittest.main()
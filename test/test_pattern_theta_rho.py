@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os
+import math
+import operator
+import tempfile
+import tracemalloc
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from pattern_theta_rho import PatternThetaRho
+from fake_clock import FakeClock
+
+class TestPatternThetaRho(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "track.thr")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, points, header="# test track\n"):
+        with open(self.path, "w") as f:
+            f.write(header)
+            for i, (theta, rho) in enumerate(points):
+                f.write("{:.5f} {:.5f}\n".format(theta, rho))
+                if i % 7 == 0:
+                    f.write("\n// comment\n")
+
+    def test_read(self):
+        self._write([(0, 0), (1, 0.5), (2, 1)])
+        p = PatternThetaRho(self.path)
+        self.assertEqual(list(p), [(0, 0), (1, AXIS_MAX_R / 2), (2, AXIS_MAX_R)])
+        self.assertEqual(len(p), 3)
+        self.assertEqual(operator.length_hint(p), 3)
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+
+    def test_negative_theta_turned_whole_rotations(self):
+        self._write([(-1, 0.5), (-8, 0.5), (2, 0.5)])
+        points = list(PatternThetaRho(self.path))
+        offset = 2 * T_FULL_ROTATION
+        self.assertAlmostEqual(points[0][0], offset - 1)
+        self.assertAlmostEqual(points[1][0], offset - 8)
+        self.assertGreaterEqual(min(theta for theta, _ in points), 0)
+
+    def test_iter_from(self):
+        points = [(i * 0.01, (i % 100) / 100) for i in range(1000)]
+        self._write(points)
+        p = PatternThetaRho(self.path, index_stride=16)
+        every = list(p)
+        for index in (0, 1, 15, 16, 17, 500, 999, 1000):
+            self.assertEqual(list(p.iter_from(index)), every[index:], msg=index)
+
+    def test_index_reused_and_rebuilt(self):
+        self._write([(0, 0), (1, 1)])
+        PatternThetaRho(self.path).get_index()
+        mtime = os.stat(self.path + ".idx").st_mtime_ns
+        PatternThetaRho(self.path).get_index()
+        self.assertEqual(os.stat(self.path + ".idx").st_mtime_ns, mtime)
+
+        # changed track, new index and pattern key
+        sha1 = PatternThetaRho(self.path).get_params()['sha1']
+        self._write([(0, 0), (1, 1), (2, 0)])
+        p = PatternThetaRho(self.path)
+        self.assertEqual(len(p), 3)
+        self.assertNotEqual(p.get_params()['sha1'], sha1)
+
+    def test_bad_line(self):
+        with open(self.path, "w") as f:
+            f.write("0 0\n1 0.5 2\n")
+        with self.assertRaises(ValueError):
+            PatternThetaRho(self.path).get_index()
+
+    def test_constant_memory(self):
+        self._write([(i * 0.001, 0.5) for i in range(50000)])
+        p = PatternThetaRho(self.path)
+        p.get_index()
+        tracemalloc.start()
+        try:
+            count = sum(1 for _ in p.iter_from(25000))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(count, 25000)
+        self.assertLess(peak, 64 * 1024)
+
+    def test_play_resume(self):
+        self._write([(0, i / 20) for i in range(1, 21)])
+        clock = FakeClock()
+        motors = MotorControlMock()
+        planner = MotionPlanner(motors, scheduler=TickScheduler(clock=clock, sleep=clock.sleep))
+        p = PatternThetaRho(self.path)
+        planner.current_position = p.get_pattern()[9]
+        self.assertTrue(planner.play(p, start_index=10))
+        self.assertEqual(planner.current_position, p.get_pattern()[-1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import sys
+import operator
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from pattern_circle import PatternCircle
+from pattern_radial_sweep import PatternRadialSweep
+from pattern_spiral import PatternSpiral
+from pattern_zigzag import PatternZigzag
+from fake_clock import FakeClock
+
+class TestPatterns(unittest.TestCase):
+
+    def _patterns(self):
+        return [
+            PatternCircle(2),
+            PatternRadialSweep(1),
+            PatternSpiral(),
+            PatternSpiral(r_reverse=True),
+            PatternZigzag(ax=axis.THETA, start=0.5, size=1),
+            PatternZigzag(ax=axis.RHO, start=25, size=50),
+        ]
+
+    def test_lazy(self):
+        for p in self._patterns():
+            # nothing generated until used
+            self.assertIsNone(p.pattern)
+            first = next(iter(p))
+            self.assertIsNone(p.pattern)
+            self.assertEqual(first, p.get_pattern()[0])
+
+    def test_get_pattern_matches_iteration(self):
+        for p in self._patterns():
+            points = list(p)
+            self.assertGreater(len(points), 0)
+            self.assertEqual(p.get_pattern(), points)
+            # generated once, then reused
+            self.assertIs(p.get_pattern(), p.get_pattern())
+
+    def test_length_hint(self):
+        for p in self._patterns():
+            hint = operator.length_hint(p)
+            count = sum(1 for _ in p)
+            self.assertAlmostEqual(hint, count, delta=max(2, count * 0.05), msg=type(p).__name__)
+
+    def test_play_consumes_lazily(self):
+        clock = FakeClock()
+        planner = MotionPlanner(MotorControlMock(), scheduler=TickScheduler(clock=clock, sleep=clock.sleep))
+        consumed = []
+
+        def pattern():
+            for i in range(1, 50):
+                consumed.append(i)
+                yield (0, i * AXIS_STEP_R)
+
+        played = []
+        record_progress = planner.record_progress
+
+        def record_progress_and_check(progress):
+            record_progress(progress)
+            # planning runs at most the queue depth ahead of playback
+            played.append(len(consumed) - progress)
+            if progress == 10:
+                planner.cancel()
+
+        planner.record_progress = record_progress_and_check
+        self.assertFalse(planner.play(pattern()))
+        self.assertLessEqual(max(played), PLAN_QUEUE_DEPTH + 1)
+        self.assertLess(len(consumed), 49)
+
+if __name__ == '__main__':
+    unittest.main()
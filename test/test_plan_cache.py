@@ -0,0 +1,71 @@
+import unittest
+import sys
+import numpy as np
+sys.path.insert(0, "src/")
+from constants import *
+from plan_cache import PlanCache
+from motion_planner import MotionPlanner
+from pattern_zigzag import PatternZigzag
+
+class TestPlanCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = PlanCache(max_bytes=30)
+        cache.put('a', 1, 10)
+        cache.put('b', 2, 10)
+        cache.put('c', 3, 10)
+        # a used, so b is the oldest
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('d', 4, 10)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.get('d'), 4)
+        self.assertEqual(cache.nbytes, 30)
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (3, 1, 1))
+
+    def test_over_budget_not_cached(self):
+        cache = PlanCache(max_bytes=10)
+        cache.put('a', 1, 11)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_planner_reuses_plans(self):
+        planner = MotionPlanner(None)
+        uncached = MotionPlanner(None, plan_cache=PlanCache(max_bytes=0))
+        points = PatternZigzag(ax=axis.RHO, start=25, size=50).get_pattern()
+        moves = list(zip(points, points[1:]))
+
+        for start, end in moves:
+            move = planner.get_steps_for_move(end, start)
+            expected = uncached.get_steps_for_move(end, start)
+            self.assertEqual(move['directions'], expected['directions'])
+            np.testing.assert_array_equal(move['axis_steps_list'], expected['axis_steps_list'])
+            self.assertEqual(move['start_position'], start)
+            self.assertEqual(move['end_position'], end)
+
+        # second pass of the pattern plans nothing
+        misses = planner.plan_cache.misses
+        self.assertLess(misses, len(moves))
+        for start, end in moves:
+            planner.get_steps_for_move(end, start)
+        self.assertEqual(planner.plan_cache.misses, misses)
+        self.assertEqual(planner.plan_cache.hits + misses, 2 * len(moves))
+
+    def test_cached_plan_read_only(self):
+        planner = MotionPlanner(None)
+        steps = planner.get_steps_for_move((0, 10), (0, 0))['axis_steps_list']
+        with self.assertRaises(ValueError):
+            steps[0, 0] = 0
+
+    def test_accel_planned_separately(self):
+        cache = PlanCache()
+        plain = MotionPlanner(None, accel=False, plan_cache=cache)
+        accel = MotionPlanner(None, accel=True, plan_cache=cache)
+        a = plain.get_steps_for_move((0, 10), (0, 0))['axis_steps_list']
+        b = accel.get_steps_for_move((0, 10), (0, 0))['axis_steps_list']
+        self.assertEqual(cache.misses, 2)
+        self.assertNotEqual(a.dtype, b.dtype)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import sys
+import tempfile
+sys.path.insert(0, "src/")
+from constants import *
+from motion_planner import MotionPlanner
+import step_program
+from playlist import Playlist
+
+class PatternLine:
+    # straight rho line, from start to end
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    def get_pattern(self):
+        return [(0, self.start), (0, self.end)]
+
+    def get_params(self):
+        return {'start': self.start, 'end': self.end}
+
+class TestPlaylist(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.planner = MotionPlanner(None)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _programs(self, patterns):
+        return [step_program.load_or_compile(p, self.tmp_dir.name) for p in patterns]
+
+    def test_reverse_removes_transit(self):
+        # both lines run outward, reversing the second joins them end to end
+        programs = self._programs([PatternLine(0, 40), PatternLine(0, 40)])
+        playlist = Playlist(programs, self.planner)
+        report = playlist.optimise()
+        self.assertEqual(report['transit_s'], 0)
+        self.assertGreater(report['baseline_transit_s'], 0)
+        self.assertEqual(report['saved_s'], report['baseline_transit_s'])
+        self.assertEqual([reverse for _, reverse, _ in playlist.entries], [False, True])
+        self.assertNotEqual(playlist.name(0), playlist.name(1))
+        for program in programs:
+            program.close()
+
+    def test_greedy_no_worse_than_baseline(self):
+        programs = self._programs([PatternLine(i * 5, 40 - i * 3) for i in range(9)])
+        playlist = Playlist(programs, self.planner)
+        report = playlist.optimise()
+        self.assertEqual(sorted(index for index, _, _ in playlist.entries), list(range(9)))
+        self.assertLessEqual(report['transit_s'], report['baseline_transit_s'])
+        for program in programs:
+            program.close()
+
+    def test_get_program_unwinds_theta(self):
+        programs = self._programs([PatternLine(0, 40)])
+        playlist = Playlist(programs, self.planner)
+        # two rotations on from the program's start, it plays from there rather than winding back
+        current_steps = (2 * T_FULL_ROTATION_STEPS + 5, 0)
+        program = playlist.get_program(0, current_steps)
+        self.assertEqual(program.steps_at(0)[0], 2 * T_FULL_ROTATION_STEPS)
+        programs[0].close()
+
+if __name__ == '__main__':
+    unittest.main()
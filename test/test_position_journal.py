@@ -0,0 +1,167 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "src/")
+from constants import *
+from position_journal import PositionJournal
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from fake_clock import FakeClock
+import step_program
+
+class PatternShort:
+    def get_pattern(self):
+        return [(0, 0), (AXIS_STEP_T * 2, AXIS_STEP_R * 3), (AXIS_STEP_T * 4, AXIS_STEP_R), (AXIS_STEP_T, 0)]
+
+    def get_params(self):
+        return {}
+
+class TestPositionJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "position.journal")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _lines(self):
+        with open(self.path) as f:
+            return f.readlines()
+
+    def test_progress_batched(self):
+        journal = PositionJournal(self.path, flush_interval_s=5, clock=self.clock)
+        journal.start_pattern((0, 0), 1, "spiral")
+        for i in range(100):
+            journal.record_progress((i, 0), i)
+            self.clock.advance(0.015)
+        # 1.5 s of progress, not flushed yet
+        self.assertEqual(len(self._lines()), 1)
+        self.clock.advance(5)
+        journal.record_progress((100, 0), 100)
+        self.assertEqual(len(self._lines()), 2)
+        journal.close()
+
+        state = PositionJournal.recover(self.path)
+        self.assertEqual(state['steps'], (100, 0))
+        self.assertEqual(state['pattern'], 1)
+        self.assertEqual(state['name'], "spiral")
+        self.assertEqual(state['progress'], 100)
+        self.assertFalse(state['clean'])
+
+    def test_clean_shutdown(self):
+        journal = PositionJournal(self.path, clock=self.clock)
+        journal.start_pattern((0, 0), 0, "zigzag")
+        journal.record_progress((7, -3), 12)
+        journal.shutdown((7, -3))
+        journal.close()
+
+        state = PositionJournal.recover(self.path)
+        self.assertTrue(state['clean'])
+        self.assertEqual(state['steps'], (7, -3))
+        self.assertEqual(state['progress'], 12)
+
+        # any record after the shutdown means it's no longer clean
+        journal = PositionJournal(self.path, clock=self.clock)
+        journal.start_pattern((7, -3), 1, "radial")
+        journal.close()
+        self.assertFalse(PositionJournal.recover(self.path)['clean'])
+
+    def test_progress_after_shutdown_written(self):
+        journal = PositionJournal(self.path, clock=self.clock)
+        journal.shutdown((7, -3), 12)
+        journal.close()
+
+        # resuming mid pattern, the first progress marks the journal not clean before any flush interval
+        journal = PositionJournal(self.path, flush_interval_s=5, clock=self.clock)
+        journal.record_progress((8, -3), 13)
+        state = PositionJournal.recover(self.path)
+        self.assertFalse(state['clean'])
+        self.assertEqual(state['steps'], (8, -3))
+        # then batched again
+        journal.record_progress((9, -3), 14)
+        self.assertEqual(PositionJournal.recover(self.path)['progress'], 13)
+        journal.close()
+
+    def test_play_program_not_clean_before_moving(self):
+        program = step_program.compile_pattern(PatternShort(), os.path.join(self.tmp_dir.name, "short.stp"))
+        journal = PositionJournal(self.path, clock=self.clock)
+        journal.shutdown((0, 0), 0)
+        planner = MotionPlanner(MotorControlMock(), scheduler=TickScheduler(clock=self.clock, sleep=self.clock.sleep), journal=journal)
+
+        def play_move(move):
+            # the transit move to the program's start
+            self.assertFalse(PositionJournal.recover(self.path)['clean'])
+            raise RuntimeError("power cut")
+
+        planner.play_move = play_move
+        with self.assertRaises(RuntimeError):
+            planner.play_program(program, 1)
+        journal.close()
+        program.close()
+
+    def test_torn_write_skipped(self):
+        journal = PositionJournal(self.path, clock=self.clock)
+        journal.start_pattern((5, 5), 2, "spiral")
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"event": "progress", "steps": [6')
+        state = PositionJournal.recover(self.path)
+        self.assertEqual(state['steps'], (5, 5))
+
+    def test_no_journal(self):
+        self.assertIsNone(PositionJournal.recover(self.path))
+
+    def test_compacted(self):
+        journal = PositionJournal(self.path, flush_interval_s=0, max_bytes=1024, clock=self.clock)
+        journal.start_pattern((0, 0), 0, "spiral")
+        for i in range(200):
+            journal.record_progress((i, i), i)
+        journal.close()
+        self.assertLessEqual(os.path.getsize(self.path), 1024)
+        self.assertEqual(PositionJournal.recover(self.path)['steps'], (199, 199))
+
+    def test_resume_program(self):
+        program = step_program.compile_pattern(PatternShort(), os.path.join(self.tmp_dir.name, "short.stp"))
+        journal = PositionJournal(self.path, flush_interval_s=0, clock=self.clock)
+        planner = MotionPlanner(MotorControlMock(), scheduler=TickScheduler(clock=self.clock, sleep=self.clock.sleep), journal=journal)
+
+        journal.start_pattern(planner.current_steps, 0, "short")
+        stop_at = len(program) // 2
+        record_progress = planner.record_progress
+
+        def record_progress_then_cancel(progress):
+            record_progress(progress)
+            if progress == stop_at:
+                planner.cancel()
+
+        planner.record_progress = record_progress_then_cancel
+        self.assertFalse(planner.play_program(program))
+        journal.shutdown(planner.current_steps)
+        journal.close()
+        self.assertEqual(planner.current_steps, program.steps_at(stop_at))
+
+        # restart, carry on from the journal without referencing
+        state = PositionJournal.recover(self.path)
+        self.assertTrue(state['clean'])
+        self.assertEqual(state['progress'], stop_at)
+        planner = MotionPlanner(MotorControlMock(), scheduler=TickScheduler(clock=self.clock, sleep=self.clock.sleep))
+        planner.current_position = planner.steps_to_position(state['steps'])
+        self.assertTrue(planner.play_program(program, state['progress']))
+        self.assertEqual(planner.current_steps, program.steps_at(len(program)))
+        self.assertEqual(planner.current_position, program.end_position)
+        program.close()
+
+    def test_steps_at(self):
+        program = step_program.compile_pattern(PatternShort(), os.path.join(self.tmp_dir.name, "short.stp"))
+        self.assertEqual(program.steps_at(0), (0, 0))
+        self.assertEqual(program.steps_at(len(program)), (1, 0))
+        with self.assertRaises(ValueError):
+            program.steps_at(len(program) + 1)
+        program.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "src/")
+from constants import *
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+import pulse_train
+from pulse_train import PulseTrainCompiler, MemoryWaveformBackend, FileWaveformBackend
+
+FF = (direction.FORWARD, direction.FORWARD)
+
+class TestPulseTrain(unittest.TestCase):
+
+    def setUp(self):
+        self.planner = MotionPlanner(None)
+        self.period_us = int(round(TIME_STEP_S * 1e6))
+        self.min_step_us = int(round(MIN_STEP_DELAY * 1e6))
+
+    def _rising(self, backend, pin):
+        return [t for t, level in backend.edges(pin) if level]
+
+    def test_idle_time_steps(self):
+        compiler = PulseTrainCompiler(self.planner)
+        for _ in range(3):
+            compiler.add_time_step(FF, (False, False))
+        train = compiler.take()
+        self.assertEqual(train, [(0, 0, 3 * self.period_us)])
+        self.assertEqual(compiler.overruns, 0)
+
+    def test_rho_steps_on_deadlines(self):
+        backend = MemoryWaveformBackend()
+        ticks = [(FF, (False, True)), (FF, (False, False)), (FF, (False, True))]
+        compiler = pulse_train.play_pulse_trains(ticks, backend, self.planner, chunk_time_steps=2)
+        self.assertEqual(len(backend.trains), 2)
+        self.assertEqual(backend.duration_us(), 3 * self.period_us)
+        self.assertEqual(compiler.overruns, 0)
+
+        rising = self._rising(backend, RHO_STEP_PIN)
+        # direction set up first, then a pulse at the start of the first and third time steps
+        self.assertEqual(rising, [DIR_SETUP_US, 2 * self.period_us])
+        falling = [t for t, level in backend.edges(RHO_STEP_PIN) if not level]
+        self.assertEqual(falling[0] - rising[0], int(round(STEP_PULSE_WIDTH * 1e6)))
+
+    def test_theta_substeps_keep_min_step_delay(self):
+        backend = MemoryWaveformBackend()
+        compiler = pulse_train.play_pulse_trains([(FF, (True, False))], backend, self.planner)
+        rising = self._rising(backend, THETA_STEP_PIN)
+        self.assertEqual(len(rising), AXIS_GEAR_RATIO_T)
+        self.assertTrue(all(b - a >= self.min_step_us for a, b in zip(rising, rising[1:])))
+        # coupled rho compensation is stepped as well
+        self.assertEqual(len(self._rising(backend, RHO_STEP_PIN)), AXIS_GEAR_RATIO_R)
+        # more than one time step's worth of pulses
+        self.assertEqual(compiler.overruns, 1)
+        self.assertGreater(backend.duration_us(), self.period_us)
+
+    def test_combined_step_as_fast_as_theta_alone(self):
+        def duration(step, dir=FF):
+            backend = MemoryWaveformBackend()
+            pulse_train.play_pulse_trains([(dir, step)], backend, self.planner)
+            return backend.duration_us()
+        # rho step cancels the coupled compensation, theta substeps only
+        theta_only = duration((True, True), (direction.FORWARD, direction.BACKWARD))
+        # rho compensation and a rho step, interleaved with the theta substeps
+        combined = duration((True, True))
+        self.assertEqual(combined, theta_only)
+        serial = theta_only + 2 * AXIS_GEAR_RATIO_R * self.min_step_us
+        self.assertLess(combined, serial)
+
+    def test_matches_motor_steps(self):
+        moves = [(1, 10), (0.5, 30), (0, 0)]
+        ticks = []
+        motors = MotorControlMock()
+        planner = MotionPlanner(motors)
+        for position in moves:
+            move = planner.get_steps_for_move(position)
+            for step in move['axis_steps_list']:
+                ticks.append((move['directions'], step))
+                planner._play_both_axis_step(move['directions'], step)
+            planner.current_position = position
+
+        backend = MemoryWaveformBackend()
+        pulse_train.play_pulse_trains(ticks, backend, self.planner)
+        theta_pulses = sum(sum(p[0] for p in pulses) for _, pulses in motors.batches)
+        rho_pulses = sum(sum(p[1] for p in pulses) for _, pulses in motors.batches)
+        self.assertEqual(len(self._rising(backend, THETA_STEP_PIN)), theta_pulses)
+        self.assertEqual(len(self._rising(backend, RHO_STEP_PIN)), rho_pulses)
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "trains.bin")
+            backend = FileWaveformBackend(path)
+            memory = MemoryWaveformBackend()
+            ticks = [(FF, (True, True)), (FF, (False, True))]
+            pulse_train.play_pulse_trains(ticks, backend, self.planner, chunk_time_steps=1)
+            pulse_train.play_pulse_trains(ticks, memory, self.planner, chunk_time_steps=1)
+            backend.close()
+            self.assertEqual(list(FileWaveformBackend.read(path)), memory.trains)
+
+if __name__ == '__main__':
+    unittest.main()
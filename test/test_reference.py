@@ -0,0 +1,62 @@
+import unittest
+import sys
+import math
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_sim import MotorControlSim
+from fake_clock import FakeClock
+
+# homing time regression limits, simulated seconds
+MAX_SEARCH_TIME_S = 200
+MAX_LOCAL_SEARCH_TIME_S = 30
+
+class TestReference(unittest.TestCase):
+
+    def _make_planner(self, start_position):
+        self.clock = FakeClock()
+        self.motors = MotorControlSim(start_position=start_position, clock=self.clock, sleep=self.clock.sleep)
+        return MotionPlanner(self.motors, scheduler=TickScheduler(clock=self.clock, sleep=self.clock.sleep))
+
+    def _assert_referenced(self, planner):
+        self.assertEqual(planner.current_position, (0, AXIS_MAX_R))
+        theta, rho = self.motors.position
+        # referenced theta is the sensor theta, within a few steps and whole rotations
+        theta_error = math.remainder(theta - REF_SENSOR_POSITION[0], T_FULL_ROTATION)
+        self.assertLess(abs(theta_error), AXIS_STEP_T * 3)
+        self.assertAlmostEqual(rho, AXIS_MAX_R, delta=AXIS_STEP_R * (REF_STEPS_IN_STATE + 1))
+
+    def test_reference_routine(self):
+        planner = self._make_planner((3, REF_SENSOR_POSITION[1] - 0.5))
+        planner.reference_routine()
+        self._assert_referenced(planner)
+
+    def test_fast_reference_inside_sensor(self):
+        planner = self._make_planner((1, 10))
+        planner.fast_reference_routine()
+        self._assert_referenced(planner)
+        self.assertLess(self.clock.now, MAX_SEARCH_TIME_S)
+
+    def test_fast_reference_outside_sensor(self):
+        # outwards search runs to the end of travel, then the inwards search finds it
+        planner = self._make_planner((5, 60))
+        planner.fast_reference_routine()
+        self._assert_referenced(planner)
+        self.assertLess(self.clock.now, MAX_SEARCH_TIME_S)
+
+    def test_fast_reference_last_known_position(self):
+        last_known = (4 * T_FULL_ROTATION + 1, 40)
+        # table moved a little since the position was saved
+        planner = self._make_planner((last_known[0] + 0.1, last_known[1] - 2))
+        planner.fast_reference_routine(last_known)
+        self._assert_referenced(planner)
+        self.assertLess(self.clock.now, MAX_LOCAL_SEARCH_TIME_S)
+
+    def test_fast_reference_wrong_last_known_position(self):
+        planner = self._make_planner((2, 20))
+        planner.fast_reference_routine((5, 65))
+        self._assert_referenced(planner)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import sys
+import math
+sys.path.insert(0, "src/")
+from constants import *
+from simulator import Simulator
+from pattern_spiral import PatternSpiral
+
+class PatternSquare:
+    def get_pattern(self):
+        return [(0, 10), (1, 10), (1, 30), (0, 30), (0, 10)]
+
+    def get_params(self):
+        return {}
+
+class TestSimulator(unittest.TestCase):
+
+    def test_play_report(self):
+        sim = Simulator(start_position=(0, 10))
+        self.assertTrue(sim.play(PatternSquare().get_pattern()))
+        report = sim.get_report()
+        # back where it started, and the simulated motors agree with the planner
+        self.assertEqual(report['planner_steps'], (0, int(10 / AXIS_STEP_R)))
+        self.assertAlmostEqual(report['ball_position'][0], 0)
+        self.assertAlmostEqual(report['ball_position'][1], report['planner_steps'][1] * AXIS_STEP_R)
+        self.assertEqual(report['lost_steps'], 0)
+        # 1 rad out and back, each theta step is gear ratio motor steps
+        theta_steps = 2 * int(1 / AXIS_STEP_T)
+        self.assertEqual(report['theta_motor_steps'], theta_steps * AXIS_GEAR_RATIO_T)
+        self.assertGreaterEqual(report['simulated_s'], sim.scheduler.get_stats()['time_steps'] * TIME_STEP_S)
+        self.assertLess(report['wall_s'], report['simulated_s'])
+
+    def test_spiral_fast_forward(self):
+        sim = Simulator()
+        self.assertTrue(sim.play(PatternSpiral()))
+        report = sim.get_report()
+        # a pattern of many minutes, played in a fraction of the time
+        self.assertGreater(report['simulated_s'], 600)
+        self.assertLess(report['wall_s'], report['simulated_s'] / 100)
+
+    def test_reference(self):
+        sim = Simulator(start_position=(2, 30), referenced=False)
+        sim.reference()
+        report = sim.get_report()
+        self.assertEqual(report['planner_position'], (0, AXIS_MAX_R))
+        theta_error = math.remainder(report['ball_position'][0] - REF_SENSOR_POSITION[0], T_FULL_ROTATION)
+        self.assertLess(abs(theta_error), AXIS_STEP_T * 3)
+        self.assertGreater(report['simulated_s'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "src/")
+import constants
+from constants import *
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+import step_program
+
+class PatternShort:
+    # a few short moves so playback stays quick
+    def get_pattern(self):
+        return [(0, 0), (0, AXIS_STEP_R * 3.5), (AXIS_STEP_T * 1.5, AXIS_STEP_R * 3.5), (0, 0)]
+
+    def get_params(self):
+        return {}
+
+class TestStepProgram(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp_dir.name
+        self.pattern = PatternShort()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_compile_matches_planner(self):
+        program = step_program.load_or_compile(self.pattern, self.cache_dir)
+        points = self.pattern.get_pattern()
+
+        planner = MotionPlanner(None)
+        planner.current_position = points[0]
+        expected = []
+        for position in points[1:]:
+            move = planner.get_steps_for_move(position)
+            for step in move['axis_steps_list']:
+                expected.append((move['directions'], (int(step[0]), int(step[1]))))
+            planner.current_position = position
+
+        self.assertEqual(list(program), expected)
+        self.assertEqual(len(program), len(expected))
+        self.assertEqual(program.start_position, points[0])
+        self.assertEqual(program.end_position, points[-1])
+        program.close()
+
+    def test_cache_reused(self):
+        program = step_program.load_or_compile(self.pattern, self.cache_dir)
+        path = program.path
+        program.close()
+        program = step_program.load_or_compile(self.pattern, self.cache_dir)
+        self.assertEqual(program.path, path)
+        program.close()
+
+    def test_damaged_program_compiled_again(self):
+        path = step_program.program_path(self.pattern, self.cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for data in (b"", b"STPG"):
+            # e.g. a power cut before the program reached the SD card
+            with open(path, "wb") as f:
+                f.write(data)
+            program = step_program.load_or_compile(self.pattern, self.cache_dir)
+            self.assertEqual(len(list(program)), len(program))
+            self.assertGreater(len(program), 0)
+            program.close()
+
+    def test_old_programs_pruned(self):
+        program = step_program.load_or_compile(self.pattern, self.cache_dir)
+        old_path = program.path
+        program.close()
+        other_pattern = PatternShort()
+        other_pattern.get_params = lambda: {'other': True}
+        other = step_program.load_or_compile(other_pattern, self.cache_dir)
+        speed = constants.AXIS_SPEED_R
+        try:
+            constants.AXIS_SPEED_R = speed / 2
+            program = step_program.load_or_compile(self.pattern, self.cache_dir)
+            program.close()
+        finally:
+            constants.AXIS_SPEED_R = speed
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(program.path))
+        # same pattern type, different params, kept
+        self.assertTrue(os.path.exists(other.path))
+        other.close()
+
+    def test_key_changes_with_constants(self):
+        key = step_program.program_key(self.pattern)
+        speed = constants.AXIS_SPEED_R
+        try:
+            constants.AXIS_SPEED_R = speed / 2
+            self.assertNotEqual(step_program.program_key(self.pattern), key)
+        finally:
+            constants.AXIS_SPEED_R = speed
+        self.assertEqual(step_program.program_key(self.pattern), key)
+
+    def test_play_program(self):
+        program = step_program.load_or_compile(self.pattern, self.cache_dir)
+        motors = MotorControlMock()
+        planner = MotionPlanner(motors)
+        planner.play_program(program)
+        # pattern returns to the start, so theta and the coupled rho end up back at 0
+        self.assertEqual(motors.theta_count, 0)
+        self.assertEqual(motors.rho_count, 0)
+        self.assertEqual(planner.current_position, (0, 0))
+        program.close()
+
+    def test_play_program_cancelled_before_start(self):
+        program = step_program.load_or_compile(self.pattern, self.cache_dir)
+        motors = MotorControlMock()
+        planner = MotionPlanner(motors)
+        planner.cancel()
+        self.assertFalse(planner.play_program(program))
+        self.assertEqual((motors.theta_count, motors.rho_count), (0, 0))
+        program.close()
+
+    def test_variant_reversed(self):
+        program = step_program.load_or_compile(self.pattern, self.cache_dir)
+        variant = step_program.StepProgramVariant(program, reverse=True, theta_offset_steps=3)
+        self.assertEqual(variant.start_position, (program.end_position[0] + 3 * AXIS_STEP_T, program.end_position[1]))
+        self.assertEqual(variant.steps_at(0), (program.steps_at(len(program))[0] + 3, program.steps_at(len(program))[1]))
+
+        # playing each time step backwards retraces the program
+        ticks = list(variant)
+        self.assertEqual(len(ticks), len(program))
+        steps = list(variant.steps_at(0))
+        for time_step, (directions, step) in enumerate(ticks):
+            self.assertEqual(tuple(steps), variant.steps_at(time_step))
+            for ax in range(2):
+                steps[ax] += step[ax] if directions[ax] == direction.FORWARD else -step[ax]
+        self.assertEqual(tuple(steps), variant.steps_at(len(variant)))
+        self.assertEqual(list(variant.iter_from(2)), ticks[2:])
+        program.close()
+
+if __name__ == '__main__':
+    unittest.main()
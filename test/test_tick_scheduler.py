@@ -0,0 +1,76 @@
+import unittest
+import sys
+import asyncio
+sys.path.insert(0, "src/")
+from constants import *
+from tick_scheduler import TickScheduler
+from motion_planner import MotionPlanner
+from motor_control_mock import MotorControlMock
+from fake_clock import FakeClock
+
+PERIOD = 0.015
+
+class TestTickScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = TickScheduler(PERIOD, clock=self.clock, sleep=self.clock.sleep, max_lag_time_steps=4, async_sleep=self.clock.async_sleep)
+
+    def test_execution_time_absorbed(self):
+        self.scheduler.start()
+        for i in range(10):
+            # work inside the time step shortens the wait, not the schedule
+            self.clock.advance(0.005)
+            self.assertEqual(self.scheduler.wait(), 0.0)
+        self.assertAlmostEqual(self.clock.now, 10 * PERIOD)
+        self.assertEqual(self.scheduler.overruns, 0)
+
+    def test_wait_async(self):
+        async def play():
+            self.scheduler.start()
+            for i in range(10):
+                self.clock.advance(0.005)
+                self.assertEqual(await self.scheduler.wait_async(), 0.0)
+            # late time steps counted the same as wait
+            self.clock.advance(0.040)
+            self.assertAlmostEqual(await self.scheduler.wait_async(), 0.025)
+        asyncio.run(play())
+        self.assertAlmostEqual(self.clock.slept, 10 * PERIOD - 10 * 0.005)
+        self.assertEqual(self.scheduler.time_steps, 11)
+        self.assertEqual(self.scheduler.overruns, 1)
+
+    def test_overrun_caught_up(self):
+        self.scheduler.start()
+        self.clock.advance(0.040)
+        self.assertAlmostEqual(self.scheduler.wait(), 0.025)
+        # the next time steps run without waiting until back on schedule
+        for i in range(9):
+            self.scheduler.wait()
+        self.assertAlmostEqual(self.clock.now, 10 * PERIOD)
+        self.assertEqual(self.scheduler.overruns, 2)
+        self.assertAlmostEqual(self.scheduler.max_overrun, 0.025)
+        self.assertEqual(self.scheduler.resyncs, 0)
+
+    def test_resync_when_far_behind(self):
+        self.scheduler.start()
+        self.clock.advance(1.0)
+        self.scheduler.wait()
+        self.assertEqual(self.scheduler.resyncs, 1)
+        # schedule re-anchored to the late time step
+        self.scheduler.wait()
+        self.assertAlmostEqual(self.clock.now, 1.0 + PERIOD)
+
+    def test_play_move_duration(self):
+        planner = MotionPlanner(MotorControlMock(), scheduler=self.scheduler)
+        move = {
+            'start_position': (0, 0),
+            'end_position': (0, AXIS_STEP_R * 3),
+            'directions': (direction.FORWARD, direction.FORWARD),
+            'axis_steps_list': [(False, True)] * 6
+        }
+        planner.play_move(move)
+        self.assertAlmostEqual(self.clock.now, 6 * PERIOD)
+        self.assertFalse(self.scheduler.running)
+
+if __name__ == '__main__':
+    unittest.main()